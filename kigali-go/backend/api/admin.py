@@ -9,9 +9,11 @@ from flask_limiter.util import get_remote_address
 from models import db, Vehicle, Zone, Stop, FareRule, User
 from models.trip import Trip
 from models.report import Report
+from models.spatial import within_radius
+from app.utils.position_history import DEFAULT_MAX_POINTS, get_trajectory
+from app.utils.fleet_simulator import fleet_simulator
 from datetime import datetime, timedelta
 import random
-import math
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -181,6 +183,35 @@ def update_report(report_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/reports/<int:report_id>/trajectory', methods=['GET'])
+@jwt_required()
+def get_report_trajectory(report_id):
+    """Replay the reported vehicle's track around the time of a report"""
+    try:
+        report = Report.query.get(report_id)
+        if not report:
+            return jsonify({'error': 'Report not found'}), 404
+
+        vehicle_id = report.vehicle_id
+        if vehicle_id is None and report.vehicle_registration:
+            vehicle = Vehicle.query.filter_by(registration=report.vehicle_registration.strip().upper()).first()
+            vehicle_id = vehicle.id if vehicle else None
+        if vehicle_id is None:
+            return jsonify({'error': 'Report is not linked to a vehicle'}), 404
+
+        minutes = min(int(request.args.get('minutes', 30)), 12 * 60)
+        max_points = int(request.args.get('max_points', DEFAULT_MAX_POINTS))
+        window = timedelta(minutes=minutes)
+        trajectory = get_trajectory(
+            db.session, vehicle_id, report.created_at - window, report.created_at + window, max_points=max_points
+        )
+        return jsonify({'report_id': report.id, **trajectory.to_dict()})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/vehicles/status', methods=['GET'])
 def get_vehicles_status():
     """Get status of all vehicles for debugging"""
@@ -245,38 +276,23 @@ def seed_vehicles_public():
         ).count()
         
         # Test: Check if vehicles are visible from a test location
-        import math
-        def calculate_distance_km(lat1, lng1, lat2, lng2):
-            """Calculate distance using Haversine formula"""
-            R = 6371  # Earth's radius in kilometers
-            dlat = math.radians(lat2 - lat1)
-            dlng = math.radians(lng2 - lng1)
-            a = (math.sin(dlat / 2) ** 2 +
-                 math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-                 math.sin(dlng / 2) ** 2)
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-            return R * c
         test_lat = -1.9595
         test_lng = 30.0941
         test_radius = 5.0
         
-        static_vehicles = Vehicle.query.filter(
+        static_query = Vehicle.query.filter(
             Vehicle.registration.like('STATIC%'),
-            Vehicle.is_active == True,
-            Vehicle.current_lat.isnot(None),
-            Vehicle.current_lng.isnot(None)
-        ).all()
+            Vehicle.is_active == True
+        )
         
         visible_static = []
-        for v in static_vehicles:
-            distance = calculate_distance_km(test_lat, test_lng, v.current_lat, v.current_lng)
-            if distance <= test_radius:
-                visible_static.append({
-                    'registration': v.registration,
-                    'distance_km': round(distance, 2),
-                    'lat': v.current_lat,
-                    'lng': v.current_lng
-                })
+        for v, distance in within_radius(static_query, Vehicle, test_lat, test_lng, test_radius):
+            visible_static.append({
+                'registration': v.registration,
+                'distance_km': round(distance, 2),
+                'lat': v.current_lat,
+                'lng': v.current_lng
+            })
         
         return jsonify({
             'message': f'Successfully seeded vehicles: {static_created} static created, {static_updated} static updated, {random_created} random vehicles added',
@@ -649,34 +665,28 @@ def seed_fare_rules():
 @admin_bp.route('/vehicles/simulate', methods=['POST'])
 @jwt_required()
 def simulate_vehicle_movement():
-    """Simulate vehicle movement for development"""
+    """Advance the fleet simulator by one tick (optional JSON body: mode, all_vehicles)"""
+    if fleet_simulator.running:
+        return jsonify({'error': 'Auto-simulation is running', 'status': fleet_simulator.status()}), 409
     try:
-        vehicles = Vehicle.query.filter_by(is_active=True).all()
-        moved_count = 0
-        
-        for vehicle in vehicles:
-            if vehicle.current_lat and vehicle.current_lng:
-                # Move vehicle slightly
-                lat_change = random.uniform(-0.001, 0.001)  # ~100m
-                lng_change = random.uniform(-0.001, 0.001)
-                
-                new_lat = vehicle.current_lat + lat_change
-                new_lng = vehicle.current_lng + lng_change
-                
-                # Keep within Kigali bounds
-                new_lat = max(-2.0, min(-1.8, new_lat))
-                new_lng = max(29.9, min(30.3, new_lng))
-                
-                vehicle.update_location(new_lat, new_lng)
-                moved_count += 1
-        
-        db.session.commit()
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode')
+        if mode and mode != fleet_simulator.mode:
+            fleet_simulator.set_mode(db.session, mode)
+        # The admin button moves every active vehicle, as it always has; the
+        # public /simulation routes keep the SIM*-only default
+        all_vehicles = data.get('all_vehicles', True)
+        fleet_simulator.set_simulated_only(not all_vehicles)
+        result = fleet_simulator.tick(db.session)
         
         return jsonify({
-            'message': f'Simulated movement for {moved_count} vehicles',
-            'moved_count': moved_count
+            'message': f"Simulated movement for {result['moved_count']} vehicles",
+            'moved_count': result['moved_count'],
+            'mode': fleet_simulator.mode
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
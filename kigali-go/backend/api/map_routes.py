@@ -9,53 +9,59 @@ from models.vehicle import Vehicle
 from models.stop import Stop
 from models.zone import Zone
 from models.trip import Trip
+from models.spatial import nearest, within_bounds, within_radius
+from app.utils.serializers import STOP_PROJECTION, stop_query
+from app.utils.vehicle_store import STATE_COLUMNS, VehicleState, vehicle_store
+from app.utils.tile_cache import tile_cache
+from app.utils.clustering import CachedPyramid
+from app.utils.geo import bounding_box, calculate_distance_km, haversine_km_array
+from app.utils.speed_profiles import speed_profiles
+from app.utils.vector_tiles import MEDIA_TYPE as MVT_MEDIA_TYPE, vector_tiles
+from app.utils.web_mercator import tile_bounds, validate_tile
+from app.utils.wire_format import encode_vehicles, packed_response, wants_packed
 from datetime import datetime, timedelta
-import math
+import hashlib
 import os
 from sqlalchemy import or_
 
 map_bp = Blueprint('map', __name__)
 
+# Below these zooms vehicles and stops are served as clusters; a z14 tile is
+# about 2.4 km across in Kigali
+VEHICLE_CLUSTER_BELOW_ZOOM = 14
+STOP_CLUSTER_BELOW_ZOOM = 12
+STOP_TILE_MAX_AGE = 300  # seconds shared caches may keep a stop tile
 
-def calculate_distance_km(lat1, lng1, lat2, lng2):
-    """
-    Calculate distance between two points using Haversine formula
-    Returns distance in kilometers
-    """
-    R = 6371  # Earth's radius in kilometers
-    
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(dlat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlng / 2) ** 2)
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    
-    return distance
+STOP_TYPES = ('bus', 'taxi', 'moto', 'combined')
+_stop_pyramid = CachedPyramid(STOP_TYPES, ttl=STOP_TILE_MAX_AGE)
 
 
-def estimate_eta(distance_km, vehicle_type, traffic_factor=1.0):
-    """
-    Estimate arrival time based on distance and vehicle type
-    Returns estimated time in minutes
-    """
-    # Average speeds in km/h (adjusted for Kigali traffic)
-    speeds = {
-        'bus': 30,      # 30 km/h average
-        'taxi': 40,     # 40 km/h average
-        'moto': 50      # 50 km/h average
+def _stop_points():
+    codes = {name: code for code, name in enumerate(STOP_TYPES)}
+    rows = db.session.query(Stop.lat, Stop.lng, Stop.stop_type).filter(Stop.is_active == True).all()
+    return [(lat, lng, codes.get(stop_type, -1)) for lat, lng, stop_type in rows]
+
+
+def _stop_types(stop_type):
+    """A stop type filter also matches combined stops"""
+    return (stop_type, 'combined') if stop_type else None
+
+
+def _clusters_near(pyramid, zoom, lat, lng, radius, point_types):
+    """Clusters of the radius's cells whose centroid lies inside the radius"""
+    zoom, clusters = pyramid.clusters(zoom, *bounding_box(lat, lng, radius), point_types=point_types)
+    if clusters:
+        distances = haversine_km_array(lat, lng, [c['lat'] for c in clusters], [c['lng'] for c in clusters])
+        clusters = [c for c, distance in zip(clusters, distances) if distance <= radius]
+    return {
+        'clusters': clusters,
+        'count': len(clusters),
+        'total': sum(c['count'] for c in clusters),
+        'zoom': zoom,
+        'center': {'lat': lat, 'lng': lng},
+        'radius_km': radius,
+        'timestamp': datetime.utcnow().isoformat()
     }
-    
-    base_speed = speeds.get(vehicle_type, 35)
-    adjusted_speed = base_speed * traffic_factor
-    
-    # Time = Distance / Speed (convert to minutes)
-    eta_minutes = (distance_km / adjusted_speed) * 60
-    
-    return round(eta_minutes, 1)
 
 
 @map_bp.route('/vehicles/nearby', methods=['GET'])
@@ -67,62 +73,50 @@ def get_nearby_vehicles():
     - lng: longitude (required)
     - radius: radius in km (default: 5.0)
     - type: vehicle type filter (bus, taxi, moto) (optional)
+    - zoom: map zoom; below 14 the response holds clusters instead of vehicles (optional)
+    Vehicles are packed binary for Accept: application/vnd.kigali.vehicles
     """
     try:
         lat = float(request.args.get('lat', 0))
         lng = float(request.args.get('lng', 0))
         radius = float(request.args.get('radius', 5.0))  # Default 5km
         vehicle_type = request.args.get('type')  # optional filter
+        zoom = request.args.get('zoom', type=int)
         
         if lat == 0 and lng == 0:
             return jsonify({'error': 'Valid coordinates are required'}), 400
         
-        # Query active vehicles with coordinates
-        query = db.session.query(Vehicle).filter(
-            Vehicle.is_active == True,
-            Vehicle.current_lat.isnot(None),
-            Vehicle.current_lng.isnot(None)
-        )
-        
-        if vehicle_type:
-            query = query.filter(Vehicle.vehicle_type == vehicle_type)
-        
-        vehicles = query.all()
-        
-        # Log for debugging
-        current_app.logger.info(f'Map API: Found {len(vehicles)} active vehicles with coordinates')
+        vehicle_store.refresh()
+        if zoom is not None and zoom < VEHICLE_CLUSTER_BELOW_ZOOM:
+            return jsonify(_clusters_near(
+                vehicle_store.cluster_pyramid(), zoom, lat, lng, radius, [vehicle_type] if vehicle_type else None
+            ))
+        matches, _ = tile_cache.nearby(vehicle_store, lat, lng, radius, vehicle_type=vehicle_type)
+        if wants_packed(request.accept_mimetypes):
+            return packed_response(encode_vehicles(matches, (lat, lng)))
+        
+        # ETAs for the whole result set in one lookup
+        etas = speed_profiles.eta_array(
+            [d for _, d in matches], [v.vehicle_type for v, _ in matches],
+            [v.current_lat for v, _ in matches], [v.current_lng for v, _ in matches],
+        ).tolist() if matches else []
         
         nearby_vehicles = []
-        for vehicle in vehicles:
-            if vehicle.current_lat and vehicle.current_lng:
-                # Calculate distance using Haversine formula
-                distance = calculate_distance_km(
-                    lat, lng,
-                    vehicle.current_lat, vehicle.current_lng
-                )
-                
-                if distance <= radius:
-                    # Calculate ETA
-                    eta_minutes = estimate_eta(distance, vehicle.vehicle_type)
-                    
-                    vehicle_dict = vehicle.to_dict()
-                    vehicle_dict['distance_km'] = round(distance, 2)
-                    vehicle_dict['eta_minutes'] = eta_minutes
-                    vehicle_dict['bearing'] = vehicle.bearing or 0
-                    vehicle_dict['speed'] = vehicle.speed or 0
-                    
-                    nearby_vehicles.append(vehicle_dict)
-        
-        # Sort by distance
-        nearby_vehicles.sort(key=lambda x: x['distance_km'])
+        for (vehicle, distance), eta_minutes in zip(matches, etas):
+            vehicle_dict = _map_vehicle(vehicle)
+            vehicle_dict['distance_km'] = round(distance, 2)
+            vehicle_dict['eta_minutes'] = eta_minutes
+            nearby_vehicles.append(vehicle_dict)
         
-        return jsonify({
+        response = jsonify({
             'vehicles': nearby_vehicles,
             'count': len(nearby_vehicles),
             'center': {'lat': lat, 'lng': lng},
             'radius_km': radius,
             'timestamp': datetime.utcnow().isoformat()
         })
+        response.vary.add('Accept')
+        return response
         
     except ValueError as e:
         return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
@@ -137,10 +131,13 @@ def get_vehicle_details(vehicle_id):
     Get detailed information about a specific vehicle
     """
     try:
-        vehicle = db.session.query(Vehicle).filter_by(id=vehicle_id, is_active=True).first()
+        row = db.session.query(*STATE_COLUMNS).filter(
+            Vehicle.id == vehicle_id, Vehicle.is_active == True
+        ).first()
         
-        if not vehicle:
+        if not row:
             return jsonify({'error': 'Vehicle not found'}), 404
+        vehicle = VehicleState(*row)
         
         # If user location provided, calculate distance and ETA
         user_lat = request.args.get('lat', type=float)
@@ -153,7 +150,7 @@ def get_vehicle_details(vehicle_id):
                 user_lat, user_lng,
                 vehicle.current_lat, vehicle.current_lng
             )
-            eta_minutes = estimate_eta(distance, vehicle.vehicle_type)
+            eta_minutes = speed_profiles.eta(distance, vehicle.vehicle_type, vehicle.current_lat, vehicle.current_lng)
             
             vehicle_dict['distance_km'] = round(distance, 2)
             vehicle_dict['eta_minutes'] = eta_minutes
@@ -176,39 +173,44 @@ def get_nearby_stops():
     - lng: longitude (required)
     - radius: radius in km (default: 2.0)
     - type: stop type filter (bus, taxi, moto, combined) (optional)
+    - limit: return only the N nearest stops within the radius (optional)
+    - zoom: map zoom; below 12 the response holds clusters instead of stops (optional)
     """
     try:
         lat = float(request.args.get('lat', 0))
         lng = float(request.args.get('lng', 0))
         radius = float(request.args.get('radius', 2.0))  # Default 2km
         stop_type = request.args.get('type')  # optional filter
+        limit = request.args.get('limit', type=int)
+        zoom = request.args.get('zoom', type=int)
         
         if lat == 0 and lng == 0:
             return jsonify({'error': 'Valid coordinates are required'}), 400
         
-        # Query active stops
-        query = db.session.query(Stop).filter(Stop.is_active == True)
+        if zoom is not None and zoom < STOP_CLUSTER_BELOW_ZOOM:
+            return jsonify(_clusters_near(
+                _stop_pyramid.get(_stop_points), zoom, lat, lng, radius, _stop_types(stop_type)
+            ))
+        
+        # Query active stops as column tuples (no geometry, no zone lazy load)
+        query = stop_query(db.session).filter(Stop.is_active == True)
         
         if stop_type:
             query = query.filter(
                 (Stop.stop_type == stop_type) | (Stop.stop_type == 'combined')
             )
         
-        stops = query.all()
+        # Indexed radius / nearest-N query, sorted by distance
+        if limit:
+            matches = nearest(query, Stop, lat, lng, k=limit, max_km=radius)
+        else:
+            matches = within_radius(query, Stop, lat, lng, radius)
         
         nearby_stops = []
-        for stop in stops:
-            if stop.lat and stop.lng:
-                # Calculate distance
-                distance = calculate_distance_km(lat, lng, stop.lat, stop.lng)
-                
-                if distance <= radius:
-                    stop_dict = stop.to_dict()
-                    stop_dict['distance_km'] = round(distance, 2)
-                    nearby_stops.append(stop_dict)
-        
-        # Sort by distance
-        nearby_stops.sort(key=lambda x: x['distance_km'])
+        for row, distance in matches:
+            stop_dict = STOP_PROJECTION.row_dict(row)
+            stop_dict['distance_km'] = round(distance, 2)
+            nearby_stops.append(stop_dict)
         
         return jsonify({
             'stops': nearby_stops,
@@ -225,6 +227,189 @@ def get_nearby_stops():
         return jsonify({'error': 'Internal server error'}), 500
 
 
+def _map_vehicle(vehicle):
+    """The fields a map marker needs; driver details are left out"""
+    return {
+        'id': vehicle.id,
+        'vehicle_type': vehicle.vehicle_type,
+        'registration': vehicle.registration,
+        'route_id': vehicle.route_id,
+        'route_name': vehicle.route_name,
+        'lat': vehicle.current_lat,
+        'lng': vehicle.current_lng,
+        'bearing': vehicle.bearing or 0,
+        'speed': vehicle.speed or 0,
+        'last_seen': vehicle.last_seen.isoformat() if vehicle.last_seen else None,
+    }
+
+
+def _tile_response(payload, etag, cache_control):
+    """JSON response carrying ``etag``, or an empty 304 if the client already holds it"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _cluster_tile(pyramid, z, x, y, point_types, etag_prefix, cache_control):
+    """Cluster tile: at most 4x4 clusters, with an ETag over their contents"""
+    min_lat, max_lat, min_lng, max_lng = tile_bounds(z, x, y)
+    # The box query includes the cells just past the tile's east and south edges
+    _, clusters = pyramid.clusters(z, min_lat, max_lat, min_lng, max_lng, point_types=point_types)
+    clusters = [c for c in clusters if min_lat < c['lat'] <= max_lat and min_lng <= c['lng'] < max_lng]
+    digest = hashlib.blake2b(repr(clusters).encode(), digest_size=12).hexdigest()
+    etag = f'{etag_prefix}-{digest}'
+    if request.if_none_match.contains(etag):
+        return _tile_response(None, etag, cache_control)
+    return _tile_response({
+        'tile': {'z': z, 'x': x, 'y': y},
+        'clusters': clusters,
+        'count': len(clusters),
+        'total': sum(c['count'] for c in clusters),
+    }, etag, cache_control)
+
+
+@map_bp.route('/tiles/<int:z>/<int:x>/<int:y>/vehicles', methods=['GET'])
+def get_vehicle_tile(z, x, y):
+    """
+    Active vehicles inside a web-mercator tile, or clusters below zoom 14
+    The ETag changes whenever a vehicle in the tile moves or changes, or
+    enters or leaves it; send it back as If-None-Match to get a 304.
+    Query params:
+    - type: vehicle type filter (bus, taxi, moto) (optional)
+    """
+    try:
+        validate_tile(z, x, y)
+        min_lat, max_lat, min_lng, max_lng = tile_bounds(z, x, y)
+        vehicle_type = request.args.get('type')
+
+        vehicle_store.refresh()
+        if z < VEHICLE_CLUSTER_BELOW_ZOOM:
+            return _cluster_tile(
+                vehicle_store.cluster_pyramid(), z, x, y, [vehicle_type] if vehicle_type else None,
+                f'vc-{z}-{x}-{y}-{vehicle_type or "all"}', 'no-cache'
+            )
+        rows, digest = vehicle_store.in_bounds(min_lat, max_lat, min_lng, max_lng, vehicle_type=vehicle_type)
+        etag = f'v-{z}-{x}-{y}-{vehicle_type or "all"}-{digest}'
+        if request.if_none_match.contains(etag):
+            return _tile_response(None, etag, 'no-cache')
+
+        vehicles = [_map_vehicle(vehicle) for vehicle in rows]
+
+        return _tile_response({
+            'tile': {'z': z, 'x': x, 'y': y},
+            'vehicles': vehicles,
+            'count': len(vehicles),
+            'timestamp': datetime.utcnow().isoformat()
+        }, etag, 'no-cache')
+
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching vehicle tile: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@map_bp.route('/tiles/<int:z>/<int:x>/<int:y>/stops', methods=['GET'])
+def get_stop_tile(z, x, y):
+    """
+    Active stops inside a web-mercator tile, or clusters below zoom 12
+    Stop tiles may be cached by shared caches for a few minutes and are
+    revalidated with their ETag afterwards.
+    Query params:
+    - type: stop type filter (bus, taxi, moto, combined) (optional)
+    """
+    try:
+        validate_tile(z, x, y)
+        min_lat, max_lat, min_lng, max_lng = tile_bounds(z, x, y)
+        stop_type = request.args.get('type')
+        cache_control = f'public, max-age={STOP_TILE_MAX_AGE}'
+        if z < STOP_CLUSTER_BELOW_ZOOM:
+            return _cluster_tile(
+                _stop_pyramid.get(_stop_points), z, x, y, _stop_types(stop_type),
+                f'sc-{z}-{x}-{y}-{stop_type or "all"}', cache_control
+            )
+
+        query = db.session.query(
+            Stop.id, Stop.name, Stop.code, Stop.lat, Stop.lng, Stop.stop_type, Stop.zone_id,
+            Stop.is_shelter, Stop.is_accessible, Stop.operating_hours, Stop.updated_at
+        ).filter(Stop.is_active == True)
+        if stop_type:
+            query = query.filter(
+                (Stop.stop_type == stop_type) | (Stop.stop_type == 'combined')
+            )
+        rows = within_bounds(query, Stop, min_lat, max_lat, min_lng, max_lng).order_by(Stop.id).all()
+
+        digest = hashlib.blake2b(digest_size=12)
+        for row in rows:
+            digest.update(repr(tuple(row)).encode())
+        etag = f's-{z}-{x}-{y}-{stop_type or "all"}-{digest.hexdigest()}'
+        if request.if_none_match.contains(etag):
+            return _tile_response(None, etag, cache_control)
+
+        stops = [{
+            'id': row.id,
+            'name': row.name,
+            'code': row.code,
+            'lat': row.lat,
+            'lng': row.lng,
+            'stop_type': row.stop_type,
+            'zone_id': row.zone_id,
+            'is_shelter': row.is_shelter,
+            'is_accessible': row.is_accessible,
+            'operating_hours': row.operating_hours,
+        } for row in rows]
+
+        return _tile_response({
+            'tile': {'z': z, 'x': x, 'y': y},
+            'stops': stops,
+            'count': len(stops)
+        }, etag, cache_control)
+
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching stop tile: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@map_bp.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_vector_tile(z, x, y):
+    """
+    Pre-rendered Mapbox Vector Tile with ``zones`` and ``stops`` layers
+    Served between MVT_MIN_ZOOM and MVT_MAX_ZOOM; map clients overzoom
+    the deepest level. Tiles without features answer 204.
+    """
+    try:
+        validate_tile(z, x, y)
+        if not vector_tiles.min_zoom <= z <= vector_tiles.max_zoom:
+            return jsonify({
+                'error': f'Vector tiles exist for zoom {vector_tiles.min_zoom} to {vector_tiles.max_zoom}'
+            }), 404
+
+        data, version = vector_tiles.tile(db.session, z, x, y)
+        etag = f'mvt-{version}-{z}-{x}-{y}'
+        cache_control = f'public, max-age={STOP_TILE_MAX_AGE}'
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        elif not data:
+            response = current_app.response_class(status=204)
+        else:
+            response = current_app.response_class(data, mimetype=MVT_MEDIA_TYPE)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error fetching vector tile: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+
 @map_bp.route('/user/location', methods=['POST'])
 @jwt_required(optional=True)
 def update_user_location():
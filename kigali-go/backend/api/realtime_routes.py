@@ -1,16 +1,27 @@
 """
 Real-time vehicle tracking API routes
-Uses long-polling approach for compatibility
+Plain polling, cursor deltas with optional blocking long-poll (``wait=``),
+and a Server-Sent Events stream
 """
 
-from flask import Blueprint, request, jsonify, current_app, g
-from app.extensions import db, limiter, cache
+from flask import Blueprint, Response, request, jsonify, current_app, g, stream_with_context
+from app.extensions import db, limiter
 from models.vehicle import Vehicle
-from models.stop import Stop
 from app.utils.vehicle_seed import VehicleSeeder, SeedConfig
+from app.utils.vehicle_store import decode_cursor, encode_cursor, vehicle_store
+from app.utils.position_buffer import position_buffer
+from app.utils.arrival_board import arrival_board
+from app.utils.directions_cache import directions_cache
+from app.utils.tile_cache import tile_cache
+from app.utils.vehicle_stream import AreaSubscription, sse_event
+from app.utils.wire_format import encode_vehicles, packed_response, wants_packed
+from app.utils.dead_reckoning import predict_records, prediction_meta, reckoning_config
+from app.utils.speed_profiles import speed_profiles
+from app.utils.serializers import (
+    dumps_with, encode_realtime_vehicles, encoded_body, encoded_response, realtime_vehicle_records, response_cache,
+)
 from datetime import datetime, timedelta
-from sqlalchemy import func
-import math
+from sqlalchemy import text
 import time
 import logging
 from functools import wraps
@@ -27,8 +38,8 @@ def handle_errors(f):
             result = f(*args, **kwargs)
             duration = (time.time() - start_time) * 1000  # in ms
             
-            # Log slow requests
-            if duration > 500:  # Log if request takes > 500ms
+            # Log slow requests (long-polls are slow on purpose)
+            if duration > 500 and not g.get('long_poll'):  # Log if request takes > 500ms
                 logger.warning(
                     f"Slow request: {request.path} took {duration:.2f}ms",
                     extra={
@@ -78,24 +89,25 @@ def health_check():
     """Health check endpoint to verify database connection and data"""
     try:
         # Check database connection
-        db.session.execute('SELECT 1')
-        
-        # Check if vehicles table exists and has data
-        from models.vehicle import Vehicle
-        total_vehicles = db.session.query(Vehicle).count()
-        active_vehicles = db.session.query(Vehicle).filter(Vehicle.is_active == True).count()
-        
+        db.session.execute(text('SELECT 1'))
+
+        vehicle_store.refresh()
+        counts = _vehicle_counts()
+
         return jsonify({
             'status': 'success',
             'database': 'connected',
             'vehicles': {
-                'total': total_vehicles,
-                'active': active_vehicles,
-                'with_location': db.session.query(Vehicle).filter(
-                    Vehicle.current_lat.isnot(None),
-                    Vehicle.current_lng.isnot(None)
-                ).count()
-            }
+                'total': counts['total'],
+                'active': counts['active'],
+                'with_location': counts['with_location'],
+            },
+            'write_behind': position_buffer.stats(),
+            'tile_cache': tile_cache.stats(),
+            'response_cache': response_cache.stats(),
+            'speed_profiles': speed_profiles.stats(),
+            'arrival_board': arrival_board.stats(),
+            'directions_cache': directions_cache.stats(),
         })
     except Exception as e:
         return jsonify({
@@ -105,52 +117,6 @@ def health_check():
         }), 500
 
 
-def calculate_distance_km(lat1, lng1, lat2, lng2):
-    """
-    Calculate distance between two points using Haversine formula
-    Returns distance in kilometers
-    """
-    R = 6371  # Earth's radius in kilometers
-    
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(dlat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlng / 2) ** 2)
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    
-    return distance
-
-
-def estimate_eta(distance_km, vehicle_type, traffic_factor=1.0):
-    """
-    Estimate arrival time based on distance and vehicle type
-    Returns estimated time in minutes
-    """
-    speeds = {
-        'bus': 30,      # 30 km/h average
-        'taxi': 40,     # 40 km/h average
-        'moto': 50      # 50 km/h average
-    }
-    
-    base_speed = speeds.get(vehicle_type, 35)
-    adjusted_speed = base_speed * traffic_factor
-    
-    eta_minutes = (distance_km / adjusted_speed) * 60
-    return round(eta_minutes, 1)
-
-
-def get_cache_key():
-    """Generate a cache key based on request parameters"""
-    args = request.args.copy()
-    # Remove cache-busting parameter if present
-    args.pop('_', None)
-    return f"vehicles:{':'.join(f'{k}={v}' for k, v in sorted(args.items()))}"
-
-
 def _request_context(extra=None):
     ctx = {
         'path': request.path,
@@ -173,81 +139,56 @@ def _validate_coordinates(lat, lng):
         raise ValueError('Invalid coordinates provided')
 
 
-def _serialize_vehicle_record(record, distance=None):
-    data = {
-        'id': record.id,
-        'registration': record.registration,
-        'type': getattr(record, 'vehicle_type', None) or getattr(record, 'type', None),
-        'vehicle_type': getattr(record, 'vehicle_type', None) or getattr(record, 'type', None),
-        'lat': getattr(record, 'current_lat', None) or getattr(record, 'lat', None),
-        'lng': getattr(record, 'current_lng', None) or getattr(record, 'lng', None),
-        'current_lat': getattr(record, 'current_lat', None) or getattr(record, 'lat', None),
-        'current_lng': getattr(record, 'current_lng', None) or getattr(record, 'lng', None),
-        'heading': getattr(record, 'heading', None) or getattr(record, 'bearing', None) or 0,
-        'speed': getattr(record, 'speed', None) or 0,
-        'bearing': getattr(record, 'bearing', None) or getattr(record, 'heading', None) or 0,
-        'route_name': getattr(record, 'route_name', None),
-        'operator': getattr(record, 'operator', None),
-        'is_active': getattr(record, 'is_active', True),
-        'updated_at': record.updated_at.isoformat() if getattr(record, 'updated_at', None) else None,
-    }
-    if hasattr(record, 'eta_minutes') and record.eta_minutes is not None:
-        data['eta_minutes'] = record.eta_minutes
-    if distance is not None:
-        data['distance_km'] = round(distance, 2)
-    return data
+def _parse_area_params():
+    """lat/lng/radius/type shared by the realtime vehicle endpoints"""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius = min(request.args.get('radius', type=float, default=5.0) or 5.0, 20.0)
+    vehicle_type = request.args.get('type')
+
+    _validate_coordinates(lat, lng)
+    if vehicle_type:
+        vehicle_type = vehicle_type.lower()
+        if vehicle_type not in ALLOWED_VEHICLE_TYPES:
+            raise ValueError(f"Invalid vehicle type '{vehicle_type}'. Allowed: {', '.join(sorted(ALLOWED_VEHICLE_TYPES))}")
+    return lat, lng, radius, vehicle_type
 
 
 def _vehicle_counts():
-    try:
-        total = db.session.query(func.count(Vehicle.id)).scalar()
-        active = db.session.query(func.count(Vehicle.id)).filter(Vehicle.is_active == True).scalar()
-        with_location = db.session.query(func.count(Vehicle.id)).filter(
-            Vehicle.is_active == True,
-            Vehicle.current_lat.isnot(None),
-            Vehicle.current_lng.isnot(None)
-        ).scalar()
-        by_type = dict(
-            db.session.query(Vehicle.vehicle_type, func.count(Vehicle.id))
-            .group_by(Vehicle.vehicle_type)
-            .all()
-        )
-    except Exception as exc:
-        logger.error('Failed to compute vehicle counts', extra=_request_context({'error': str(exc)}))
-        return {
-            'total': 0,
-            'active': 0,
-            'with_location': 0,
-            'by_type': {},
-        }
-
-    return {
-        'total': total,
-        'active': active,
-        'with_location': with_location,
-        'by_type': by_type,
-    }
+    """Fleet totals from the store's running counters; no database aggregates"""
+    return vehicle_store.counters.snapshot()
 
 @realtime_bp.route('/vehicles/realtime', methods=['GET'])
 @limiter.limit("500 per minute")  # Increased limit for real-time data
 @handle_errors
 def get_realtime_vehicles():
-    """Return all active vehicles near a coordinate with optional filters."""
+    """Return all active vehicles near a coordinate with optional filters.
+
+    Every full response carries an opaque ``cursor``. Passing it back as
+    ``?cursor=`` returns only ``upserts`` (vehicles changed in the area) and
+    ``removed`` ids (vehicles that left, were deactivated or deleted) since
+    that cursor, plus the next cursor. With ``wait=<seconds>`` a cursor
+    request blocks until something in the area changes or the wait elapses.
+    ``Accept: application/vnd.kigali.vehicles`` selects the packed binary
+    encoding from ``app.utils.wire_format`` instead of JSON.
+
+    With ``predict=true`` JSON positions are dead-reckoned to the response
+    time (``app.utils.dead_reckoning``) and ``prediction.valid_until`` says
+    when to poll next.
+    """
+
+    lat, lng, radius, vehicle_type = _parse_area_params()
+    predict = request.args.get('predict', 'false').lower() == 'true'
+    cursor = request.args.get('cursor')
+    if cursor:
+        max_wait = current_app.config.get('VEHICLE_LONG_POLL_MAX_WAIT', 25.0)
+        wait = min(max(request.args.get('wait', type=float, default=0.0) or 0.0, 0.0), max_wait)
+        return _realtime_vehicle_changes(decode_cursor(cursor), lat, lng, radius, vehicle_type, wait, predict)
 
-    lat = request.args.get('lat', type=float)
-    lng = request.args.get('lng', type=float)
-    radius = min(request.args.get('radius', type=float, default=5.0) or 5.0, 20.0)
-    vehicle_type = request.args.get('type')
     since_str = request.args.get('since')
     auto_seed = request.args.get('auto_seed', 'false').lower() == 'true'
     include_meta = request.args.get('include_meta', 'true').lower() != 'false'
 
-    _validate_coordinates(lat, lng)
-    if vehicle_type:
-        vehicle_type = vehicle_type.lower()
-        if vehicle_type not in ALLOWED_VEHICLE_TYPES:
-            raise ValueError(f"Invalid vehicle type '{vehicle_type}'. Allowed: {', '.join(sorted(ALLOWED_VEHICLE_TYPES))}")
-
     since = None
     if since_str:
         try:
@@ -258,33 +199,87 @@ def get_realtime_vehicles():
         except ValueError:
             raise ValueError('Invalid timestamp format. Use ISO 8601 (e.g. 2024-01-01T12:00:00Z).')
 
-    cache_key = get_cache_key()
-    if not since:
-        cached_payload = cache.get(cache_key)
-        if cached_payload:
-            cached_payload['cached'] = True
-            return jsonify(cached_payload)
-
-    lat_radius = radius / 111.0
-    lng_radius = radius / (111.0 * math.cos(math.radians(lat)))
-
-    query = db.session.query(Vehicle).filter(
-        Vehicle.is_active == True,
-        Vehicle.current_lat.isnot(None),
-        Vehicle.current_lng.isnot(None),
-        Vehicle.current_lat.between(lat - lat_radius, lat + lat_radius),
-        Vehicle.current_lng.between(lng - lng_radius, lng + lng_radius)
-    )
+    vehicle_store.refresh()
+    if wants_packed(request.accept_mimetypes):
+        matches, version = _realtime_matches(lat, lng, radius, vehicle_type, since, auto_seed)[:2]
+        return packed_response(encode_vehicles(matches, (lat, lng), cursor=encode_cursor(version)))
+
+    def build():
+        matches, version, seed_result = _realtime_matches(lat, lng, radius, vehicle_type, since, auto_seed)
+        result_vehicles = realtime_vehicle_records(matches)
+        now = datetime.utcnow()
+        response_payload = {
+            'status': 'success',
+            'vehicles': result_vehicles,
+            'count': len(result_vehicles),
+            'center': {'lat': lat, 'lng': lng},
+            'radius_km': radius,
+            'timestamp': now.isoformat(),
+            'cursor': encode_cursor(version),
+        }
+        if predict:
+            _apply_prediction(response_payload, result_vehicles, [v for v, _ in matches], now)
+
+        if include_meta:
+            response_payload['meta'] = _realtime_meta(vehicle_type, since, auto_seed)
+            if seed_result:
+                response_payload['meta']['seed'] = seed_result
+
+        logger.info(
+            'Realtime vehicles response',
+            extra=_request_context({
+                'vehicle_count': len(result_vehicles),
+                'radius_km': radius,
+                'vehicle_type': vehicle_type,
+            })
+        )
+        return response_payload
+
+    # Predicted positions move with the clock, so they are never shared
+    if since or auto_seed or predict:
+        response = jsonify(build())
+        response.vary.add('Accept')
+        return response
+
+    # Polls on the same snapped tile share its candidates and their encoded
+    # records until the store changes; only the radius filter, distances and
+    # ETAs are computed per request
+    entry = tile_cache.candidates(vehicle_store, lat, lng, radius, vehicle_type)
+    order, distances = entry.select(lat, lng, radius)
+    response_payload = {
+        'status': 'success',
+        'count': len(order),
+        'center': {'lat': lat, 'lng': lng},
+        'radius_km': radius,
+        'timestamp': entry.built_at.isoformat(),
+        'cursor': encode_cursor(entry.version),
+    }
+    if include_meta:
+        response_payload['meta'] = _realtime_meta(vehicle_type, None, False)
+    body = dumps_with(response_payload, 'vehicles', encode_realtime_vehicles(entry, order, distances))
+    return encoded_response(encoded_body(body), vary=('Accept',))
+
 
+def _realtime_meta(vehicle_type, since, auto_seed):
+    return {
+        'filters': {
+            'type': vehicle_type,
+            'since': since.isoformat() if since else None,
+            'auto_seed': auto_seed,
+        },
+        'counts': _vehicle_counts(),
+    }
+
+
+def _realtime_matches(lat, lng, radius, vehicle_type, since, auto_seed):
+    """``(matches, version, seed_result)`` for a full realtime response"""
+    # Candidates are shared per tile; the exact radius is applied per request
+    matches, version = tile_cache.nearby(vehicle_store, lat, lng, radius, vehicle_type=vehicle_type)
     if since:
-        query = query.filter(Vehicle.updated_at >= since)
-    if vehicle_type:
-        query = query.filter(Vehicle.vehicle_type == vehicle_type)
+        matches = [(v, d) for v, d in matches if v.updated_at and v.updated_at >= since]
 
-    vehicles = query.all()
     seed_result = None
-
-    if not vehicles and auto_seed:
+    if not matches and auto_seed:
         seed_config = SeedConfig(
             total=20,
             radius_km=max(radius, 3.0),
@@ -292,53 +287,140 @@ def get_realtime_vehicles():
         )
         seeder = VehicleSeeder()
         seed_result = seeder.seed(seed_config)
-        vehicles = query.all()
-
+        vehicle_store.refresh(force=True)
+        version = vehicle_store.version
+        matches = vehicle_store.nearby(lat, lng, radius, vehicle_type=vehicle_type)
+    return matches, version, seed_result
+
+
+def _apply_prediction(payload, records, states, now):
+    """Dead-reckon ``records`` (parallel to ``states``) to ``now`` and add ``prediction``"""
+    options = reckoning_config(current_app.config)
+    predict_records(records, states, now, **options)
+    payload['prediction'] = prediction_meta(now, options['max_age'], options['horizon'])
+
+
+def _realtime_vehicle_changes(version, lat, lng, radius, vehicle_type, wait=0.0, predict=False):
+    """Delta response for ``get_realtime_vehicles`` in cursor mode"""
+    g.long_poll = wait > 0
+    deadline = time.monotonic() + wait
+    while True:
+        token = vehicle_store.change_token
+        vehicle_store.refresh()
+        upserts, removed, current_version = vehicle_store.changes_since(
+            version, lat, lng, radius, vehicle_type=vehicle_type
+        )
+        remaining = deadline - time.monotonic()
+        if upserts or removed or remaining <= 0:
+            break
+        # Don't hold a pooled connection while parked
+        db.session.close()
+        # Local writes wake us at once; writes from other workers are picked
+        # up by the store refresh at the top of the next slice
+        vehicle_store.wait_for_change(token, min(remaining, vehicle_store.refresh_interval))
+
+    if wants_packed(request.accept_mimetypes):
+        return packed_response(encode_vehicles(
+            upserts, (lat, lng), cursor=encode_cursor(current_version), removed=removed
+        ))
+    records = realtime_vehicle_records(upserts)
     now = datetime.utcnow()
-    result_vehicles = []
-    for vehicle in vehicles:
-        distance = calculate_distance_km(lat, lng, vehicle.current_lat, vehicle.current_lng)
-        if distance <= radius:
-            serialized = _serialize_vehicle_record(vehicle, distance)
-            serialized['eta_minutes'] = estimate_eta(distance, vehicle.vehicle_type)
-            result_vehicles.append(serialized)
-
-    result_vehicles.sort(key=lambda v: v.get('distance_km', 0))
-
-    response_payload = {
+    payload = {
         'status': 'success',
-        'vehicles': result_vehicles,
-        'count': len(result_vehicles),
+        'upserts': records,
+        'removed': removed,
+        'cursor': encode_cursor(current_version),
         'center': {'lat': lat, 'lng': lng},
         'radius_km': radius,
         'timestamp': now.isoformat(),
     }
+    if predict:
+        _apply_prediction(payload, records, [v for v, _ in upserts], now)
+    response = jsonify(payload)
+    response.vary.add('Accept')
+    return response
 
-    if include_meta:
-        response_payload['meta'] = {
-            'filters': {
-                'type': vehicle_type,
-                'since': since.isoformat() if since else None,
-                'auto_seed': auto_seed,
-            },
-            'counts': _vehicle_counts(),
-        }
-        if seed_result:
-            response_payload['meta']['seed'] = seed_result
-
-    cache.set(cache_key, response_payload, timeout=5)
 
-    logger.info(
-        'Realtime vehicles response',
-        extra=_request_context({
-            'vehicle_count': len(result_vehicles),
-            'radius_km': radius,
-            'vehicle_type': vehicle_type,
-        })
+@realtime_bp.route('/vehicles/stream', methods=['GET'])
+@limiter.limit("60 per minute")
+@handle_errors
+def stream_vehicles():
+    """
+    Server-Sent Events stream of vehicles near a coordinate
+    Query params: lat, lng, radius (km, max 20), type (optional)
+
+    Sends a ``snapshot`` event with every vehicle in the area, then ``update``
+    events holding only the vehicles that moved or entered (``upserts``) and
+    the ids that left or were deactivated (``removed``). Event ids are delta
+    cursors: streams close after VEHICLE_STREAM_MAX_DURATION seconds, and an
+    EventSource reconnecting with ``Last-Event-ID`` resumes with an update
+    instead of a full snapshot.
+    """
+    lat, lng, radius, vehicle_type = _parse_area_params()
+    last_event_id = request.headers.get('Last-Event-ID')
+    resume_version = decode_cursor(last_event_id) if last_event_id else None
+    interval = current_app.config.get('VEHICLE_STREAM_INTERVAL', 1.0)
+    keepalive = current_app.config.get('VEHICLE_STREAM_KEEPALIVE', 15.0)
+    max_duration = current_app.config.get('VEHICLE_STREAM_MAX_DURATION', 90.0)
+    subscription = AreaSubscription(lat, lng, radius, vehicle_type)
+
+    def refresh_store():
+        try:
+            vehicle_store.refresh()
+        finally:
+            # Hand the connection back to the pool between ticks
+            db.session.close()
+
+    def generate():
+        refresh_store()
+        yield f"retry: {int(interval * 2000)}\n\n"
+        if resume_version is not None:
+            upserts, removed, version = vehicle_store.changes_since(
+                resume_version, lat, lng, radius, vehicle_type=vehicle_type
+            )
+            subscription.snapshot(vehicle_store)
+            yield sse_event('update', {
+                'upserts': realtime_vehicle_records(upserts),
+                'removed': removed,
+                'timestamp': datetime.utcnow().isoformat(),
+            }, event_id=encode_cursor(version))
+        else:
+            version = vehicle_store.version
+            matches = subscription.snapshot(vehicle_store)
+            yield sse_event('snapshot', {
+                'vehicles': realtime_vehicle_records(matches),
+                'count': len(matches),
+                'center': {'lat': lat, 'lng': lng},
+                'radius_km': radius,
+                'timestamp': datetime.utcnow().isoformat(),
+            }, event_id=encode_cursor(version))
+
+        started = last_sent = time.monotonic()
+        token = vehicle_store.change_token
+        while time.monotonic() - started < max_duration:
+            # Wakes early when this process commits a vehicle write
+            vehicle_store.wait_for_change(token, interval)
+            token = vehicle_store.change_token
+            refresh_store()
+            version = vehicle_store.version
+            changes = subscription.poll(vehicle_store)
+            if changes:
+                yield sse_event('update', {
+                    'upserts': realtime_vehicle_records(changes.upserts),
+                    'removed': changes.removed,
+                    'timestamp': datetime.utcnow().isoformat(),
+                }, event_id=encode_cursor(version))
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
 
-    return jsonify(response_payload)
-
 
 @realtime_bp.route('/stops/eta', methods=['GET'])
 @limiter.limit("300 per minute")  # Increased limit for real-time data
@@ -350,6 +432,7 @@ def get_stops_with_eta():
     - lng: longitude (required)
     - radius: radius in km (default: 2.0)
     - stop_type: stop type filter (optional)
+    Stops and their arrivals are read from the precomputed arrival board.
     """
     try:
         lat = float(request.args.get('lat', 0))
@@ -360,72 +443,23 @@ def get_stops_with_eta():
         if lat == 0 and lng == 0:
             return jsonify({'error': 'Valid coordinates are required'}), 400
         
-        # Get nearby stops
-        query = db.session.query(Stop).filter(Stop.is_active == True)
-        
-        if stop_type:
-            query = query.filter(
-                (Stop.stop_type == stop_type) | (Stop.stop_type == 'combined')
-            )
-        
-        stops = query.all()
+        board = arrival_board.current(db.session)
         
+        # Stops arrive sorted by distance; nearest_vehicle is the soonest arrival
         nearby_stops = []
-        for stop in stops:
-            if stop.lat and stop.lng:
-                distance = calculate_distance_km(lat, lng, stop.lat, stop.lng)
-                
-                if distance <= radius:
-                    stop_dict = stop.to_dict()
-                    stop_dict['distance_km'] = round(distance, 2)
-                    
-                    # Find nearest vehicle to this stop
-                    nearest_vehicle = None
-                    min_vehicle_distance = float('inf')
-                    
-                    vehicles = db.session.query(Vehicle).filter(
-                        Vehicle.is_active == True,
-                        Vehicle.current_lat.isnot(None),
-                        Vehicle.current_lng.isnot(None)
-                    ).all()
-                    
-                    for vehicle in vehicles:
-                        vehicle_distance = calculate_distance_km(
-                            stop.lat, stop.lng,
-                            vehicle.current_lat, vehicle.current_lng
-                        )
-                        
-                        # Consider vehicles within 1km of the stop
-                        if vehicle_distance < 1.0 and vehicle_distance < min_vehicle_distance:
-                            min_vehicle_distance = vehicle_distance
-                            nearest_vehicle = vehicle
-                    
-                    # Calculate ETA if vehicle found
-                    if nearest_vehicle:
-                        eta_minutes = estimate_eta(
-                            min_vehicle_distance,
-                            nearest_vehicle.vehicle_type
-                        )
-                        stop_dict['nearest_vehicle'] = {
-                            'id': nearest_vehicle.id,
-                            'type': nearest_vehicle.vehicle_type,
-                            'registration': nearest_vehicle.registration,
-                            'distance_km': round(min_vehicle_distance, 2),
-                            'eta_minutes': eta_minutes
-                        }
-                    else:
-                        stop_dict['nearest_vehicle'] = None
-                    
-                    nearby_stops.append(stop_dict)
-        
-        # Sort by distance
-        nearby_stops.sort(key=lambda x: x['distance_km'])
+        for entry, distance in board.near(lat, lng, radius, stop_type):
+            stop_dict = dict(entry.stop)
+            stop_dict['distance_km'] = round(distance, 2)
+            stop_dict['nearest_vehicle'] = entry.arrivals[0] if entry.arrivals else None
+            stop_dict['arrivals'] = list(entry.arrivals)
+            nearby_stops.append(stop_dict)
         
         return jsonify({
             'stops': nearby_stops,
             'count': len(nearby_stops),
             'center': {'lat': lat, 'lng': lng},
             'radius_km': radius,
+            'as_of': board.built_at.isoformat(),
             'timestamp': datetime.utcnow().isoformat()
         })
         
@@ -434,6 +468,27 @@ def get_stops_with_eta():
     except Exception as e:
         current_app.logger.error(f'Error fetching stops with ETA: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
+
+
+@realtime_bp.route('/stops/<int:stop_id>/arrivals', methods=['GET'])
+@limiter.limit("300 per minute")
+@handle_errors
+def get_stop_arrivals(stop_id):
+    """Next vehicles approaching one stop, soonest first, from the arrival board"""
+    board = arrival_board.current(db.session)
+    entry = board.stops.get(stop_id)
+    if entry is None:
+        return jsonify({'status': 'error', 'message': 'Stop not found', 'code': 404}), 404
+    return jsonify({
+        'status': 'success',
+        'stop': entry.stop,
+        'arrivals': list(entry.arrivals),
+        'count': len(entry.arrivals),
+        'as_of': board.built_at.isoformat(),
+        'timestamp': datetime.utcnow().isoformat(),
+    })
+
+
 # Add this new debug endpoint after the health_check function
 @realtime_bp.route('/vehicles/debug', methods=['GET'])
 def debug_vehicles():
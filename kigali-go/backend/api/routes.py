@@ -3,20 +3,32 @@ Main API routes for KigaliGo application
 """
 
 from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
 from app.extensions import db
-from models.vehicle import Vehicle
 from models.zone import Zone
 from models.stop import Stop
 from models.trip import Trip
 from models.fare_rule import FareRule
-from datetime import datetime
-import requests
+from app.utils.vehicle_store import vehicle_store
+from app.utils.vehicle_ingest import ingest_positions, parse_timestamp
+from app.utils.position_history import DEFAULT_MAX_POINTS, get_trajectory
+from app.utils.position_buffer import position_buffer
+from app.utils.geo import calculate_distance_km
+from app.utils.speed_profiles import speed_profiles
+from app.utils.directions_cache import directions_cache
+from app.utils.serializers import (
+    STOP_PROJECTION, ZONE_PROJECTION, encoded_response, response_cache, stop_query, zone_query,
+)
+from datetime import datetime, timedelta
 import os
 import traceback
 import random
 
 api_bp = Blueprint('api', __name__)
 
+# Zone and stop listings change rarely; writes in this process invalidate at once
+CATALOG_RESPONSE_TTL = 60.0
+
 # Rate limiter will be initialized by the app factory
 limiter = None
 
@@ -199,24 +211,17 @@ def get_nearby_vehicles():
         if lat == 0 and lng == 0:
             return jsonify({'error': 'Valid coordinates are required'}), 400
         
-        # Query nearby vehicles - use db.session.query
-        vehicles = db.session.query(Vehicle).filter(Vehicle.is_active == True).all()
+        vehicle_store.refresh()
+        matches = vehicle_store.nearby(lat, lng, radius, vehicle_type=vehicle_type)
         
         nearby_vehicles = []
-        for vehicle in vehicles:
-            if vehicle.current_lat and vehicle.current_lng:
-                # Calculate distance (simplified)
-                distance = ((lat - vehicle.current_lat) ** 2 + (lng - vehicle.current_lng) ** 2) ** 0.5 * 111
-                
-                if distance <= radius:
-                    if not vehicle_type or vehicle.vehicle_type == vehicle_type:
-                        vehicle_dict = vehicle.to_dict()
-                        vehicle_dict['distance_km'] = round(distance, 2)
-                        vehicle_dict['eta_minutes'] = estimate_eta(distance, vehicle.vehicle_type)
-                        nearby_vehicles.append(vehicle_dict)
-        
-        # Sort by distance
-        nearby_vehicles.sort(key=lambda x: x['distance_km'])
+        for vehicle, distance in matches:
+            vehicle_dict = vehicle.to_dict()
+            vehicle_dict['distance_km'] = round(distance, 2)
+            vehicle_dict['eta_minutes'] = speed_profiles.eta(
+                distance, vehicle.vehicle_type, vehicle.current_lat, vehicle.current_lng
+            )
+            nearby_vehicles.append(vehicle_dict)
         
         return jsonify({
             'vehicles': nearby_vehicles,
@@ -228,16 +233,60 @@ def get_nearby_vehicles():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/vehicles/positions:batch', methods=['POST'])
+@jwt_required()
+@rate_limit_decorator("60 per minute")
+def ingest_vehicle_positions():
+    """Apply a batch of GPS positions from an operator feed"""
+    data = request.get_json(silent=True)
+    records = data.get('positions') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({'error': 'Expected a JSON array of positions or {"positions": [...]}'}), 400
+
+    max_batch = current_app.config.get('VEHICLE_INGEST_MAX_BATCH', 10000)
+    if len(records) > max_batch:
+        return jsonify({'error': f'Batch too large (max {max_batch} positions)'}), 413
+
+    try:
+        result = ingest_positions(
+            records, buffer=position_buffer,
+            history=current_app.config.get('POSITION_HISTORY_ENABLED', True)
+        )
+        return jsonify(result.to_dict())
+    except Exception as e:
+        current_app.logger.error(f"Position batch failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/vehicles/<int:vehicle_id>/trajectory', methods=['GET'])
+@rate_limit_decorator("60 per minute")
+def get_vehicle_trajectory(vehicle_id):
+    """Recorded track of a vehicle for a time window, downsampled to max_points"""
+    try:
+        now = datetime.utcnow()
+        end = parse_timestamp(request.args.get('end'), now)
+        start = parse_timestamp(request.args.get('start'), end - timedelta(hours=1))
+        max_points = int(request.args.get('max_points', DEFAULT_MAX_POINTS))
+        trajectory = get_trajectory(db.session, vehicle_id, start, end, max_points=max_points)
+        return jsonify(trajectory.to_dict())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/zones', methods=['GET'])
 def get_zones():
     """Get all zones"""
     try:
-        # Use db.session.query to ensure we're using the correct db instance
-        zones = db.session.query(Zone).filter_by(is_active=True).all()
-        return jsonify({
-            'zones': [zone.to_dict() for zone in zones],
-            'count': len(zones)
-        })
+        def build():
+            zones = ZONE_PROJECTION.dicts(
+                zone_query(db.session).filter(Zone.is_active == True).order_by(Zone.id)
+            )
+            return {'zones': zones, 'count': len(zones)}
+
+        entry = response_cache.fetch(
+            ('zones',), response_cache.catalog_version, build, ttl=CATALOG_RESPONSE_TTL
+        )
+        return encoded_response(entry)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -248,21 +297,19 @@ def get_stops():
         zone_id = request.args.get('zone_id')
         stop_type = request.args.get('type')
         
-        # Use db.session.query to ensure we're using the correct db instance
-        query = db.session.query(Stop).filter_by(is_active=True)
-        
-        if zone_id:
-            query = query.filter_by(zone_id=zone_id)
-        
-        if stop_type:
-            query = query.filter(Stop.stop_type == stop_type)
-        
-        stops = query.all()
-        
-        return jsonify({
-            'stops': [stop.to_dict() for stop in stops],
-            'count': len(stops)
-        })
+        def build():
+            query = stop_query(db.session).filter(Stop.is_active == True)
+            if zone_id:
+                query = query.filter(Stop.zone_id == zone_id)
+            if stop_type:
+                query = query.filter(Stop.stop_type == stop_type)
+            stops = STOP_PROJECTION.dicts(query.order_by(Stop.id))
+            return {'stops': stops, 'count': len(stops)}
+
+        entry = response_cache.fetch(
+            ('stops', zone_id, stop_type), response_cache.catalog_version, build, ttl=CATALOG_RESPONSE_TTL
+        )
+        return encoded_response(entry)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -398,16 +445,15 @@ def get_statistics():
                 'timestamp': datetime.utcnow().isoformat()
             }), 200
         
-        # Use db.session.query to ensure we're using the correct db instance
+        # Vehicle figures come from the store's running counters
+        vehicle_store.refresh()
+        vehicle_counts = vehicle_store.counters.snapshot()
         stats = {
-            'total_vehicles': db.session.query(Vehicle).filter_by(is_active=True).count(),
+            'total_vehicles': vehicle_counts['active'],
             'total_zones': db.session.query(Zone).filter_by(is_active=True).count(),
             'total_stops': db.session.query(Stop).filter_by(is_active=True).count(),
             'total_trips': db.session.query(Trip).count(),
-            'active_vehicles': db.session.query(Vehicle).filter(
-                Vehicle.is_active == True,
-                Vehicle.last_seen >= datetime.utcnow().replace(hour=0, minute=0, second=0)
-            ).count() if hasattr(Vehicle, 'last_seen') else db.session.query(Vehicle).filter_by(is_active=True).count(),
+            'active_vehicles': vehicle_counts['seen_today'],
             'today_trips': db.session.query(Trip).filter(
                 Trip.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)
             ).count() if hasattr(Trip, 'created_at') else 0
@@ -435,24 +481,13 @@ def get_statistics():
 
 def get_route_options(origin_lat, origin_lng, dest_lat, dest_lng):
     """Get route options using Google Directions API or fallback calculation"""
-    google_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    
-    if google_api_key:
+    if os.getenv('GOOGLE_MAPS_API_KEY'):
         try:
-            # Use Google Directions API
-            url = "https://maps.googleapis.com/maps/api/directions/json"
-            params = {
-                'origin': f"{origin_lat},{origin_lng}",
-                'destination': f"{dest_lat},{dest_lng}",
-                'key': google_api_key,
-                'mode': 'driving'  # Default mode
-            }
+            # Google Directions API, through the snapped-coordinate cache
+            routes = directions_cache.directions(origin_lat, origin_lng, dest_lat, dest_lng, 'driving')
             
-            response = requests.get(url, params=params)
-            data = response.json()
-            
-            if data['status'] == 'OK' and data['routes']:
-                route = data['routes'][0]
+            if routes:
+                route = routes[0]
                 leg = route['legs'][0]
                 
                 distance_km = leg['distance']['value'] / 1000
@@ -492,8 +527,8 @@ def get_route_options(origin_lat, origin_lng, dest_lat, dest_lng):
         except Exception as e:
             print(f"Google Directions API error: {e}")
     
-    # Fallback: Simple distance calculation
-    distance_km = ((dest_lat - origin_lat) ** 2 + (dest_lng - origin_lng) ** 2) ** 0.5 * 111
+    # Fallback: Straight-line distance
+    distance_km = calculate_distance_km(origin_lat, origin_lng, dest_lat, dest_lng)
     
     return [
         {
@@ -566,13 +601,3 @@ def calculate_fare_estimate(mode, distance_km, duration_minutes):
         elif mode == 'bus':
             return max(500, round(distance_km * 200))
         return 1000
-
-def estimate_eta(distance_km, vehicle_type):
-    """Estimate arrival time based on distance and vehicle type"""
-    if vehicle_type == 'bus':
-        return round(distance_km * 1.5, 1)  # 40 km/h average
-    elif vehicle_type == 'moto':
-        return round(distance_km * 1.0, 1)  # 60 km/h average
-    elif vehicle_type == 'taxi':
-        return round(distance_km * 1.2, 1)  # 50 km/h average
-    return round(distance_km * 1.5, 1)
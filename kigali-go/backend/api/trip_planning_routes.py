@@ -7,46 +7,15 @@ from app.extensions import db
 from models.vehicle import Vehicle
 from models.stop import Stop
 from models.zone import Zone
+from app.utils.geo import calculate_distance_km
+from app.utils.speed_profiles import speed_profiles
+from app.utils.directions_cache import directions_cache
 from datetime import datetime
-import requests
-import os
-import math
 import random
 
 trip_planning_bp = Blueprint('trip_planning', __name__)
 
 
-def calculate_distance_km(lat1, lng1, lat2, lng2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(dlat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlng / 2) ** 2)
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    
-    return distance
-
-
-def estimate_eta(distance_km, vehicle_type, traffic_factor=1.0):
-    """Estimate arrival time based on distance and vehicle type"""
-    speeds = {
-        'bus': 30,
-        'taxi': 40,
-        'moto': 50
-    }
-    
-    base_speed = speeds.get(vehicle_type, 35)
-    adjusted_speed = base_speed * traffic_factor
-    eta_minutes = (distance_km / adjusted_speed) * 60
-    return round(eta_minutes, 1)
-
-
 def calculate_fare_estimate(mode, distance_km, duration_minutes):
     """
     Calculate fare estimate with randomized fares for taxis and motos.
@@ -112,35 +81,9 @@ def get_google_directions(origin_lat, origin_lng, dest_lat, dest_lng, mode='driv
     """
     Get directions from Google Directions API
     Returns route data including polyline, steps, distance, duration
+    Responses are cached on snapped coordinates (see app.utils.directions_cache)
     """
-    google_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    
-    if not google_api_key:
-        current_app.logger.warning('Google Maps API key not configured')
-        return None
-    
-    try:
-        url = "https://maps.googleapis.com/maps/api/directions/json"
-        params = {
-            'origin': f"{origin_lat},{origin_lng}",
-            'destination': f"{dest_lat},{dest_lng}",
-            'key': google_api_key,
-            'mode': mode,
-            'alternatives': 'true',  # Get alternative routes
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        if data['status'] == 'OK' and data['routes']:
-            return data['routes']
-        else:
-            current_app.logger.warning(f'Google Directions API error: {data.get("status")}')
-            return None
-            
-    except Exception as e:
-        current_app.logger.error(f'Google Directions API error: {e}')
-        return None
+    return directions_cache.directions(origin_lat, origin_lng, dest_lat, dest_lng, mode)
 
 
 def parse_google_route(route, vehicle_mode):
@@ -289,7 +232,9 @@ def plan_trip():
             else:
                 # Fallback: Calculate without Google Directions
                 distance_km = calculate_distance_km(origin_lat, origin_lng, dest_lat, dest_lng)
-                duration_minutes = estimate_eta(distance_km, mode)
+                duration_minutes = speed_profiles.eta(
+                    distance_km, mode, (origin_lat + dest_lat) / 2, (origin_lng + dest_lng) / 2
+                )
                 fare = calculate_fare_estimate(mode, distance_km, duration_minutes)
                 
                 route_option = {
@@ -400,7 +345,9 @@ def compare_routes():
             else:
                 # Fallback
                 distance_km = calculate_distance_km(origin_lat, origin_lng, dest_lat, dest_lng)
-                duration_minutes = estimate_eta(distance_km, mode)
+                duration_minutes = speed_profiles.eta(
+                    distance_km, mode, (origin_lat + dest_lat) / 2, (origin_lng + dest_lng) / 2
+                )
                 fare = calculate_fare_estimate(mode, distance_km, duration_minutes)
                 route_options.append({
                     'mode': mode,
@@ -3,102 +3,57 @@ Vehicle movement simulation for testing real-time features
 Simulates vehicles moving around Kigali
 """
 
-from flask import Blueprint, jsonify, current_app
+from functools import wraps
+
+from flask import Blueprint, jsonify, current_app, request
+from flask_jwt_extended import jwt_required
 from app.extensions import db
-from models.vehicle import Vehicle
+from app.utils.fleet_simulator import fleet_simulator
 from datetime import datetime
-import random
-import math
 
 simulation_bp = Blueprint('simulation', __name__)
 
-# Kigali bounds for realistic movement
-KIGALI_CENTER = {'lat': -1.9441, 'lng': 30.0619}
-KIGALI_BOUNDS = {
-    'min_lat': -1.98,
-    'max_lat': -1.90,
-    'min_lng': 30.03,
-    'max_lng': 30.14
-}
+
+def simulation_api(view):
+    """Refuse endpoints that write vehicles unless SIMULATION_API_ENABLED is set"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('SIMULATION_API_ENABLED', False):
+            return jsonify({
+                'error': 'Simulation endpoints are disabled',
+                'message': 'Set SIMULATION_API_ENABLED or run scripts/run_simulation.py'
+            }), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _simulated_only(data):
+    """False when the request body asks to move real vehicles too (``all_vehicles``)"""
+    default = current_app.config.get('SIMULATION_SIMULATED_ONLY', True)
+    return not bool(data.get('all_vehicles', not default))
 
 
 def simulate_vehicle_movement():
     """
     Simulate realistic vehicle movement within Kigali
-    Moves vehicles in random directions with realistic speeds
+    Advances the simulated fleet by one tick and writes it in one statement
     """
     try:
-        vehicles = db.session.query(Vehicle).filter(Vehicle.is_active == True).all()
-        
-        if not vehicles:
+        result = fleet_simulator.tick(db.session)
+
+        if not result['moved_count']:
             return {
                 'message': 'No active vehicles to simulate',
                 'moved_count': 0
             }
-        
-        moved_count = 0
-        
-        for vehicle in vehicles:
-            if not vehicle.current_lat or not vehicle.current_lng:
-                # Set initial random location if vehicle has no location
-                vehicle.current_lat = KIGALI_CENTER['lat'] + random.uniform(-0.05, 0.05)
-                vehicle.current_lng = KIGALI_CENTER['lng'] + random.uniform(-0.05, 0.05)
-                vehicle.bearing = random.uniform(0, 360)
-                vehicle.speed = random.uniform(20, 50)  # km/h
-            else:
-                # Move vehicle based on current bearing and speed
-                # Convert speed from km/h to degrees per update (assuming 30s updates)
-                # 1 degree latitude ≈ 111 km
-                # 1 degree longitude ≈ 111 km * cos(latitude)
-                
-                speed_km_per_sec = vehicle.speed / 3600  # km per second
-                time_interval = 30  # seconds between updates
-                distance_km = speed_km_per_sec * time_interval
-                
-                # Convert to degrees
-                lat_change = (distance_km / 111) * math.cos(math.radians(vehicle.bearing or 0))
-                lng_change = (distance_km / 111) * math.sin(math.radians(vehicle.bearing or 0)) / math.cos(math.radians(vehicle.current_lat))
-                
-                new_lat = vehicle.current_lat + lat_change
-                new_lng = vehicle.current_lng + lng_change
-                
-                # Keep within Kigali bounds
-                if new_lat < KIGALI_BOUNDS['min_lat'] or new_lat > KIGALI_BOUNDS['max_lat']:
-                    vehicle.bearing = (vehicle.bearing + 180) % 360  # Reverse direction
-                    new_lat = vehicle.current_lat
-                
-                if new_lng < KIGALI_BOUNDS['min_lng'] or new_lng > KIGALI_BOUNDS['max_lng']:
-                    vehicle.bearing = (vehicle.bearing + 180) % 360  # Reverse direction
-                    new_lng = vehicle.current_lng
-                
-                # Occasionally change direction (10% chance)
-                if random.random() < 0.1:
-                    vehicle.bearing = (vehicle.bearing + random.uniform(-45, 45)) % 360
-                
-                # Occasionally change speed (5% chance)
-                if random.random() < 0.05:
-                    if vehicle.vehicle_type == 'bus':
-                        vehicle.speed = random.uniform(20, 40)
-                    elif vehicle.vehicle_type == 'taxi':
-                        vehicle.speed = random.uniform(30, 50)
-                    elif vehicle.vehicle_type == 'moto':
-                        vehicle.speed = random.uniform(40, 60)
-                
-                vehicle.current_lat = new_lat
-                vehicle.current_lng = new_lng
-            
-            vehicle.last_seen = datetime.utcnow()
-            vehicle.updated_at = datetime.utcnow()
-            moved_count += 1
-        
-        db.session.commit()
-        
+
         return {
-            'message': f'Simulated movement for {moved_count} vehicles',
-            'moved_count': moved_count,
+            'message': f"Simulated movement for {result['moved_count']} vehicles",
+            'moved_count': result['moved_count'],
+            'tick_seconds': result['tick_seconds'],
             'timestamp': datetime.utcnow().isoformat()
         }
-        
+
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Error simulating vehicle movement: {str(e)}')
@@ -109,8 +64,18 @@ def simulate_vehicle_movement():
 
 
 @simulation_bp.route('/vehicles/simulate', methods=['POST'])
+@simulation_api
+@jwt_required()
 def simulate_movement():
-    """Endpoint to trigger vehicle movement simulation"""
+    """Endpoint to trigger vehicle movement simulation (``all_vehicles`` also moves real ones)"""
+    if fleet_simulator.running:
+        return jsonify({
+            'error': 'Auto-simulation is running',
+            'status': fleet_simulator.status()
+        }), 409
+
+    fleet_simulator.set_simulated_only(_simulated_only(request.get_json(silent=True) or {}))
+
     result = simulate_vehicle_movement()
     
     if 'error' in result:
@@ -120,15 +85,62 @@ def simulate_movement():
 
 
 @simulation_bp.route('/vehicles/auto-simulate/start', methods=['POST'])
+@simulation_api
+@jwt_required()
 def start_auto_simulation():
-    """Start automatic vehicle movement simulation (runs every 30 seconds)"""
-    # In production, this would use a background task scheduler
-    # For now, return instructions
+    """Start the background simulator in this process
+
+    Optional JSON body: ``interval`` (seconds between ticks), ``vehicles``
+    (spawn simulated vehicles until this many are active, for load tests),
+    ``mode`` (``free`` or ``routes``) and ``all_vehicles`` (also move real
+    vehicles, not only ``SIM*`` ones).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data.get('interval', current_app.config.get('SIMULATION_INTERVAL', 2.0)))
+        target = int(data['vehicles']) if data.get('vehicles') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'interval and vehicles must be numbers'}), 400
+    mode = data.get('mode', fleet_simulator.mode)
+    if mode not in ('free', 'routes'):
+        return jsonify({'error': "mode must be 'free' or 'routes'"}), 400
+    if interval < 0.1:
+        return jsonify({'error': 'interval must be at least 0.1 seconds'}), 400
+
+    if fleet_simulator.running:
+        return jsonify({'message': 'Auto-simulation already running', 'status': fleet_simulator.status()}), 409
+
+    spawned = 0
+    fleet_simulator.set_simulated_only(_simulated_only(data))
+    try:
+        if target:
+            spawned = fleet_simulator.spawn(db.session, target)
+        fleet_simulator.set_mode(db.session, mode)
+        fleet_simulator.load(db.session)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error starting simulation: {str(e)}')
+        return jsonify({'error': 'Failed to start simulation', 'message': str(e)}), 500
+
+    fleet_simulator.start(current_app._get_current_object(), interval=interval)
     return jsonify({
         'message': 'Auto-simulation started',
-        'instructions': 'Call /api/v1/simulation/vehicles/simulate every 30 seconds',
-        'note': 'In production, use Celery or similar task scheduler'
+        'spawned': spawned,
+        'status': fleet_simulator.status()
     }), 200
 
 
+@simulation_bp.route('/vehicles/auto-simulate/stop', methods=['POST'])
+@simulation_api
+@jwt_required()
+def stop_auto_simulation():
+    """Stop the background simulator running in this process"""
+    if not fleet_simulator.stop():
+        return jsonify({'message': 'Auto-simulation is not running in this process', 'status': fleet_simulator.status()}), 409
+    return jsonify({'message': 'Auto-simulation stopped', 'status': fleet_simulator.status()}), 200
+
 
+@simulation_bp.route('/vehicles/auto-simulate/status', methods=['GET'])
+def auto_simulation_status():
+    """Report the background simulator state"""
+    return jsonify(fleet_simulator.status()), 200
@@ -5,6 +5,15 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from app.extensions import db, migrate, jwt, limiter, ma, bcrypt, cache
 from app.config import config_by_name
+from app.utils.vehicle_store import vehicle_store
+from app.utils.position_buffer import position_buffer
+from app.utils.tile_cache import tile_cache
+from app.utils.vector_tiles import vector_tiles
+from app.utils.serializers import response_cache
+from app.utils.speed_profiles import speed_profiles
+from app.utils.arrival_board import arrival_board
+from app.utils.directions_cache import directions_cache
+from app.utils.fleet_simulator import fleet_simulator
 from utils.error_handlers import register_error_handlers
 import os
 import traceback
@@ -59,6 +68,15 @@ def create_app(config_name: str = None) -> Flask:
     ma.init_app(app)
     bcrypt.init_app(app)
     cache.init_app(app)
+    vehicle_store.init_app(app)
+    position_buffer.init_app(app)
+    tile_cache.init_app(app)
+    vector_tiles.init_app(app)
+    response_cache.init_app(app)
+    speed_profiles.init_app(app)
+    arrival_board.init_app(app)
+    directions_cache.init_app(app)
+    fleet_simulator.init_app(app)
     
     # Configure CORS
     CORS(app, 
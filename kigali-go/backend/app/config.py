@@ -38,6 +38,90 @@ class Config:
     CACHE_TYPE = os.getenv('CACHE_TYPE', 'SimpleCache')
     CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
     CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', '5'))
+
+    # In-memory vehicle state store (seconds)
+    VEHICLE_STORE_REFRESH_INTERVAL = float(os.getenv('VEHICLE_STORE_REFRESH_INTERVAL', '1.0'))
+    VEHICLE_STORE_FULL_RELOAD_INTERVAL = float(os.getenv('VEHICLE_STORE_FULL_RELOAD_INTERVAL', '60'))
+
+    # Server-Sent Events vehicle stream (seconds); streams end before the
+    # gunicorn worker timeout and clients reconnect automatically
+    VEHICLE_STREAM_INTERVAL = float(os.getenv('VEHICLE_STREAM_INTERVAL', '1.0'))
+    VEHICLE_STREAM_KEEPALIVE = float(os.getenv('VEHICLE_STREAM_KEEPALIVE', '15'))
+    VEHICLE_STREAM_MAX_DURATION = float(os.getenv('VEHICLE_STREAM_MAX_DURATION', '90'))
+
+    # Tile cache for nearby-vehicle queries: tile size in km, and how long
+    # (seconds) a tile's candidates may be served after the store changes
+    REALTIME_TILE_KM = float(os.getenv('REALTIME_TILE_KM', '0.5'))
+    REALTIME_TILE_CACHE_TTL = float(os.getenv('REALTIME_TILE_CACHE_TTL', '2.0'))
+    REALTIME_TILE_CACHE_MAX_ENTRIES = int(os.getenv('REALTIME_TILE_CACHE_MAX_ENTRIES', '4096'))
+
+    # Encoded response bodies shared by identical requests: lifetime (seconds), size,
+    # and how long past expiry a body may still be served while it is rebuilt
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '5.0'))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '2048'))
+    RESPONSE_CACHE_STALE_TTL = float(os.getenv('RESPONSE_CACHE_STALE_TTL', '5.0'))
+
+    # Dead reckoning for ?predict=true realtime responses: maximum fix age (seconds) to
+    # extrapolate from, how long (seconds) clients may animate before polling, minimum km/h
+    DEAD_RECKONING_MAX_AGE = float(os.getenv('DEAD_RECKONING_MAX_AGE', '45'))
+    DEAD_RECKONING_HORIZON = float(os.getenv('DEAD_RECKONING_HORIZON', '20'))
+    DEAD_RECKONING_MIN_SPEED = float(os.getenv('DEAD_RECKONING_MIN_SPEED', '2'))
+
+    # Learned ETA speeds per zone and hour of week: history window (days), rebuild interval
+    # (seconds, 0 disables), fixes needed before a bucket overrides the fallback, optional shared file
+    SPEED_PROFILE_WINDOW_DAYS = int(os.getenv('SPEED_PROFILE_WINDOW_DAYS', '14'))
+    SPEED_PROFILE_REFRESH_INTERVAL = float(os.getenv('SPEED_PROFILE_REFRESH_INTERVAL', '3600'))
+    SPEED_PROFILE_MIN_SAMPLES = int(os.getenv('SPEED_PROFILE_MIN_SAMPLES', '30'))
+    SPEED_PROFILE_PATH = os.getenv('SPEED_PROFILE_PATH', '')
+
+    # Precomputed stop arrival board: rebuild interval (seconds, 0 rebuilds on request),
+    # arrivals kept per stop, and how far (km) from a stop vehicles are considered
+    ARRIVAL_BOARD_INTERVAL = float(os.getenv('ARRIVAL_BOARD_INTERVAL', '5'))
+    ARRIVAL_BOARD_SIZE = int(os.getenv('ARRIVAL_BOARD_SIZE', '3'))
+    ARRIVAL_BOARD_RADIUS_KM = float(os.getenv('ARRIVAL_BOARD_RADIUS_KM', '1.0'))
+
+    # Google Directions cache: entry lifetime (seconds), in-memory entries, coordinate snap
+    # (degrees; 0.001 is ~110 m), optional SQLite file that survives restarts, request timeout
+    DIRECTIONS_CACHE_TTL = float(os.getenv('DIRECTIONS_CACHE_TTL', '21600'))
+    DIRECTIONS_CACHE_MAX_ENTRIES = int(os.getenv('DIRECTIONS_CACHE_MAX_ENTRIES', '10000'))
+    DIRECTIONS_CACHE_SNAP_DEG = float(os.getenv('DIRECTIONS_CACHE_SNAP_DEG', '0.001'))
+    DIRECTIONS_CACHE_PATH = os.getenv('DIRECTIONS_CACHE_PATH', '')
+    DIRECTIONS_TIMEOUT = float(os.getenv('DIRECTIONS_TIMEOUT', '10'))
+
+    # Pre-rendered vector tiles for stops and zones (/map/tiles/<z>/<x>/<y>.mvt):
+    # zoom range, optional on-disk cache, and how often (seconds) to check the data for changes
+    MVT_MIN_ZOOM = int(os.getenv('MVT_MIN_ZOOM', '10'))
+    MVT_MAX_ZOOM = int(os.getenv('MVT_MAX_ZOOM', '14'))
+    MVT_CACHE_DIR = os.getenv('MVT_CACHE_DIR', '')
+    MVT_CHECK_INTERVAL = float(os.getenv('MVT_CHECK_INTERVAL', '60'))
+
+    # Upper bound for ?wait= long-polls on /realtime/vehicles/realtime (seconds)
+    VEHICLE_LONG_POLL_MAX_WAIT = float(os.getenv('VEHICLE_LONG_POLL_MAX_WAIT', '25'))
+
+    # Largest batch accepted by POST /vehicles/positions:batch
+    VEHICLE_INGEST_MAX_BATCH = int(os.getenv('VEHICLE_INGEST_MAX_BATCH', '10000'))
+
+    # Write-behind buffer for ingested positions: flush period in seconds
+    # (0 writes every batch straight through) and the backlog that forces an early flush
+    VEHICLE_WRITE_BEHIND_INTERVAL = float(os.getenv('VEHICLE_WRITE_BEHIND_INTERVAL', '1.0'))
+    VEHICLE_WRITE_BEHIND_MAX_PENDING = int(os.getenv('VEHICLE_WRITE_BEHIND_MAX_PENDING', '50000'))
+    VEHICLE_WRITE_BEHIND_MAX_HISTORY = int(os.getenv('VEHICLE_WRITE_BEHIND_MAX_HISTORY', '200000'))
+
+    # Position history (vehicle_positions): append ingested fixes, and the
+    # settings used by scripts/maintain_position_history.py
+    POSITION_HISTORY_ENABLED = os.getenv('POSITION_HISTORY_ENABLED', 'True').lower() == 'true'
+    POSITION_HISTORY_RETENTION_DAYS = int(os.getenv('POSITION_HISTORY_RETENTION_DAYS', '30'))
+    POSITION_HISTORY_COMPACT_AFTER_DAYS = int(os.getenv('POSITION_HISTORY_COMPACT_AFTER_DAYS', '7'))
+    POSITION_HISTORY_COMPACT_INTERVAL = int(os.getenv('POSITION_HISTORY_COMPACT_INTERVAL', '30'))  # seconds
+
+    # Fleet simulator (/simulation/vehicles/auto-simulate, scripts/run_simulation.py)
+    SIMULATION_INTERVAL = float(os.getenv('SIMULATION_INTERVAL', '2.0'))
+    SIMULATION_MAX_VEHICLES = int(os.getenv('SIMULATION_MAX_VEHICLES', '50000'))
+    SIMULATION_MODE = os.getenv('SIMULATION_MODE', 'free')  # free | routes
+    # Move only SIM* vehicles; real vehicles are left alone unless a run asks for all
+    SIMULATION_SIMULATED_ONLY = os.getenv('SIMULATION_SIMULATED_ONLY', 'True').lower() == 'true'
+    # In-process simulate/start/stop endpoints (a sidecar is the multi-worker option)
+    SIMULATION_API_ENABLED = os.getenv('SIMULATION_API_ENABLED', 'False').lower() == 'true'
     
     # Email configuration (for development, we'll log tokens)
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -63,6 +147,7 @@ class DevelopmentConfig(Config):
         'sqlite:///kigali_go_dev.db'
     )
     JWT_COOKIE_SECURE = False
+    SIMULATION_API_ENABLED = os.getenv('SIMULATION_API_ENABLED', 'True').lower() == 'true'
     # Connection pool sizing for local dev (adjustable via env)
     _pool_size = int(os.getenv('SQL_POOL_SIZE', '5'))
     _max_overflow = int(os.getenv('SQL_MAX_OVERFLOW', '10'))
@@ -83,6 +168,10 @@ class TestingConfig(Config):
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=30)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(seconds=60)
     BCRYPT_LOG_ROUNDS = 4  # Faster for tests
+    VEHICLE_WRITE_BEHIND_INTERVAL = 0  # write-through keeps tests deterministic
+    SPEED_PROFILE_REFRESH_INTERVAL = 0  # fixed speeds unless a test builds a table
+    ARRIVAL_BOARD_INTERVAL = 0  # rebuilt on request
+    SIMULATION_API_ENABLED = True
 
 
 class ProductionConfig(Config):
@@ -0,0 +1,247 @@
+"""Materialized next-arrivals board for every active stop.
+
+Computing "which vehicles are coming to this stop" per request costs a
+proximity join against the whole fleet. The board does that join once
+per refresh cycle for all active stops. It is one vectorized pass over
+the vehicle grid index (``GridIndex.pairs_within``) with ETAs from the
+learned speed table. Each stop's arrival list is prepared ahead of time.
+
+A vehicle counts as approaching a stop when it is within ``radius_km`` and
+meets one of these conditions:
+
+* its bearing points within 90 degrees of the stop;
+* it is stationary (it may be dwelling at or near the stop);
+* it is already at the stop (``AT_STOP_KM``).
+
+The ``size`` soonest arrivals by ETA are kept per stop. The stops are also
+indexed by position, so "stops near me" is answered from memory as well.
+A request reads the current ``Board`` and slices it. Its cost depends on
+the number of stops it returns, not on the fleet size.
+
+A background thread rebuilds the board every ``interval`` seconds, but
+only when the vehicle store or the stop catalog changed. With the thread
+disabled (``interval`` 0), requests rebuild it on demand under the same
+rule. Each worker process keeps its own board.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.geo import bearing_array, estimate_eta_array
+from app.utils.spatial_index import GridIndex
+from app.utils.speed_profiles import speed_profiles
+from app.utils.vehicle_store import vehicle_store
+
+logger = logging.getLogger(__name__)
+
+AT_STOP_KM = 0.05
+STATIONARY_KMH = 2.0
+FLEET_CELL_KM = 1.0
+
+
+class StopBoard(NamedTuple):
+    stop: Dict
+    arrivals: Tuple[Dict, ...]
+
+
+class Board(NamedTuple):
+    stops: Dict[int, StopBoard]
+    stop_ids: np.ndarray       # stop id per point of ``index``
+    stop_types: np.ndarray     # object array parallel to ``stop_ids``
+    index: GridIndex
+    built_at: datetime
+    vehicles_version: int      # vehicle_store.generation it was built from
+    catalog_version: Tuple[int, float]
+
+    def near(self, lat: float, lng: float, radius_km: float,
+             stop_type: Optional[str] = None) -> List[Tuple[StopBoard, float]]:
+        """Stops within ``radius_km``, nearest first; ``stop_type`` also admits combined stops."""
+        _, points, distances = self.index.pairs_within([lat], [lng], radius_km)
+        if stop_type:
+            keep = (self.stop_types[points] == stop_type) | (self.stop_types[points] == "combined")
+            points, distances = points[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return [(self.stops[int(self.stop_ids[p])], float(d)) for p, d in zip(points[order], distances[order])]
+
+
+def build_board(stops: Sequence[Dict], fleet, size: int = 3, radius_km: float = 1.0,
+                now: Optional[datetime] = None, vehicles_version: int = 0,
+                catalog_version: Tuple[int, float] = (0, 0.0)) -> Board:
+    """Next ``size`` approaching vehicles for every stop dict (``id``, ``lat``, ``lng``, ``stop_type``).
+
+    ``fleet`` is a ``vehicle_store.grid_index()`` result: a grid index whose
+    point ``i`` is the vehicle state ``fleet.rows[i]``.
+    """
+    now = now or datetime.utcnow()
+    stops = [stop for stop in stops if stop.get("lat") is not None and stop.get("lng") is not None]
+    stop_lats = np.array([stop["lat"] for stop in stops], dtype=float)
+    stop_lngs = np.array([stop["lng"] for stop in stops], dtype=float)
+    arrivals: List[List[Dict]] = [[] for _ in stops]
+
+    stop_idx, vehicle_idx, distances = fleet.index.pairs_within(stop_lats, stop_lngs, radius_km)
+    if len(stop_idx):
+        # Per-vehicle columns once, then gathered per candidate pair
+        rows = fleet.rows
+        lats, lngs = fleet.index.lats, fleet.index.lngs
+        bearings = np.array([np.nan if v.bearing is None else v.bearing for v in rows], dtype=float)
+        moving = np.array([(v.speed or 0.0) >= STATIONARY_KMH for v in rows], dtype=bool)
+        speeds = speed_profiles.speeds(lats, lngs, [v.vehicle_type for v in rows], now)
+
+        to_stop = bearing_array(lats[vehicle_idx], lngs[vehicle_idx], stop_lats[stop_idx], stop_lngs[stop_idx])
+        heading = bearings[vehicle_idx]
+        off_course = np.abs((heading - to_stop + 180.0) % 360.0 - 180.0)
+        with np.errstate(invalid="ignore"):
+            approaching = (
+                (off_course <= 90.0) | np.isnan(heading)
+                | ~moving[vehicle_idx] | (distances <= AT_STOP_KM)
+            )
+        kept = np.flatnonzero(approaching)
+        etas = estimate_eta_array(distances[kept], None, speeds_kmh=speeds[vehicle_idx[kept]])
+
+        # Soonest ``size`` per stop: sort by (stop, eta) and rank within each stop
+        order = np.lexsort((distances[kept], etas, stop_idx[kept]))
+        grouped = stop_idx[kept][order]
+        starts = np.searchsorted(grouped, grouped, side="left")
+        order = order[np.arange(len(order)) - starts < size]
+
+        for i, eta in zip(kept[order].tolist(), etas[order].tolist()):
+            vehicle = rows[vehicle_idx[i]]
+            arrivals[int(stop_idx[i])].append({
+                "id": vehicle.id,
+                "type": vehicle.vehicle_type,
+                "registration": vehicle.registration,
+                "route_name": vehicle.route_name,
+                "distance_km": round(float(distances[i]), 2),
+                "eta_minutes": eta,
+            })
+
+    return Board(
+        stops={stop["id"]: StopBoard(stop, tuple(found)) for stop, found in zip(stops, arrivals)},
+        stop_ids=np.array([stop["id"] for stop in stops], dtype=np.int64),
+        stop_types=np.array([stop.get("stop_type") for stop in stops], dtype=object),
+        index=GridIndex(stop_lats, stop_lngs, cell_km=1.0),
+        built_at=now,
+        vehicles_version=vehicles_version,
+        catalog_version=catalog_version,
+    )
+
+
+class ArrivalBoard:
+    """The current ``Board`` plus the thread that rebuilds it."""
+
+    def __init__(self, interval: float = 5.0, size: int = 3, radius_km: float = 1.0,
+                 stops_interval: float = 60.0):
+        self.interval = interval
+        self.size = size
+        self.radius_km = radius_km
+        self.stops_interval = stops_interval
+
+        self._app = None
+        self._board: Optional[Board] = None
+        self._stops: Optional[List[Dict]] = None
+        self._stops_loaded = 0.0
+        self._stops_version = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.builds = 0
+        self.failures = 0
+        self.last_build_ms = 0.0
+
+    def init_app(self, app) -> None:
+        self.interval = float(app.config.get("ARRIVAL_BOARD_INTERVAL", self.interval))
+        self.size = int(app.config.get("ARRIVAL_BOARD_SIZE", self.size))
+        self.radius_km = float(app.config.get("ARRIVAL_BOARD_RADIUS_KM", self.radius_km))
+        self._app = app
+        app.extensions["arrival_board"] = self
+
+    @property
+    def enabled(self) -> bool:
+        """False when no app is bound or ``interval`` is 0 (rebuild on demand)."""
+        return self._app is not None and self.interval > 0
+
+    def current(self, session) -> Board:
+        """The board to answer a request from; only built here before the thread's first run."""
+        board = self._board
+        if board is None or not self.enabled:
+            board = self.refresh(session)
+        self._ensure_thread()
+        return board
+
+    def _load_stops(self, session) -> List[Dict]:
+        from app.utils.serializers import STOP_PROJECTION, response_cache, stop_query
+        from models.stop import Stop
+
+        now = time.monotonic()
+        catalog = response_cache.catalog_version
+        if self._stops is None or catalog != self._stops_version or now - self._stops_loaded >= self.stops_interval:
+            self._stops = STOP_PROJECTION.dicts(stop_query(session).filter(Stop.is_active == True))  # noqa: E712
+            self._stops_version = catalog
+            self._stops_loaded = now
+        return self._stops
+
+    def refresh(self, session, force: bool = False) -> Board:
+        """Rebuild the board if the fleet or the stops changed since the last build."""
+        with self._lock:
+            vehicle_store.refresh(session)
+            stops = self._load_stops(session)
+            versions = (vehicle_store.generation, (self._stops_version, self._stops_loaded))
+            board = self._board
+            if board is not None and not force and (board.vehicles_version, board.catalog_version) == versions:
+                return board
+            started = time.perf_counter()
+            board = build_board(
+                stops, vehicle_store.grid_index(cell_km=FLEET_CELL_KM), size=self.size,
+                radius_km=self.radius_km, vehicles_version=versions[0], catalog_version=versions[1],
+            )
+            self.last_build_ms = (time.perf_counter() - started) * 1000
+            self.builds += 1
+            self._board = board
+            return board
+
+    def _ensure_thread(self) -> None:
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="arrival-board", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        from app.extensions import db
+
+        while not self._stopped.wait(self.interval):
+            try:
+                with self._app.app_context():
+                    try:
+                        self.refresh(db.session)
+                    finally:
+                        db.session.remove()
+            except Exception:
+                self.failures += 1
+                logger.exception("Arrival board refresh failed")
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def stats(self) -> Dict:
+        board = self._board
+        return {
+            "enabled": self.enabled,
+            "stops": len(board.stops) if board else 0,
+            "built_at": board.built_at.isoformat() if board else None,
+            "builds": self.builds,
+            "failures": self.failures,
+            "last_build_ms": round(self.last_build_ms, 1),
+        }
+
+
+arrival_board = ArrivalBoard()
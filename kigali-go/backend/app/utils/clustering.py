@@ -0,0 +1,161 @@
+"""Hierarchical grid clustering of points for low-zoom map views.
+
+Points are binned into web-mercator cells of ``CELL_PX`` screen pixels.
+At zoom ``z`` a cell is 1/4 of a 256 px tile. The pyramid is built once
+per snapshot of the points. The finest level bins every point, and each
+coarser level merges groups of 2x2 cells of the level below. Per cell it
+keeps a count and the lat/lng sums for each type, so a cluster's
+centroid and per-type counts are sums, never a rescan. Any view answers
+from one level with at most ``MAX_CLUSTERS`` cells. When a view would
+need more, the query steps up a level. The payload size therefore depends
+on the viewport, not on the fleet.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.web_mercator import MAX_LATITUDE
+
+MAX_CLUSTER_ZOOM = 16
+CELL_SHIFT = 2                      # 4x4 cells per tile, 64 px each
+CELL_PX = 256 >> CELL_SHIFT
+MAX_CLUSTERS = 512
+_FINEST = MAX_CLUSTER_ZOOM + CELL_SHIFT
+
+
+def mercator_cells(lats, lngs, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer cell column/row of points on a ``2**level`` grid."""
+    size = float(1 << level)
+    lats = np.clip(np.asarray(lats, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    x = (np.asarray(lngs, dtype=float) + 180.0) / 360.0 * size
+    phi = np.radians(lats)
+    y = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / math.pi) / 2.0 * size
+    top = (1 << level) - 1
+    return np.clip(x.astype(np.int64), 0, top), np.clip(y.astype(np.int64), 0, top)
+
+
+class _Level:
+    __slots__ = ("cx", "cy", "counts", "sum_lat", "sum_lng")
+
+    def __init__(self, cx, cy, counts, sum_lat, sum_lng):
+        self.cx, self.cy = cx, cy
+        self.counts, self.sum_lat, self.sum_lng = counts, sum_lat, sum_lng
+
+
+def _aggregate(cx, cy, counts, sum_lat, sum_lng) -> _Level:
+    """Merge rows sharing a cell; weights are (rows, types) arrays."""
+    keys = (cx << 32) | cy
+    unique, inverse = np.unique(keys, return_inverse=True)
+    n = len(unique)
+
+    def total(weights):
+        return np.stack(
+            [np.bincount(inverse, weights=weights[:, t], minlength=n) for t in range(weights.shape[1])], axis=1
+        )
+
+    return _Level(unique >> 32, unique & 0xFFFFFFFF, total(counts).astype(np.int64),
+                  total(sum_lat), total(sum_lng))
+
+
+class ClusterPyramid:
+    """Per-zoom cell aggregates over one snapshot of typed points."""
+
+    def __init__(self, lats, lngs, type_codes, type_names: Sequence[str]):
+        """``type_codes[i]`` indexes ``type_names``; codes outside it are counted as ``other``."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        codes = np.asarray(type_codes, dtype=np.int64)
+        self.type_names = tuple(type_names) + ("other",)
+        self.total = len(lats)
+
+        columns = len(self.type_names)
+        codes = np.where((codes >= 0) & (codes < columns - 1), codes, columns - 1)
+        onehot = np.zeros((len(lats), columns))
+        onehot[np.arange(len(lats)), codes] = 1.0
+
+        cx, cy = mercator_cells(lats, lngs, _FINEST)
+        level = _aggregate(cx, cy, onehot, onehot * lats[:, None], onehot * lngs[:, None])
+        self._levels: Dict[int, _Level] = {MAX_CLUSTER_ZOOM: level}
+        for zoom in range(MAX_CLUSTER_ZOOM - 1, -1, -1):
+            level = _aggregate(level.cx >> 1, level.cy >> 1, level.counts, level.sum_lat, level.sum_lng)
+            self._levels[zoom] = level
+
+    def _type_columns(self, point_types: Optional[Sequence[str]]) -> Optional[List[int]]:
+        if not point_types:
+            return None
+        unknown = [name for name in point_types if name not in self.type_names]
+        if unknown:
+            raise ValueError(f"Unknown type '{unknown[0]}'")
+        return sorted({self.type_names.index(name) for name in point_types})
+
+    def clusters(self, zoom: int, min_lat: float, max_lat: float, min_lng: float, max_lng: float,
+                 point_types: Optional[Sequence[str]] = None,
+                 max_clusters: int = MAX_CLUSTERS) -> Tuple[int, List[Dict]]:
+        """``(zoom_used, clusters)`` for the cells of a lat/lng box.
+
+        Each cluster has a centroid, a count and counts per type. With
+        ``point_types`` only points of those types are counted and averaged.
+        """
+        zoom = max(0, min(int(zoom), MAX_CLUSTER_ZOOM))
+        columns = self._type_columns(point_types)
+        while True:
+            level = self._levels[zoom]
+            counts = level.counts if columns is None else level.counts[:, columns]
+            x0, y1 = mercator_cells([min_lat], [min_lng], zoom + CELL_SHIFT)
+            x1, y0 = mercator_cells([max_lat], [max_lng], zoom + CELL_SHIFT)
+            mask = (level.cx >= x0[0]) & (level.cx <= x1[0]) & (level.cy >= y0[0]) & (level.cy <= y1[0])
+            mask &= counts.sum(axis=1) > 0
+            cells = np.flatnonzero(mask)
+            if len(cells) <= max_clusters or zoom == 0:
+                break
+            zoom -= 1
+
+        names = self.type_names if columns is None else [self.type_names[t] for t in columns]
+        sum_lat, sum_lng = level.sum_lat[cells], level.sum_lng[cells]
+        if columns is not None:
+            sum_lat, sum_lng = sum_lat[:, columns], sum_lng[:, columns]
+        counts = counts[cells]
+        count = counts.sum(axis=1)
+        lats = sum_lat.sum(axis=1) / count
+        lngs = sum_lng.sum(axis=1) / count
+
+        clusters = [{
+            "lat": round(float(lats[i]), 6),
+            "lng": round(float(lngs[i]), 6),
+            "count": int(count[i]),
+            "by_type": {names[t]: int(n) for t, n in enumerate(counts[i]) if n},
+        } for i in range(len(cells))]
+        return zoom, clusters
+
+
+class CachedPyramid:
+    """A ``ClusterPyramid`` rebuilt from ``loader()`` once it is ``ttl`` seconds old."""
+
+    def __init__(self, type_names: Sequence[str], ttl: float = 300.0):
+        self.type_names = tuple(type_names)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pyramid: Optional[ClusterPyramid] = None
+        self._built = 0.0
+
+    def get(self, loader: Callable[[], Sequence[Tuple[float, float, int]]]) -> ClusterPyramid:
+        """``loader`` returns ``(lat, lng, type_code)`` rows."""
+        with self._lock:
+            now = time.monotonic()
+            if self._pyramid is None or now - self._built >= self.ttl:
+                rows = list(loader())
+                lats = [row[0] for row in rows]
+                lngs = [row[1] for row in rows]
+                codes = [row[2] for row in rows]
+                self._pyramid = ClusterPyramid(lats, lngs, codes, self.type_names)
+                self._built = now
+            return self._pyramid
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pyramid = None
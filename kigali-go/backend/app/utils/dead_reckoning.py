@@ -0,0 +1,110 @@
+"""Dead-reckoning of vehicle positions between GPS fixes.
+
+A vehicle last reported at ``(lat, lng)`` with ``bearing`` and ``speed``
+``age`` seconds ago is assumed to have kept going in a straight line. The
+prediction is computed for a whole result set in one vectorized pass. It
+is only made while the fix is at most ``max_age`` seconds old and the
+vehicle is moving (``min_speed`` km/h). Older or stationary vehicles keep
+their reported position with ``predicted`` false. Each predicted vehicle
+also gets ``valid_for_s``, how long clients may keep animating it
+(the remaining age budget, capped at ``horizon``).
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+from app.utils.geo import destination_array
+
+
+class Prediction(NamedTuple):
+    lats: np.ndarray
+    lngs: np.ndarray
+    predicted: np.ndarray      # bool per vehicle
+    ages: np.ndarray           # seconds since last_seen, NaN when unknown
+    valid_for: np.ndarray      # seconds clients may extrapolate further
+
+
+def extrapolate(lats, lngs, bearings, speeds_kmh, ages_s, max_age: float = 45.0,
+                horizon: float = 20.0, min_speed: float = 2.0) -> Prediction:
+    """Straight-line positions after ``ages_s`` seconds; arrays are parallel."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    bearings = np.asarray(bearings, dtype=float)
+    speeds = np.asarray(speeds_kmh, dtype=float)
+    ages = np.asarray(ages_s, dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        moving = (
+            np.isfinite(lats) & np.isfinite(lngs) & np.isfinite(bearings)
+            & (speeds >= min_speed) & (ages >= 0) & (ages <= max_age)
+        )
+    distances = np.where(moving, np.nan_to_num(speeds) * np.nan_to_num(ages) / 3600.0, 0.0)
+    new_lats, new_lngs = destination_array(lats, lngs, np.nan_to_num(bearings), distances)
+    return Prediction(
+        lats=np.where(moving, new_lats, lats),
+        lngs=np.where(moving, new_lngs, lngs),
+        predicted=moving,
+        ages=ages,
+        valid_for=np.where(moving, np.clip(max_age - np.nan_to_num(ages), 0.0, horizon), 0.0),
+    )
+
+
+def predict_states(states: Sequence, now: datetime, max_age: float = 45.0, horizon: float = 20.0,
+                   min_speed: float = 2.0) -> Prediction:
+    """``extrapolate`` over vehicle states (``current_lat``, ``bearing``, ``last_seen``, ...)."""
+    def column(name):
+        return np.array([getattr(s, name) for s in states], dtype=float)
+
+    ages = np.array([(now - s.last_seen).total_seconds() if s.last_seen else np.nan for s in states], dtype=float)
+    return extrapolate(column("current_lat"), column("current_lng"), column("bearing"), column("speed"),
+                       ages, max_age=max_age, horizon=horizon, min_speed=min_speed)
+
+
+def predict_records(records: List[Dict], states: Sequence, now: datetime, max_age: float = 45.0,
+                    horizon: float = 20.0, min_speed: float = 2.0) -> List[Dict]:
+    """Move serialized vehicles (parallel to ``states``) to their predicted positions, in place.
+
+    The position keys present (``lat``/``lng``, ``current_lat``/``current_lng``)
+    are replaced. The fix itself is kept as ``reported_lat``/``reported_lng``.
+    ``predicted``, ``position_age_s`` and ``valid_for_s`` are added.
+    """
+    if not records:
+        return records
+    prediction = predict_states(states, now, max_age=max_age, horizon=horizon, min_speed=min_speed)
+    lats = np.round(prediction.lats, 6).tolist()
+    lngs = np.round(prediction.lngs, 6).tolist()
+    ages = prediction.ages.tolist()
+    valid_for = np.round(prediction.valid_for, 1).tolist()
+    for i, (record, state, predicted) in enumerate(zip(records, states, prediction.predicted.tolist())):
+        record["reported_lat"] = state.current_lat
+        record["reported_lng"] = state.current_lng
+        record["predicted"] = predicted
+        record["position_age_s"] = None if np.isnan(ages[i]) else round(ages[i], 1)
+        record["valid_for_s"] = valid_for[i]
+        if predicted:
+            for lat_key, lng_key in (("lat", "lng"), ("current_lat", "current_lng")):
+                if lat_key in record:
+                    record[lat_key] = lats[i]
+                    record[lng_key] = lngs[i]
+    return records
+
+
+def prediction_meta(now: datetime, max_age: float, horizon: float) -> Dict:
+    """Response-level summary: when positions were predicted and when to poll again."""
+    return {
+        "as_of": now.isoformat(),
+        "valid_until": (now + timedelta(seconds=horizon)).isoformat(),
+        "max_age_s": max_age,
+    }
+
+
+def reckoning_config(config) -> Dict:
+    """``max_age``/``horizon``/``min_speed`` keyword arguments from app config."""
+    return {
+        "max_age": float(config.get("DEAD_RECKONING_MAX_AGE", 45.0)),
+        "horizon": float(config.get("DEAD_RECKONING_HORIZON", 20.0)),
+        "min_speed": float(config.get("DEAD_RECKONING_MIN_SPEED", 2.0)),
+    }
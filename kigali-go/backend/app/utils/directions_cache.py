@@ -0,0 +1,208 @@
+"""Cache for Google Directions API responses.
+
+Trip planning asks Google for directions between the same few places all
+day: Nyabugogo to Kimironko, the city center to the airport, and so on.
+Requests are keyed on their origin and destination snapped to a grid of
+``snap_deg`` degrees (0.001 is about 110 m) plus the travel mode. Nearby
+requests for the same trip therefore share one answer. Google is still
+queried with the exact coordinates of the request that fills the entry.
+
+There are two tiers. The memory tier is an LRU of ``max_entries``. The
+optional disk tier is an SQLite file at ``path``, which survives restarts
+and is shared by the worker processes. Both honour ``ttl``. Only
+successful responses are stored, so errors and quota denials are retried
+on the next request. Hits per tier, misses and failed fetches are counted
+for ``stats``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+PRUNE_EVERY = 500
+
+
+def fetch_directions(origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float,
+                     mode: str = "driving", timeout: float = 10.0) -> Optional[List[Dict]]:
+    """Routes (with alternatives) from the Directions API, or None on any failure."""
+    google_api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+    if not google_api_key:
+        logger.warning("Google Maps API key not configured")
+        return None
+    try:
+        response = requests.get(DIRECTIONS_URL, params={
+            "origin": f"{origin_lat},{origin_lng}",
+            "destination": f"{dest_lat},{dest_lng}",
+            "key": google_api_key,
+            "mode": mode,
+            "alternatives": "true",
+        }, timeout=timeout)
+        data = response.json()
+    except (requests.RequestException, ValueError) as exc:
+        logger.error("Google Directions API error: %s", exc)
+        return None
+    if data.get("status") == "OK" and data.get("routes"):
+        return data["routes"]
+    logger.warning("Google Directions API error: %s", data.get("status"))
+    return None
+
+
+class DirectionsCache:
+    """Snapped-key LRU with TTL in front of ``fetch_directions``, plus an optional SQLite tier."""
+
+    def __init__(self, ttl: float = 21600.0, max_entries: int = 10000, snap_deg: float = 0.001,
+                 path: Optional[str] = None, timeout: float = 10.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.snap_deg = snap_deg
+        self.path = path
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.evictions = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = float(app.config.get("DIRECTIONS_CACHE_TTL", self.ttl))
+        self.max_entries = int(app.config.get("DIRECTIONS_CACHE_MAX_ENTRIES", self.max_entries))
+        self.snap_deg = float(app.config.get("DIRECTIONS_CACHE_SNAP_DEG", self.snap_deg))
+        self.path = app.config.get("DIRECTIONS_CACHE_PATH", self.path) or None
+        self.timeout = float(app.config.get("DIRECTIONS_TIMEOUT", self.timeout))
+        app.extensions["directions_cache"] = self
+
+    def key(self, origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float,
+            mode: str = "driving") -> str:
+        cells = (round(value / self.snap_deg) for value in (origin_lat, origin_lng, dest_lat, dest_lng))
+        return ":".join([mode, str(self.snap_deg), *map(str, cells)])
+
+    # ------------------------------------------------------------------
+    # Tiers
+    # ------------------------------------------------------------------
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS directions (key TEXT PRIMARY KEY, expires REAL, routes TEXT)"
+            )
+        return self._db
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Cached routes for ``key``; counts a hit or a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            try:
+                conn = self._disk()
+                row = conn.execute(
+                    "SELECT expires, routes FROM directions WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone() if conn is not None else None
+            except sqlite3.Error:
+                logger.warning("Directions disk cache read failed", exc_info=True)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            routes = json.loads(row[1])
+            self._remember(key, row[0], routes)
+            self.disk_hits += 1
+            return routes
+
+    def _remember(self, key: str, expires: float, routes: List[Dict]) -> None:
+        self._entries[key] = (expires, routes)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: str, routes: List[Dict]) -> None:
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires, routes)
+            try:
+                conn = self._disk()
+                if conn is None:
+                    return
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO directions VALUES (?, ?, ?)",
+                                 (key, expires, json.dumps(routes)))
+                    self._puts += 1
+                    if self._puts % PRUNE_EVERY == 0:
+                        conn.execute("DELETE FROM directions WHERE expires <= ?", (time.time(),))
+            except sqlite3.Error:
+                logger.warning("Directions disk cache write failed", exc_info=True)
+
+    def directions(self, origin_lat: float, origin_lng: float, dest_lat: float, dest_lng: float,
+                   mode: str = "driving") -> Optional[List[Dict]]:
+        """Routes between two points, from the cache or from Google."""
+        # Without a key nothing can be fetched; that is not a miss or a failed fetch
+        if not os.getenv("GOOGLE_MAPS_API_KEY"):
+            logger.warning("Google Maps API key not configured")
+            return None
+        key = self.key(origin_lat, origin_lng, dest_lat, dest_lng, mode)
+        routes = self.get(key)
+        if routes is not None:
+            return routes
+        routes = fetch_directions(origin_lat, origin_lng, dest_lat, dest_lng, mode, timeout=self.timeout)
+        if routes is None:
+            with self._lock:
+                self.fetch_errors += 1
+            return None
+        self.put(key, routes)
+        return routes
+
+    def clear(self) -> None:
+        """Drop both tiers."""
+        with self._lock:
+            self._entries.clear()
+            conn = self._disk()
+            if conn is not None:
+                with conn:
+                    conn.execute("DELETE FROM directions")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "fetch_errors": self.fetch_errors,
+                "evictions": self.evictions,
+                "disk": bool(self.path),
+            }
+
+
+directions_cache = DirectionsCache()
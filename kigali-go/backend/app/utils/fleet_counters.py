@@ -0,0 +1,69 @@
+"""Fleet counters kept up to date by the vehicle state store.
+
+Each time the store writes or removes a slot, it passes the old and new
+row to ``FleetCounters.replace``, which adjusts the totals by the
+difference. The counts cover total, active, active with a location,
+vehicles per type and active vehicles per ``last_seen`` day. Reading them
+is a copy of a few small dicts, so hot endpoints report fleet counts
+without running aggregates over ``vehicles``.
+"""
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Optional
+
+
+class FleetCounters:
+    """Running counts over the rows of a ``VehicleStateStore``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._total = 0
+            self._active = 0
+            self._with_location = 0
+            self._by_type: Counter = Counter()
+            self._active_by_day: Counter = Counter()
+
+    def _apply(self, row, sign: int) -> None:
+        self._total += sign
+        self._by_type[row.vehicle_type] += sign
+        if not self._by_type[row.vehicle_type]:
+            del self._by_type[row.vehicle_type]
+        if not row.is_active:
+            return
+        self._active += sign
+        if row.current_lat is not None and row.current_lng is not None:
+            self._with_location += sign
+        if row.last_seen is not None:
+            day = row.last_seen.date()
+            self._active_by_day[day] += sign
+            if not self._active_by_day[day]:
+                del self._active_by_day[day]
+
+    def replace(self, old, new) -> None:
+        """Account for a slot changing from ``old`` to ``new`` (either may be None)."""
+        if old is new:
+            return
+        with self._lock:
+            if old is not None:
+                self._apply(old, -1)
+            if new is not None:
+                self._apply(new, +1)
+
+    def snapshot(self, today: Optional[date] = None) -> Dict:
+        """Counts in the shape the realtime and statistics endpoints report."""
+        today = today or datetime.utcnow().date()
+        with self._lock:
+            return {
+                "total": self._total,
+                "active": self._active,
+                "with_location": self._with_location,
+                "seen_today": sum(count for seen, count in self._active_by_day.items() if seen >= today),
+                "by_type": dict(self._by_type),
+            }
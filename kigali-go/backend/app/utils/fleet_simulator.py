@@ -0,0 +1,456 @@
+"""Vectorized fleet simulator for load-testing the realtime endpoints.
+
+The simulated fleet is held in NumPy arrays with one slot per active
+vehicle. Each tick advances every vehicle along its bearing in one
+vectorized pass and writes the whole fleet back in one statement. On
+PostgreSQL that statement is an ``UPDATE ... FROM unnest(...)`` with the
+arrays as parameters. On SQLite it is one driver-level executemany, and on
+other databases an executemany through SQLAlchemy. The simulator
+runs on a background thread in the process that started it (an API
+worker, or ``scripts/run_simulation.py`` as a sidecar). It reloads the
+fleet every ``reload_every`` ticks so that new or deactivated vehicles
+are picked up.
+
+In ``free`` mode vehicles wander along a bearing and turn back at the
+city bounds. In ``routes`` mode buses follow their route's stop sequence
+and taxis and motos run stop-to-stop trips, over paths precomputed by
+``app.utils.route_simulation``.
+
+With ``simulated_only`` (the default) only ``SIM*`` vehicles are counted
+and moved, so real vehicles in the same table are never touched.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, func, insert, select, text, update
+
+from app.extensions import db
+from app.utils.route_simulation import DWELL_SECONDS, RouteNetwork
+from app.utils.vehicle_store import vehicle_store
+from models.stop import Stop
+from models.vehicle import Vehicle
+
+logger = logging.getLogger(__name__)
+
+KIGALI_CENTER = (-1.9441, 30.0619)
+KIGALI_BOUNDS = {"min_lat": -1.98, "max_lat": -1.90, "min_lng": 30.03, "max_lng": 30.14}
+
+SIM_TYPES = ("bus", "taxi", "moto")
+# km/h ranges new speeds are drawn from, per SIM_TYPES entry
+SPEED_RANGES = np.array([[20.0, 40.0], [30.0, 50.0], [40.0, 60.0]])
+TYPE_MIX = (0.2, 0.3, 0.5)
+SPAWN_PREFIX = "SIM"
+SIM_MODES = ("free", "routes")
+
+TURN_PROBABILITY = 0.1
+SPEED_CHANGE_PROBABILITY = 0.05
+KM_PER_DEGREE = 111.0
+
+_POSTGRES_BULK_UPDATE = text(
+    """
+    UPDATE vehicles AS v
+    SET current_lat = d.lat, current_lng = d.lng, bearing = d.bearing, speed = d.speed,
+        last_seen = :ts, updated_at = :ts
+    FROM unnest(
+        CAST(:ids AS integer[]), CAST(:lats AS double precision[]), CAST(:lngs AS double precision[]),
+        CAST(:bearings AS double precision[]), CAST(:speeds AS double precision[])
+    ) AS d(id, lat, lng, bearing, speed)
+    WHERE v.id = d.id
+    """
+)
+
+
+_SQLITE_BULK_UPDATE = (
+    "UPDATE vehicles SET current_lat = ?, current_lng = ?, bearing = ?, speed = ?, "
+    "last_seen = ?, updated_at = ? WHERE id = ?"
+)
+
+
+def _executemany_update():
+    table = Vehicle.__table__
+    return (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            current_lat=bindparam("b_lat"),
+            current_lng=bindparam("b_lng"),
+            bearing=bindparam("b_bearing"),
+            speed=bindparam("b_speed"),
+            last_seen=bindparam("b_ts"),
+            updated_at=bindparam("b_ts"),
+        )
+    )
+
+
+class FleetSimulator:
+    """Moves the simulated fleet each tick; one bulk write per tick."""
+
+    def __init__(self, interval: float = 2.0, max_vehicles: int = 50000, reload_every: int = 30,
+                 seed: Optional[int] = None, mode: str = "free", simulated_only: bool = True):
+        self.interval = interval
+        self.mode = mode
+        self.simulated_only = simulated_only
+        self.network: Optional[RouteNetwork] = None
+        self.max_vehicles = max_vehicles
+        self.reload_every = reload_every
+        self.rng = np.random.default_rng(seed)
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+        self._reset_arrays(0)
+
+        self.ticks = 0
+        self._loaded_at_tick: Optional[int] = None
+        self.started_at: Optional[datetime] = None
+        self.last_tick_at: Optional[datetime] = None
+        self.last_tick_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    def init_app(self, app) -> None:
+        self.interval = float(app.config.get("SIMULATION_INTERVAL", self.interval))
+        self.max_vehicles = int(app.config.get("SIMULATION_MAX_VEHICLES", self.max_vehicles))
+        self.mode = app.config.get("SIMULATION_MODE", self.mode)
+        self.simulated_only = bool(app.config.get("SIMULATION_SIMULATED_ONLY", self.simulated_only))
+        app.extensions["fleet_simulator"] = self
+
+    def _reset_arrays(self, n: int) -> None:
+        self.ids = np.zeros(n, dtype=np.int64)
+        self.types = np.zeros(n, dtype=np.int8)
+        self.lat = np.zeros(n)
+        self.lng = np.zeros(n)
+        self.bearing = np.zeros(n)
+        self.speed = np.zeros(n)
+        # Route mode: path id (-1 = free movement), km along it, next stop mark, dwell left
+        self.path = np.full(n, -1, dtype=np.int64)
+        self.pos_km = np.zeros(n)
+        self.next_stop = np.ones(n, dtype=np.int64)
+        self.dwell = np.zeros(n)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ------------------------------------------------------------------
+    # Fleet
+    # ------------------------------------------------------------------
+    def _fleet_filter(self):
+        """WHERE clauses selecting the vehicles this simulator owns."""
+        clauses = [Vehicle.is_active == True]  # noqa: E712
+        if self.simulated_only:
+            clauses.append(Vehicle.registration.like(f"{SPAWN_PREFIX}%"))
+        return clauses
+
+    def _random_speeds(self, types: np.ndarray) -> np.ndarray:
+        low, high = SPEED_RANGES[types, 0], SPEED_RANGES[types, 1]
+        return self.rng.uniform(low, high)
+
+    def spawn(self, session, count: int) -> int:
+        """Insert ``SIM*`` vehicles until ``count`` active ones exist; returns how many were added.
+
+        Only ``SIM*`` vehicles count towards ``count`` unless ``simulated_only`` is off.
+        """
+        count = min(count, self.max_vehicles)
+        active = session.query(Vehicle.id).filter(*self._fleet_filter()).count()
+        missing = count - active
+        if missing <= 0:
+            return 0
+        last = session.query(func.max(Vehicle.registration)).filter(
+            Vehicle.registration.like(f"{SPAWN_PREFIX}%")
+        ).scalar()
+        existing = int(last[len(SPAWN_PREFIX):]) if last and last[len(SPAWN_PREFIX):].isdigit() else 0
+        types = self.rng.choice(len(SIM_TYPES), size=missing, p=TYPE_MIX)
+        lats = self.rng.uniform(KIGALI_BOUNDS["min_lat"], KIGALI_BOUNDS["max_lat"], missing)
+        lngs = self.rng.uniform(KIGALI_BOUNDS["min_lng"], KIGALI_BOUNDS["max_lng"], missing)
+        bearings = self.rng.uniform(0, 360, missing)
+        speeds = self._random_speeds(types)
+        now = datetime.utcnow()
+        rows = [
+            {
+                "vehicle_type": SIM_TYPES[types[i]],
+                "registration": f"{SPAWN_PREFIX}{existing + i + 1:06d}",
+                "operator": "Simulation",
+                "capacity": 30 if types[i] == 0 else (4 if types[i] == 1 else 1),
+                "current_lat": float(lats[i]),
+                "current_lng": float(lngs[i]),
+                "bearing": float(bearings[i]),
+                "speed": float(speeds[i]),
+                "is_active": True,
+                "is_available": True,
+                "last_seen": now,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(missing)
+        ]
+        session.execute(insert(Vehicle.__table__), rows)
+        session.commit()
+        return missing
+
+    def set_mode(self, session, mode: str) -> None:
+        """Switch between ``free`` and ``routes``; routes mode (re)builds paths from the stops."""
+        if mode not in SIM_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SIM_MODES)}")
+        self.mode = mode
+        self.network = None
+        if mode == "routes":
+            stops = session.execute(
+                select(Stop.code, Stop.lat, Stop.lng).where(Stop.is_active == True).order_by(Stop.id)  # noqa: E712
+            ).all()
+            self.network = RouteNetwork([tuple(stop) for stop in stops], rng=self.rng)
+        self._loaded_at_tick = None
+
+    def set_simulated_only(self, simulated_only: bool) -> None:
+        """Move only ``SIM*`` vehicles, or every active one; the fleet reloads on the next tick."""
+        if simulated_only != self.simulated_only:
+            self.simulated_only = simulated_only
+            self._loaded_at_tick = None
+
+    def _assign_paths(self, slots: np.ndarray, route_ids: List[Optional[str]]) -> None:
+        """Put vehicles at random points of a path: their route for buses, a trip otherwise."""
+        network = self.network
+        paths = np.full(len(slots), -1, dtype=np.int64)
+        buses = self.types[slots] == 0
+        if network.route_count:
+            known = network.route_paths
+            paths[buses] = [known.get(route_ids[i], -1) for i in np.flatnonzero(buses)]
+            unrouted = buses & (paths < 0)
+            paths[unrouted] = network.random_route(int(unrouted.sum()))
+        if network.has_trips:
+            paths[~buses] = network.random_trip(int((~buses).sum()))
+
+        on = paths >= 0
+        km = np.zeros(len(slots))
+        km[on] = self.rng.uniform(0, network.paths.length_km[paths[on]])
+        self.path[slots] = paths
+        self.pos_km[slots] = km
+        self.next_stop[slots] = np.where(
+            on, (network.paths.stop_km[np.maximum(paths, 0)] <= km[:, None]).sum(axis=1), 1
+        )
+        self.dwell[slots] = 0.0
+
+    def load(self, session) -> int:
+        """Load the simulated vehicles into the arrays; vehicles without a position get a random one.
+
+        In routes mode, vehicles already on a path keep their place on it.
+        """
+        if self.mode == "routes" and self.network is None:
+            self.set_mode(session, "routes")
+        rows = session.execute(
+            select(Vehicle.id, Vehicle.vehicle_type, Vehicle.current_lat, Vehicle.current_lng,
+                   Vehicle.bearing, Vehicle.speed, Vehicle.route_id)
+            .where(*self._fleet_filter())
+            .order_by(Vehicle.id)
+            .limit(self.max_vehicles)
+        ).all()
+        n = len(rows)
+        codes = {name: code for code, name in enumerate(SIM_TYPES)}
+        with self._lock:
+            previous = {
+                vehicle_id: slot for slot, vehicle_id in enumerate(self.ids.tolist()) if self.path[slot] >= 0
+            } if self.network is not None else {}
+            kept = (self.path, self.pos_km, self.next_stop, self.dwell)
+            self._loaded_at_tick = self.ticks
+            self._reset_arrays(n)
+            if not n:
+                return 0
+            self.ids[:] = [row[0] for row in rows]
+            self.types[:] = [codes.get(row[1], 1) for row in rows]
+            self.lat[:] = [np.nan if row[2] is None else row[2] for row in rows]
+            self.lng[:] = [np.nan if row[3] is None else row[3] for row in rows]
+            self.bearing[:] = [np.nan if row[4] is None else row[4] for row in rows]
+            self.speed[:] = [np.nan if row[5] is None else row[5] for row in rows]
+
+            unplaced = np.isnan(self.lat) | np.isnan(self.lng)
+            k = int(unplaced.sum())
+            self.lat[unplaced] = KIGALI_CENTER[0] + self.rng.uniform(-0.05, 0.05, k)
+            self.lng[unplaced] = KIGALI_CENTER[1] + self.rng.uniform(-0.05, 0.05, k)
+            no_bearing = np.isnan(self.bearing)
+            self.bearing[no_bearing] = self.rng.uniform(0, 360, int(no_bearing.sum()))
+            no_speed = np.isnan(self.speed) | (self.speed <= 0)
+            self.speed[no_speed] = self._random_speeds(self.types[no_speed])
+
+            if self.network:
+                old = np.array([previous.get(vehicle_id, -1) for vehicle_id in self.ids.tolist()], dtype=np.int64)
+                carried = old >= 0
+                for current, before in zip((self.path, self.pos_km, self.next_stop, self.dwell), kept):
+                    current[carried] = before[old[carried]]
+                self._assign_paths(np.flatnonzero(~carried), [row[6] for row in rows])
+                self._step_routes(0.0)
+        return n
+
+    # ------------------------------------------------------------------
+    # Movement
+    # ------------------------------------------------------------------
+    def step(self, dt: float) -> None:
+        """Advance every vehicle by ``dt`` seconds, turning back at the city bounds."""
+        with self._lock:
+            n = len(self.ids)
+            if not n:
+                return
+            radians = np.radians(self.bearing)
+            distance_deg = self.speed / 3600.0 * dt / KM_PER_DEGREE
+            new_lat = self.lat + distance_deg * np.cos(radians)
+            new_lng = self.lng + distance_deg * np.sin(radians) / np.cos(np.radians(self.lat))
+
+            out_lat = (new_lat < KIGALI_BOUNDS["min_lat"]) | (new_lat > KIGALI_BOUNDS["max_lat"])
+            out_lng = (new_lng < KIGALI_BOUNDS["min_lng"]) | (new_lng > KIGALI_BOUNDS["max_lng"])
+            self.lat = np.where(out_lat, self.lat, new_lat)
+            self.lng = np.where(out_lng, self.lng, new_lng)
+            self.bearing = np.where(out_lat | out_lng, self.bearing + 180.0, self.bearing)
+
+            turning = self.rng.random(n) < TURN_PROBABILITY
+            self.bearing[turning] += self.rng.uniform(-45, 45, int(turning.sum()))
+            self.bearing = np.mod(self.bearing, 360.0)
+            self.bearing[self.bearing >= 360.0] = 0.0  # np.mod can round up to 360
+
+            changing = self.rng.random(n) < SPEED_CHANGE_PROBABILITY
+            self.speed[changing] = self._random_speeds(self.types[changing])
+
+            if self.network:
+                self._step_routes(dt)
+
+    def _step_routes(self, dt: float) -> None:
+        """Advance vehicles on paths: dwell at stops, then move on to the next path at the end."""
+        slots = np.flatnonzero(self.path >= 0)
+        if not len(slots):
+            return
+        paths_set = self.network.paths
+        paths = self.path[slots]
+        km = self.pos_km[slots]
+        next_stop = self.next_stop[slots]
+        moving = self.dwell[slots] <= 0
+        dwell = np.maximum(self.dwell[slots] - dt, 0.0)
+
+        km = km + np.where(moving, self.speed[slots] / 3600.0 * dt, 0.0)
+        mark = paths_set.stop_km[paths, next_stop]
+        arrived = moving & (km >= mark)
+        km[arrived] = mark[arrived]
+        dwell[arrived] = DWELL_SECONDS
+        next_stop[arrived] += 1
+
+        finished = ~arrived & (dwell <= 0) & (km >= paths_set.length_km[paths])
+        if finished.any():
+            paths[finished] = self.network.next_paths(paths[finished])
+            km[finished] = 0.0
+            next_stop[finished] = 1
+
+        points = paths_set.point_index(paths, km)
+        self.path[slots] = paths
+        self.pos_km[slots] = km
+        self.next_stop[slots] = next_stop
+        self.dwell[slots] = dwell
+        self.lat[slots] = paths_set.lat[points]
+        self.lng[slots] = paths_set.lng[points]
+        self.bearing[slots] = paths_set.bearing[points]
+
+    def write(self, session, now: Optional[datetime] = None) -> int:
+        """Persist the whole fleet in one statement and commit; returns vehicles written."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            ids, lats, lngs = self.ids.tolist(), self.lat.tolist(), self.lng.tolist()
+            # Vehicles dwelling at a stop report standing still
+            bearings, speeds = self.bearing.tolist(), np.where(self.dwell > 0, 0.0, self.speed).tolist()
+        if not ids:
+            return 0
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            session.execute(_POSTGRES_BULK_UPDATE, {
+                "ids": ids, "lats": lats, "lngs": lngs, "bearings": bearings, "speeds": speeds, "ts": now,
+            })
+        elif dialect == "sqlite":
+            # Skips per-row parameter processing; timestamps in SQLAlchemy's storage format
+            stamp = now.strftime("%Y-%m-%d %H:%M:%S.%f")
+            session.connection().exec_driver_sql(_SQLITE_BULK_UPDATE, [
+                (la, ln, b, s, stamp, stamp, i) for i, la, ln, b, s in zip(ids, lats, lngs, bearings, speeds)
+            ])
+        else:
+            session.execute(_executemany_update(), [
+                {"b_id": i, "b_lat": la, "b_lng": ln, "b_bearing": b, "b_speed": s, "b_ts": now}
+                for i, la, ln, b, s in zip(ids, lats, lngs, bearings, speeds)
+            ])
+        session.commit()
+        vehicle_store.notify_write()
+        return len(ids)
+
+    def tick(self, session=None, dt: Optional[float] = None) -> Dict:
+        """One simulation step: reload if due, move, write."""
+        session = session or db.session
+        started = time.perf_counter()
+        if self._loaded_at_tick is None or self.ticks - self._loaded_at_tick >= self.reload_every:
+            self.load(session)
+        self.step(self.interval if dt is None else dt)
+        moved = self.write(session)
+        self.ticks += 1
+        self.last_tick_at = datetime.utcnow()
+        self.last_tick_seconds = time.perf_counter() - started
+        return {"moved_count": moved, "tick_seconds": round(self.last_tick_seconds, 4)}
+
+    # ------------------------------------------------------------------
+    # Background loop
+    # ------------------------------------------------------------------
+    def start(self, app, interval: Optional[float] = None) -> bool:
+        """Run ticks every ``interval`` seconds on a background thread; False if already running."""
+        with self._lock:
+            if self.running:
+                return False
+            if interval is not None:
+                self.interval = interval
+            self._app = app
+            self._stopped.clear()
+            self.last_error = None
+            self.started_at = datetime.utcnow()
+            self._thread = threading.Thread(target=self._run, name="fleet-simulator", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self) -> None:
+        with self._app.app_context():
+            while not self._stopped.is_set():
+                deadline = time.monotonic() + self.interval
+                try:
+                    self.tick()
+                except Exception as exc:
+                    db.session.rollback()
+                    self.last_error = str(exc)
+                    logger.exception("Simulation tick failed")
+                finally:
+                    db.session.remove()
+                self._stopped.wait(max(0.0, deadline - time.monotonic()))
+
+    def stop(self, timeout: float = 10.0) -> bool:
+        """Stop the background loop; False if it was not running."""
+        if not self.running:
+            return False
+        self._stopped.set()
+        self._thread.join(timeout)
+        self._thread = None
+        return True
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "vehicles": len(self),
+            "mode": self.mode,
+            "simulated_only": self.simulated_only,
+            "on_paths": int((self.path >= 0).sum()),
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "last_tick_at": self.last_tick_at.isoformat() if self.last_tick_at else None,
+            "last_tick_seconds": round(self.last_tick_seconds, 4),
+            "last_error": self.last_error,
+        }
+
+
+fleet_simulator = FleetSimulator()
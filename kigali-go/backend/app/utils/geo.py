@@ -0,0 +1,113 @@
+"""Geographic math shared by every endpoint.
+
+Each helper has a scalar form (plain ``math``, for single lookups) and a
+batched NumPy form (for result sets), and both use the same haversine
+formula. This keeps radius filters consistent across the API.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.0
+
+# Average speeds in km/h, adjusted for Kigali traffic
+AVERAGE_SPEEDS_KMH: Dict[str, float] = {
+    "bus": 30.0,
+    "taxi": 40.0,
+    "moto": 50.0,
+}
+DEFAULT_SPEED_KMH = 35.0
+
+
+def calculate_distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometers (haversine)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_km_array(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Vectorized haversine; arguments broadcast like NumPy arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.subtract(lng2, lng1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def calculate_bearing(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Initial compass bearing in degrees [0, 360) from point 1 towards point 2."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dlmb = math.radians(lng2 - lng1)
+    x = math.sin(dlmb) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlmb)
+    return math.degrees(math.atan2(x, y)) % 360.0
+
+
+def bearing_array(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Vectorized initial bearing in degrees [0, 360)."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dlmb = np.radians(np.subtract(lng2, lng1))
+    x = np.sin(dlmb) * np.cos(phi2)
+    y = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlmb)
+    return np.degrees(np.arctan2(x, y)) % 360.0
+
+
+def destination_array(lat, lng, bearing_deg, distance_km) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized point reached from ``(lat, lng)`` along ``bearing_deg`` after ``distance_km``."""
+    phi1 = np.radians(lat)
+    lmb1 = np.radians(lng)
+    theta = np.radians(bearing_deg)
+    delta = np.asarray(distance_km, dtype=float) / EARTH_RADIUS_KM
+    sin_phi2 = np.sin(phi1) * np.cos(delta) + np.cos(phi1) * np.sin(delta) * np.cos(theta)
+    phi2 = np.arcsin(np.clip(sin_phi2, -1.0, 1.0))
+    lmb2 = lmb1 + np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(phi1), np.cos(delta) - np.sin(phi1) * sin_phi2)
+    return np.degrees(phi2), (np.degrees(lmb2) + 540.0) % 360.0 - 180.0
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Return ``(min_lat, max_lat, min_lng, max_lng)`` enclosing a radius.
+
+    The box is a cheap pre-filter (SQL ``BETWEEN`` or an array mask); exact
+    filtering still uses haversine.
+    """
+    lat_pad = radius_km / KM_PER_DEGREE_LAT
+    lng_pad = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - lat_pad, lat + lat_pad, lng - lng_pad, lng + lng_pad
+
+
+def estimate_eta(distance_km: float, vehicle_type: str, traffic_factor: float = 1.0,
+                 speed_kmh: Optional[float] = None) -> float:
+    """Estimated travel time in minutes, rounded to one decimal.
+
+    ``speed_kmh`` (a learned speed, see ``speed_profiles``) replaces the
+    fixed average for ``vehicle_type``.
+    """
+    speed = (speed_kmh or AVERAGE_SPEEDS_KMH.get(vehicle_type, DEFAULT_SPEED_KMH)) * traffic_factor
+    return round(distance_km / speed * 60, 1)
+
+
+def speeds_for_types(vehicle_types) -> np.ndarray:
+    """Map an array of vehicle type names to average speeds in km/h."""
+    vehicle_types = np.asarray(vehicle_types, dtype=object)
+    speeds = np.full(vehicle_types.shape, DEFAULT_SPEED_KMH)
+    for name, speed in AVERAGE_SPEEDS_KMH.items():
+        speeds[vehicle_types == name] = speed
+    return speeds
+
+
+def estimate_eta_array(distances_km, vehicle_types, traffic_factor=1.0, speeds_kmh=None) -> np.ndarray:
+    """Vectorized ``estimate_eta`` over parallel distance and type arrays."""
+    speeds = speeds_for_types(vehicle_types) if speeds_kmh is None else np.asarray(speeds_kmh, dtype=float)
+    speeds = speeds * traffic_factor
+    return np.round(np.asarray(distances_km, dtype=float) / speeds * 60, 1)
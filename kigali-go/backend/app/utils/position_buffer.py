@@ -0,0 +1,204 @@
+"""Write-behind buffer for vehicle positions.
+
+Feeds report every couple of seconds. Persisting every report would
+rewrite the wide ``vehicles`` row and its secondary indexes each time,
+even though most intermediate positions are replaced before anyone reads
+them. The buffer keeps only the newest pending position per vehicle and
+overlays it on the vehicle store, so reads see it at once. A background
+thread writes everything pending in one batch every ``flush_interval``
+seconds, or sooner once ``max_pending`` vehicles are waiting. Whatever is
+left is flushed when the process exits. History fixes queued alongside
+are appended to ``vehicle_positions`` in the same transaction. At most
+``max_history`` fixes are held; while flushes keep failing, the oldest
+are dropped and counted in ``stats()``.
+
+Each worker process has its own buffer. The batch UPDATE only moves a row
+forward in ``last_seen``, so flushes from different workers cannot
+reorder a vehicle's positions.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from app.extensions import db
+from app.utils.position_history import record_positions
+from app.utils.vehicle_ingest import PositionUpdate, apply_positions
+from app.utils.vehicle_store import vehicle_store
+
+logger = logging.getLogger(__name__)
+
+
+class PositionBuffer:
+    """Latest-position-per-vehicle buffer with periodic batch flushes."""
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 50000, max_history: int = 200000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_history = max_history
+
+        self._app = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[int, PositionUpdate] = {}
+        self._history: List[PositionUpdate] = []
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.recorded = 0
+        self.stale = 0
+        self.dropped_history = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def init_app(self, app) -> None:
+        self.flush_interval = float(app.config.get("VEHICLE_WRITE_BEHIND_INTERVAL", self.flush_interval))
+        self.max_pending = int(app.config.get("VEHICLE_WRITE_BEHIND_MAX_PENDING", self.max_pending))
+        self.max_history = int(app.config.get("VEHICLE_WRITE_BEHIND_MAX_HISTORY", self.max_history))
+        self._app = app
+        app.extensions["position_buffer"] = self
+        vehicle_store.add_overlay(self.pending)
+        if self.enabled:
+            atexit.register(self.close)
+
+    @property
+    def enabled(self) -> bool:
+        """False when no app is bound or ``flush_interval`` is 0 (write-through)."""
+        return self._app is not None and self.flush_interval > 0
+
+    # ------------------------------------------------------------------
+    # Buffering
+    # ------------------------------------------------------------------
+    def submit(self, updates: Iterable[PositionUpdate], history: Iterable[PositionUpdate] = ()) -> int:
+        """Queue positions and history fixes; returns how many positions replaced an older (or no) pending one."""
+        accepted: List[PositionUpdate] = []
+        with self._lock:
+            self._history.extend(history)
+            self._trim_history()
+            for update in updates:
+                self.submitted += 1
+                current = self._pending.get(update.vehicle_id)
+                if current is not None:
+                    self.coalesced += 1
+                    if current.ts >= update.ts:
+                        continue
+                self._pending[update.vehicle_id] = update
+                accepted.append(update)
+            backlog = max(len(self._pending), len(self._history))
+
+        vehicle_store.overlay_positions(accepted)
+        if not self.enabled:
+            return len(accepted)
+        self._ensure_thread()
+        if backlog >= self.max_pending:
+            self._wake.set()
+        return len(accepted)
+
+    def _trim_history(self) -> None:
+        """Drop the oldest history fixes beyond ``max_history``; call with ``_lock`` held."""
+        excess = len(self._history) - self.max_history
+        if excess > 0:
+            del self._history[:excess]
+            self.dropped_history += excess
+
+    def pending(self) -> List[PositionUpdate]:
+        """Positions not yet written to the database."""
+        with self._lock:
+            return list(self._pending.values())
+
+    def get(self, vehicle_id: int) -> Optional[PositionUpdate]:
+        with self._lock:
+            return self._pending.get(vehicle_id)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+    def flush(self) -> int:
+        """Write all pending positions in one batch; returns rows written.
+
+        On failure the batch is put back, unless a newer position for the
+        same vehicle arrived in the meantime.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.values())
+                history = self._history
+                self._pending.clear()
+                self._history = []
+            if not batch and not history:
+                return 0
+            try:
+                with self._app.app_context():
+                    written = apply_positions(db.session, batch)
+                    record_positions(db.session, history)
+                    db.session.commit()
+            except Exception:
+                logger.exception("Write-behind flush of %d positions failed", len(batch))
+                with self._lock:
+                    self.failed_flushes += 1
+                    self._history[:0] = history
+                    self._trim_history()
+                    for update in batch:
+                        current = self._pending.get(update.vehicle_id)
+                        if current is None or current.ts < update.ts:
+                            self._pending[update.vehicle_id] = update
+                return 0
+            with self._lock:
+                self.flushes += 1
+                self.written += written
+                self.recorded += len(history)
+                self.stale += len(batch) - written
+            return written
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="position-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self, timeout: float = 10.0) -> int:
+        """Stop the flusher thread and write whatever is still pending."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self.flush() if self._app is not None else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._pending),
+                "pending_history": len(self._history),
+                "dropped_history": self.dropped_history,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "written": self.written,
+                "recorded": self.recorded,
+                "stale": self.stale,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+            }
+
+
+position_buffer = PositionBuffer()
@@ -0,0 +1,233 @@
+"""Vehicle position history: batched appends, trajectories and maintenance.
+
+Every accepted GPS fix is appended to ``vehicle_positions`` in batches.
+Duplicate (vehicle, timestamp) fixes are ignored. A trajectory query
+fetches one vehicle's fixes for a time window as plain row tuples through
+the primary-key range. When the window holds more fixes than the point
+budget, it downsamples them with Largest-Triangle-Three-Buckets over the
+(lng, lat) plane, which keeps the turns and drops points along straight
+runs. The maintenance job creates upcoming daily partitions on PostgreSQL
+and thins fixes older than ``compact_after`` to one per vehicle per
+interval. It then drops everything past the retention period.
+"""
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import Integer, cast, delete, func, select, text, tuple_
+from sqlalchemy.exc import DBAPIError
+
+from models.vehicle_position import VehiclePosition, partition_day, postgres_partition_ddl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+MAX_TRAJECTORY_WINDOW = timedelta(days=1)
+INSERT_CHUNK = 5000
+
+# Daily partitions this process has already created or seen
+_partitions_ready: Set[date] = set()
+
+
+@dataclass
+class Trajectory:
+    vehicle_id: int
+    start: datetime
+    end: datetime
+    total_points: int
+    points: List[tuple]  # (recorded_at, lat, lng, speed, bearing)
+
+    def to_dict(self) -> Dict:
+        return {
+            "vehicle_id": self.vehicle_id,
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "total_points": self.total_points,
+            "returned_points": len(self.points),
+            "points": [
+                {"ts": ts.isoformat(), "lat": lat, "lng": lng, "speed": speed, "bearing": bearing}
+                for ts, lat, lng, speed, bearing in self.points
+            ],
+        }
+
+
+def _dialect(session) -> str:
+    return session.get_bind().dialect.name
+
+
+def ensure_partitions(session, days: Iterable[date]) -> List[date]:
+    """Create missing daily partitions (PostgreSQL only); returns the days created."""
+    if _dialect(session) != "postgresql":
+        return []
+    created = []
+    for day in sorted(set(days) - _partitions_ready):
+        try:
+            with session.begin_nested():
+                session.execute(text(postgres_partition_ddl(day)))
+            created.append(day)
+        except DBAPIError as exc:
+            # Rows for the day already sit in the default partition; they stay there
+            logger.warning("Could not create position partition for %s: %s", day, exc)
+        _partitions_ready.add(day)
+    return created
+
+
+def _insert_statement(session):
+    table = VehiclePosition.__table__
+    dialect = _dialect(session)
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return table.insert().prefix_with("OR IGNORE")
+    return table.insert()
+
+
+def record_positions(session, updates: Iterable) -> int:
+    """Append ``PositionUpdate``-like fixes in chunked executemany INSERTs (no commit)."""
+    rows = [
+        {"vehicle_id": u.vehicle_id, "recorded_at": u.ts, "lat": u.lat, "lng": u.lng,
+         "bearing": u.bearing, "speed": u.speed}
+        for u in updates
+    ]
+    if not rows:
+        return 0
+    ensure_partitions(session, {row["recorded_at"].date() for row in rows})
+    statement = _insert_statement(session)
+    for start in range(0, len(rows), INSERT_CHUNK):
+        session.execute(statement, rows[start:start + INSERT_CHUNK])
+    return len(rows)
+
+
+def downsample(lats: np.ndarray, lngs: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of at most ``max_points`` fixes chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last fixes are always kept. Longitudes are scaled by
+    cos(latitude) so that areas are roughly metric.
+    """
+    n = len(lats)
+    if n <= max_points:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1][:max(max_points, 1)])
+
+    x = np.asarray(lngs) * math.cos(math.radians(float(np.mean(lats))))
+    y = np.asarray(lats)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_start, next_end = end, max(edges[i + 2], end + 1)
+        else:
+            next_start, next_end = n - 1, n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    selected[-1] = n - 1
+    return selected
+
+
+def get_trajectory(session, vehicle_id: int, start: datetime, end: datetime,
+                   max_points: int = DEFAULT_MAX_POINTS) -> Trajectory:
+    """Fixes of one vehicle in ``[start, end]``, downsampled to ``max_points``."""
+    if end < start:
+        raise ValueError("end must not be before start")
+    if end - start > MAX_TRAJECTORY_WINDOW:
+        raise ValueError(f"Window is limited to {int(MAX_TRAJECTORY_WINDOW.total_seconds() // 3600)} hours")
+    if not 2 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(f"max_points must be between 2 and {MAX_POINTS_LIMIT}")
+
+    table = VehiclePosition.__table__
+    query = (
+        select(table.c.recorded_at, table.c.lat, table.c.lng, table.c.speed, table.c.bearing)
+        .where(table.c.vehicle_id == vehicle_id)
+        .where(table.c.recorded_at.between(start, end))
+        .order_by(table.c.recorded_at)
+    )
+    rows = session.execute(query).all()
+    total = len(rows)
+    if total > max_points:
+        lats = np.fromiter((row[1] for row in rows), dtype=float, count=total)
+        lngs = np.fromiter((row[2] for row in rows), dtype=float, count=total)
+        rows = [rows[i] for i in downsample(lats, lngs, max_points)]
+    return Trajectory(vehicle_id, start, end, total, [tuple(row) for row in rows])
+
+
+def _epoch_bucket(session, column, interval_seconds: int):
+    if _dialect(session) == "postgresql":
+        return func.floor(func.extract("epoch", column) / interval_seconds)
+    return cast(func.strftime("%s", column), Integer) // interval_seconds
+
+
+def compact_positions(session, start: datetime, end: datetime, interval_seconds: int) -> int:
+    """Keep the first fix per vehicle per ``interval_seconds`` in ``[start, end)``; returns rows deleted."""
+    table = VehiclePosition.__table__
+    window = (table.c.recorded_at >= start, table.c.recorded_at < end)
+    bucket = _epoch_bucket(session, table.c.recorded_at, interval_seconds)
+    keepers = (
+        select(table.c.vehicle_id, func.min(table.c.recorded_at))
+        .where(*window)
+        .group_by(table.c.vehicle_id, bucket)
+    )
+    result = session.execute(
+        delete(table).where(*window).where(tuple_(table.c.vehicle_id, table.c.recorded_at).not_in(keepers))
+    )
+    return max(result.rowcount or 0, 0)
+
+
+def _postgres_partitions(session) -> List[str]:
+    return list(session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": VehiclePosition.__tablename__}).scalars())
+
+
+def drop_expired_positions(session, cutoff: datetime) -> Dict:
+    """Remove fixes older than ``cutoff``; whole partitions are dropped where possible."""
+    dropped = []
+    if _dialect(session) == "postgresql":
+        for name in _postgres_partitions(session):
+            day = partition_day(name)
+            if day is not None and day + timedelta(days=1) <= cutoff.date():
+                session.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                _partitions_ready.discard(day)
+                dropped.append(name)
+    table = VehiclePosition.__table__
+    result = session.execute(delete(table).where(table.c.recorded_at < cutoff))
+    return {"dropped_partitions": dropped, "deleted_rows": max(result.rowcount or 0, 0)}
+
+
+def maintain_position_history(session, now: Optional[datetime] = None, retention_days: int = 30,
+                              compact_after_days: int = 7, compact_interval: int = 30,
+                              days_ahead: int = 2, compact_days: int = 1) -> Dict:
+    """Daily job: pre-create partitions, compact aged fixes, drop expired ones (commits)."""
+    now = now or datetime.utcnow()
+    today = now.date()
+    report: Dict = {
+        "created_partitions": [
+            day.isoformat() for day in ensure_partitions(session, [today + timedelta(days=d) for d in range(days_ahead + 1)])
+        ],
+    }
+    compact_end = datetime.combine(today - timedelta(days=compact_after_days), datetime.min.time())
+    report["compacted_rows"] = compact_positions(
+        session, compact_end - timedelta(days=compact_days), compact_end, compact_interval
+    )
+    report.update(drop_expired_positions(session, now - timedelta(days=retention_days)))
+    session.commit()
+    return report
@@ -0,0 +1,153 @@
+"""Precomputed paths for route-constrained fleet simulation.
+
+Buses run back and forth along the ordered stop sequence of their
+``route_id``. Taxis and motos run origin-destination trips between stops
+and start a new trip from wherever the last one ended. Every path is
+densified once into points ``POINT_SPACING_KM`` apart and stored in flat
+arrays. A vehicle's position is then a distance along its path, and one
+tick only advances that distance and looks up a point index, for the
+whole fleet at once. Vehicles dwell at each stop they reach.
+
+There is no road geometry in the database, so legs between consecutive
+stops are straight lines. Any polyline could replace them in
+``PathSet.add`` without changing the tick.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.geo import haversine_km_array
+
+POINT_SPACING_KM = 0.025
+DWELL_SECONDS = 20.0
+# Origin-destination trips are precomputed for every pair of at most this many stops
+MAX_TRIP_STOPS = 64
+
+# route_id -> (route name, stop codes in running order)
+BUS_ROUTES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "RT001": ("Nyabugogo - Kacyiru", ("NYB001", "CC001", "KAC001")),
+    "RT002": ("Kimironko - Nyabugogo", ("KIM001", "UR001", "NYB001")),
+    "RT003": ("Remera - Kacyiru", ("REM001", "AMS001", "KAC001")),
+    "RT004": ("Nyamirambo - Kimironko", ("NYA001", "CC001", "KAC001", "KIM001")),
+}
+
+
+def densify(lats: Sequence[float], lngs: Sequence[float], spacing_km: float = POINT_SPACING_KM):
+    """Points every ``spacing_km`` along a polyline, their bearings, and the km mark of each vertex."""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    legs = haversine_km_array(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+    vertex_km = np.concatenate([[0.0], np.cumsum(legs)])
+    marks = np.arange(0.0, vertex_km[-1], spacing_km)
+    marks = np.append(marks, vertex_km[-1])
+    point_lats = np.interp(marks, vertex_km, lats)
+    point_lngs = np.interp(marks, vertex_km, lngs)
+
+    # Bearing of the leg each point lies on
+    leg = np.clip(np.searchsorted(vertex_km, marks, side="right") - 1, 0, len(legs) - 1)
+    phi1, phi2 = np.radians(lats[leg]), np.radians(lats[leg + 1])
+    dlng = np.radians(lngs[leg + 1] - lngs[leg])
+    bearings = np.degrees(np.arctan2(
+        np.sin(dlng) * np.cos(phi2),
+        np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlng),
+    )) % 360.0
+    bearings[bearings >= 360.0] = 0.0
+    return point_lats, point_lngs, bearings, vertex_km
+
+
+class PathSet:
+    """Densified paths concatenated into flat arrays, addressed by path id."""
+
+    def __init__(self, spacing_km: float = POINT_SPACING_KM):
+        self.spacing_km = spacing_km
+        self._parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def add(self, lats: Sequence[float], lngs: Sequence[float]) -> int:
+        self._parts.append(densify(lats, lngs, self.spacing_km))
+        return len(self._parts) - 1
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def build(self) -> None:
+        counts = np.array([len(part[0]) for part in self._parts], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        self.counts = counts
+        self.lat = np.concatenate([part[0] for part in self._parts])
+        self.lng = np.concatenate([part[1] for part in self._parts])
+        self.bearing = np.concatenate([part[2] for part in self._parts])
+        self.length_km = np.array([part[3][-1] for part in self._parts])
+        # Stop marks per path, padded with +inf; mark 0 is the origin
+        width = max(len(part[3]) for part in self._parts) + 1
+        self.stop_km = np.full((len(self._parts), width), np.inf)
+        for path, part in enumerate(self._parts):
+            self.stop_km[path, :len(part[3])] = part[3]
+
+    def point_index(self, paths: np.ndarray, km: np.ndarray) -> np.ndarray:
+        steps = np.minimum((km / self.spacing_km).astype(np.int64), self.counts[paths] - 1)
+        return self.offsets[paths] + np.maximum(steps, 0)
+
+
+class RouteNetwork:
+    """Bus routes (both directions) and stop-to-stop trips over one ``PathSet``."""
+
+    def __init__(self, stops: Sequence[Tuple[str, float, float]], routes=BUS_ROUTES,
+                 spacing_km: float = POINT_SPACING_KM, rng: Optional[np.random.Generator] = None):
+        """``stops`` are ``(code, lat, lng)``; routes naming unknown codes are skipped."""
+        self.rng = rng or np.random.default_rng()
+        self.paths = PathSet(spacing_km)
+        coords = {code: (lat, lng) for code, lat, lng in stops if code}
+
+        self.route_paths: Dict[str, int] = {}
+        successors: List[int] = []
+        for route_id, (_, codes) in routes.items():
+            points = [coords[code] for code in codes if code in coords]
+            if len(points) < 2:
+                continue
+            forward = self.paths.add([p[0] for p in points], [p[1] for p in points])
+            backward = self.paths.add([p[0] for p in reversed(points)], [p[1] for p in reversed(points)])
+            successors += [backward, forward]
+            self.route_paths[route_id] = forward
+        self.route_count = len(successors)
+
+        # Trips: path route_count + o * (k - 1) + j goes from stop o to its j-th other stop
+        trip_stops = list(stops)[:MAX_TRIP_STOPS]
+        k = len(trip_stops)
+        self.trip_stop_count = k if k >= 2 else 0
+        self._trip_dest: List[int] = []
+        if self.trip_stop_count:
+            for o, (_, o_lat, o_lng) in enumerate(trip_stops):
+                for d, (_, d_lat, d_lng) in enumerate(trip_stops):
+                    if d != o:
+                        self.paths.add([o_lat, d_lat], [o_lng, d_lng])
+                        self._trip_dest.append(d)
+        if len(self.paths):
+            self.paths.build()
+        self._successor = np.array(successors + [-1] * len(self._trip_dest), dtype=np.int64)
+        self._trip_dest_arr = np.array([-1] * self.route_count + self._trip_dest, dtype=np.int64)
+
+    def __bool__(self) -> bool:
+        return len(self.paths) > 0
+
+    @property
+    def has_trips(self) -> bool:
+        return self.trip_stop_count > 0
+
+    def random_route(self, n: int) -> np.ndarray:
+        return 2 * self.rng.integers(0, self.route_count // 2, n)
+
+    def random_trip(self, n: int, origins: Optional[np.ndarray] = None) -> np.ndarray:
+        k = self.trip_stop_count
+        if origins is None:
+            origins = self.rng.integers(0, k, n)
+        return self.route_count + origins * (k - 1) + self.rng.integers(0, k - 1, n)
+
+    def next_paths(self, paths: np.ndarray) -> np.ndarray:
+        """Bus paths turn around; trips continue from their destination stop."""
+        successors = self._successor[paths].copy()
+        trips = successors < 0
+        if trips.any():
+            successors[trips] = self.random_trip(int(trips.sum()), self._trip_dest_arr[paths[trips]])
+        return successors
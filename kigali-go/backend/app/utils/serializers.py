@@ -0,0 +1,337 @@
+"""Serialization for the hot read endpoints.
+
+Payloads are built from plain column tuples rather than ORM objects.
+``Projection`` selects named columns and turns each row into a dict with
+one ``zip``. That avoids hydrating models and the lazy relationship loads
+hidden in ``to_dict`` (``Stop.zone_name``, ``Zone.stops_count``). Vehicle
+records come straight from the store's ``VehicleState`` tuples.
+
+``dumps`` encodes to bytes, with orjson when it is installed and the
+standard library otherwise. ``EncodedResponseCache`` keeps already-encoded
+response bodies with their ETag, keyed by a normalized request key and
+the version of the data they were built from. A hit builds a response
+around the stored bytes, so no payload objects are created at all, and a
+matching ``If-None-Match`` gets a body-less 304.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from flask import Response, request
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app.utils.speed_profiles import speed_profiles
+from models.stop import Stop
+from models.zone import Zone
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+
+# ----------------------------------------------------------------------
+# JSON backend
+# ----------------------------------------------------------------------
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    """Compact JSON bytes; datetimes become ISO 8601 strings."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def json_backend() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+# ----------------------------------------------------------------------
+# Column-tuple serializers
+# ----------------------------------------------------------------------
+class Projection:
+    """Named columns selected as row tuples and turned into dicts by ``zip``."""
+
+    def __init__(self, **columns):
+        self.fields = tuple(columns)
+        self.columns = tuple(columns.values())
+
+    def query(self, session):
+        return session.query(*self.columns)
+
+    def row_dict(self, row) -> Dict:
+        return dict(zip(self.fields, row))
+
+    def dicts(self, rows) -> List[Dict]:
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in rows]
+
+
+# Same keys as Stop.to_dict; zone_name comes from an outer join, not a lazy load
+STOP_PROJECTION = Projection(
+    id=Stop.id, name=Stop.name, code=Stop.code, lat=Stop.lat, lng=Stop.lng,
+    zone_id=Stop.zone_id, zone_name=Zone.name, stop_type=Stop.stop_type,
+    is_shelter=Stop.is_shelter, is_accessible=Stop.is_accessible,
+    is_active=Stop.is_active, operating_hours=Stop.operating_hours,
+)
+
+# Same keys as Zone.to_dict; stops_count is a correlated count, not a relationship load
+ZONE_PROJECTION = Projection(
+    id=Zone.id, name=Zone.name, code=Zone.code, district=Zone.district,
+    center_lat=Zone.center_lat, center_lng=Zone.center_lng,
+    population=Zone.population, area_km2=Zone.area_km2, is_active=Zone.is_active,
+    stops_count=select(func.count(Stop.id)).where(Stop.zone_id == Zone.id).correlate(Zone).scalar_subquery(),
+)
+
+
+def stop_query(session):
+    """``STOP_PROJECTION`` rows, ready for filters on ``Stop`` columns."""
+    return STOP_PROJECTION.query(session).outerjoin(Zone, Stop.zone_id == Zone.id)
+
+
+def zone_query(session):
+    return ZONE_PROJECTION.query(session)
+
+
+def realtime_vehicle_records(matches: Sequence[Tuple[object, float]]) -> List[Dict]:
+    """Realtime vehicle dicts with ``distance_km`` and ``eta_minutes`` for ``(state, distance)`` pairs.
+
+    ``type``/``vehicle_type``, ``lat``/``current_lat``, ``lng``/``current_lng``
+    and ``heading``/``bearing`` carry the same value under both names for
+    older clients.
+    """
+    if not matches:
+        return []
+    etas = speed_profiles.eta_array(
+        [d for _, d in matches], [v.vehicle_type for v, _ in matches],
+        [v.current_lat for v, _ in matches], [v.current_lng for v, _ in matches],
+    ).tolist()
+    records = []
+    for (v, distance), eta in zip(matches, etas):
+        record = _vehicle_record(v)
+        record["eta_minutes"] = eta
+        record["distance_km"] = round(distance, 2)
+        records.append(record)
+    return records
+
+
+def _vehicle_record(v) -> Dict:
+    """The part of a realtime record that does not depend on the request's center."""
+    bearing = v.bearing or 0
+    return {
+        "id": v.id,
+        "registration": v.registration,
+        "type": v.vehicle_type,
+        "vehicle_type": v.vehicle_type,
+        "lat": v.current_lat,
+        "lng": v.current_lng,
+        "current_lat": v.current_lat,
+        "current_lng": v.current_lng,
+        "heading": bearing,
+        "speed": v.speed or 0,
+        "bearing": bearing,
+        "route_name": v.route_name,
+        "operator": v.operator,
+        "is_active": v.is_active,
+        "updated_at": v.updated_at.isoformat() if v.updated_at else None,
+    }
+
+
+def encode_realtime_vehicles(candidates, order, distances) -> bytes:
+    """``dumps(realtime_vehicle_records(...))`` for ``candidates.rows[order]`` at ``distances``.
+
+    ``candidates`` is a ``TileCandidates``. Each vehicle's center-independent
+    fields are encoded once per tile entry and shared by every request on
+    that tile. Per request only the distance and ETA are encoded.
+    """
+    if not len(order):
+        return b"[]"
+    fragments = candidates.derived(
+        "realtime_records", lambda entry: [dumps(_vehicle_record(v))[:-1] for v in entry.rows]
+    )
+    rows = candidates.rows
+    etas = speed_profiles.eta_array(
+        distances, [rows[i].vehicle_type for i in order], candidates.lats[order], candidates.lngs[order],
+    ).tolist()
+    return b"[" + b",".join(
+        fragments[i] + b',"eta_minutes":' + dumps(eta) + b',"distance_km":' + dumps(round(d, 2)) + b"}"
+        for i, eta, d in zip(order.tolist(), etas, distances.tolist())
+    ) + b"]"
+
+
+def dumps_with(payload: Dict, key: str, encoded: bytes) -> bytes:
+    """``dumps(payload)`` with already-encoded JSON added first under ``key``."""
+    rest = dumps(payload)
+    return b'{"' + key.encode("utf-8") + b'":' + encoded + (b"," + rest[1:] if len(rest) > 2 else b"}")
+
+
+# ----------------------------------------------------------------------
+# Pre-encoded responses
+# ----------------------------------------------------------------------
+class Encoded(NamedTuple):
+    body: bytes
+    etag: str
+    version: Hashable
+    expires: float
+
+
+class _Flight:
+    """One build in progress; followers wait on ``done``."""
+
+    __slots__ = ("done", "entry")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry: Optional[Encoded] = None
+
+
+class EncodedResponseCache:
+    """LRU of encoded JSON bodies, valid while their data version is current.
+
+    Entries also expire after ``ttl`` seconds, so writes made by other
+    processes show up. ``catalog_version`` changes whenever this process
+    flushes a stop or zone write; stop and zone listings use it as their
+    version.
+
+    ``fetch`` is single-flight: when an entry expires under load, one
+    caller rebuilds it and concurrent callers for the same key and version
+    wait for that result instead of repeating the work. Callers holding a
+    previous entry for the key that is at most ``stale_ttl`` seconds past
+    its expiry get it at once (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 2048, stale_ttl: float = 5.0,
+                 wait_timeout: float = 10.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.wait_timeout = wait_timeout
+        self.catalog_version = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Encoded]" = OrderedDict()
+        self._flights: Dict[Tuple[Hashable, Hashable], _Flight] = {}
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._coalesced = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = float(app.config.get("RESPONSE_CACHE_TTL", self.ttl))
+        self.max_entries = int(app.config.get("RESPONSE_CACHE_MAX_ENTRIES", self.max_entries))
+        self.stale_ttl = float(app.config.get("RESPONSE_CACHE_STALE_TTL", self.stale_ttl))
+        app.extensions["response_cache"] = self
+        if not event.contains(Session, "after_flush", self._flag_catalog_flush):
+            event.listen(Session, "after_flush", self._flag_catalog_flush)
+
+    def _flag_catalog_flush(self, session, flush_context) -> None:
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, (Stop, Zone)):
+                self.catalog_version += 1
+                return
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Encoded]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, version: Hashable, payload, ttl: Optional[float] = None) -> Encoded:
+        entry = encoded_body(dumps(payload), version, time.monotonic() + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def fetch(self, key: Hashable, version: Hashable, build: Callable[[], Dict],
+              ttl: Optional[float] = None, stale: bool = True) -> Encoded:
+        """The cached entry, or ``build()`` encoded and stored under ``key``.
+
+        Only one concurrent caller per key and version runs ``build``. With
+        ``stale`` the others may be answered from the previous entry.
+        """
+        flight_key = (key, version)
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version and entry.expires > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+                self._misses += 1
+            elif stale and entry is not None and now < entry.expires + self.stale_ttl:
+                self._stale += 1
+                return entry
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout) and flight.entry is not None:
+                return flight.entry
+            # The leader failed or is stuck; build independently
+            return self.put(key, version, build(), ttl)
+
+        try:
+            flight.entry = self.put(key, version, build(), ttl)
+            return flight.entry
+        finally:
+            with self._lock:
+                self._flights.pop(flight_key, None)
+            flight.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+                "stale": self._stale,
+                "coalesced": self._coalesced,
+                "backend": json_backend(),
+            }
+
+
+def encoded_body(body: bytes, version: Hashable = None, expires: float = 0.0) -> Encoded:
+    """``body`` with its ETag, for ``encoded_response``."""
+    return Encoded(body, hashlib.blake2b(body, digest_size=12).hexdigest(), version, expires)
+
+
+def encoded_response(entry: Encoded, vary: Sequence[str] = ()) -> Response:
+    """JSON response around pre-encoded bytes; 304 when the client holds the ETag."""
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry.body, mimetype="application/json")
+    response.set_etag(entry.etag)
+    for header in vary:
+        response.vary.add(header)
+    return response
+
+
+response_cache = EncodedResponseCache()
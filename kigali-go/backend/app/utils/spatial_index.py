@@ -0,0 +1,114 @@
+"""Uniform grid index over lat/lng points for batched proximity joins.
+
+Points are bucketed into square cells of roughly ``cell_km`` and sorted by
+cell key, so the contents of any cell form one contiguous slice. A batch of
+queries finds its candidates by looking up the neighbouring cells with
+``searchsorted``. Distances are then computed for those candidate pairs
+only, and every step is vectorized across the whole batch. This is what
+turns the stops x vehicles scan into one pass.
+"""
+from __future__ import annotations
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+from app.utils.geo import KM_PER_DEGREE_LAT, haversine_km_array
+
+# Column offset keeps cell keys positive for negative longitudes.
+_KEY_STRIDE = 1 << 24
+_COL_OFFSET = 1 << 23
+
+
+class GridIndex:
+    """Static grid over a set of points; rebuild it when the points change."""
+
+    def __init__(self, lats, lngs, cell_km: float = 1.0):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.cell_km = cell_km
+
+        ref_lat = float(np.mean(self.lats)) if len(self.lats) else 0.0
+        self._cos_ref = max(math.cos(math.radians(ref_lat)), 0.01)
+        self.cell_lat = cell_km / KM_PER_DEGREE_LAT
+        self.cell_lng = cell_km / (KM_PER_DEGREE_LAT * self._cos_ref)
+
+        keys = self._keys(self.lats, self.lngs)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _cells(self, lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.floor(np.asarray(lats) / self.cell_lat).astype(np.int64)
+        cols = np.floor(np.asarray(lngs) / self.cell_lng).astype(np.int64)
+        return rows, cols
+
+    def _keys(self, lats, lngs) -> np.ndarray:
+        rows, cols = self._cells(lats, lngs)
+        return rows * _KEY_STRIDE + (cols + _COL_OFFSET)
+
+    def pairs_within(self, qlats, qlngs, max_km: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """All (query, point) pairs closer than ``max_km``.
+
+        Returns ``(query_idx, point_idx, distance_km)`` as parallel arrays,
+        grouped by query but not sorted by distance.
+        """
+        qlats = np.atleast_1d(np.asarray(qlats, dtype=float))
+        qlngs = np.atleast_1d(np.asarray(qlngs, dtype=float))
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+        if not len(qlats) or not len(self):
+            return empty
+
+        # Cells are square at the reference latitude; widen the longitude
+        # ring if some query sits where a degree of longitude is shorter.
+        min_cos = max(float(np.min(np.cos(np.radians(qlats)))), 0.01)
+        ring_rows = int(math.ceil(max_km / self.cell_km))
+        ring_cols = int(math.ceil(max_km * self._cos_ref / (self.cell_km * min_cos)))
+        drow, dcol = np.meshgrid(
+            np.arange(-ring_rows, ring_rows + 1), np.arange(-ring_cols, ring_cols + 1), indexing="ij"
+        )
+        rows, cols = self._cells(qlats, qlngs)
+        neighbour_keys = (
+            (rows[:, None] + drow.ravel()[None, :]) * _KEY_STRIDE
+            + (cols[:, None] + dcol.ravel()[None, :] + _COL_OFFSET)
+        )
+
+        starts = np.searchsorted(self._sorted_keys, neighbour_keys, side="left").ravel()
+        counts = np.searchsorted(self._sorted_keys, neighbour_keys, side="right").ravel() - starts
+        total = int(counts.sum())
+        if not total:
+            return empty
+
+        # Expand every (query, cell) slice into individual candidate positions.
+        segment_offsets = np.cumsum(counts) - counts
+        positions = np.arange(total) - np.repeat(segment_offsets - starts, counts)
+        query_idx = np.repeat(np.repeat(np.arange(len(qlats)), neighbour_keys.shape[1]), counts)
+        point_idx = self._order[positions]
+
+        distances = haversine_km_array(
+            qlats[query_idx], qlngs[query_idx], self.lats[point_idx], self.lngs[point_idx]
+        )
+        keep = distances <= max_km
+        return query_idx[keep], point_idx[keep], distances[keep]
+
+    def nearest(self, qlats, qlngs, max_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest point to each query within ``max_km``.
+
+        Returns ``(point_idx, distance_km)``; queries with no point in range
+        get index ``-1`` and distance ``inf``.
+        """
+        n_queries = len(np.atleast_1d(qlats))
+        nearest_idx = np.full(n_queries, -1, dtype=np.int64)
+        nearest_dist = np.full(n_queries, np.inf)
+
+        query_idx, point_idx, distances = self.pairs_within(qlats, qlngs, max_km)
+        if len(query_idx):
+            order = np.lexsort((distances, query_idx))
+            first = np.unique(query_idx[order], return_index=True)[1]
+            best = order[first]
+            nearest_idx[query_idx[best]] = point_idx[best]
+            nearest_dist[query_idx[best]] = distances[best]
+        return nearest_idx, nearest_dist
@@ -0,0 +1,403 @@
+"""Learned vehicle speeds per zone and hour of the week, for ETAs.
+
+The fixed averages in ``geo.AVERAGE_SPEEDS_KMH`` ignore rush hours and
+congested districts. A background aggregator reads the recent
+``vehicle_positions`` history and sorts every moving fix into a bucket
+keyed by:
+
+* zone;
+* hour of the week (UTC, Monday 00:00 = 0);
+* vehicle type.
+
+Each bucket keeps a histogram of speeds in ``BIN_KMH`` steps. The median of
+each histogram becomes that bucket's speed.
+
+Fixes are mapped to zones through ``ZoneGrid``. It is a raster of
+``cell_deg`` cells, and each cell holds the zone whose center is nearest,
+within ``reach_km``. A lookup is therefore two array indexes, with no
+geometry and no database access. A bucket with fewer than ``min_samples``
+fixes falls back to the city-wide speed for that hour and type, and then
+to the fixed average. These fallbacks are resolved when the table is
+built, so an ETA reads exactly one float from a ``(zones + 1, 168, types)``
+array.
+
+The table is replaced as a whole on each rebuild. With ``SPEED_PROFILE_PATH``
+set it is also saved to disk. Other workers load that file instead of
+repeating the aggregation while it is newer than the refresh interval.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.geo import (
+    AVERAGE_SPEEDS_KMH, DEFAULT_SPEED_KMH, estimate_eta, estimate_eta_array, haversine_km_array, speeds_for_types,
+)
+from app.utils.vehicle_store import TYPE_CODES, VEHICLE_TYPES
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+BIN_KMH = 2.0
+MAX_KMH = 100.0
+N_BINS = int(MAX_KMH / BIN_KMH)
+CHUNK = 50000
+_EPOCH_HOUR_OF_WEEK = 3 * 24  # 1970-01-01 was a Thursday
+
+
+def hour_of_week(when: datetime) -> int:
+    return when.weekday() * 24 + when.hour
+
+
+def hour_of_week_array(timestamps) -> np.ndarray:
+    """Vectorized ``hour_of_week`` over datetimes."""
+    hours = np.asarray(timestamps, dtype="datetime64[h]").astype(np.int64)
+    return (hours + _EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK
+
+
+# ----------------------------------------------------------------------
+# Zone raster
+# ----------------------------------------------------------------------
+class ZoneGrid(NamedTuple):
+    """Zone position per ``cell_deg`` cell; -1 where no zone center is within reach."""
+    min_lat: float
+    min_lng: float
+    cell_deg: float
+    cells: np.ndarray  # int16 (rows, cols)
+    zone_ids: Tuple[int, ...]
+
+    def locate(self, lats, lngs) -> np.ndarray:
+        """Zone positions (indexes into ``zone_ids``) for coordinate arrays."""
+        lats = np.nan_to_num(np.asarray(lats, dtype=float), nan=-1e9)
+        lngs = np.nan_to_num(np.asarray(lngs, dtype=float), nan=-1e9)
+        rows = np.floor((lats - self.min_lat) / self.cell_deg).astype(np.int64)
+        cols = np.floor((lngs - self.min_lng) / self.cell_deg).astype(np.int64)
+        n_rows, n_cols = self.cells.shape
+        inside = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+        zones = np.full(rows.shape, -1, dtype=np.int64)
+        zones[inside] = self.cells[rows[inside], cols[inside]]
+        return zones
+
+    def locate_one(self, lat: float, lng: float) -> int:
+        """Scalar ``locate``."""
+        if lat is None or lng is None or lat != lat or lng != lng:
+            return -1
+        row = math.floor((lat - self.min_lat) / self.cell_deg)
+        col = math.floor((lng - self.min_lng) / self.cell_deg)
+        n_rows, n_cols = self.cells.shape
+        if 0 <= row < n_rows and 0 <= col < n_cols:
+            return int(self.cells[row, col])
+        return -1
+
+
+def build_zone_grid(zones: Sequence[Tuple[int, float, float]], cell_deg: float = 0.005,
+                    reach_km: float = 5.0) -> ZoneGrid:
+    """Raster of the nearest zone center for ``(zone_id, center_lat, center_lng)`` rows."""
+    if not zones:
+        return ZoneGrid(0.0, 0.0, cell_deg, np.full((0, 0), -1, dtype=np.int16), ())
+    ids = tuple(int(z[0]) for z in zones)
+    centers = np.array([(z[1], z[2]) for z in zones], dtype=float)
+    margin = reach_km / 111.0 / max(np.cos(np.radians(np.abs(centers[:, 0]).max())), 0.1)
+    min_lat, min_lng = centers.min(axis=0) - margin
+    max_lat, max_lng = centers.max(axis=0) + margin
+    n_rows = int(np.ceil((max_lat - min_lat) / cell_deg))
+    n_cols = int(np.ceil((max_lng - min_lng) / cell_deg))
+
+    cell_lats = min_lat + (np.arange(n_rows) + 0.5) * cell_deg
+    cell_lngs = min_lng + (np.arange(n_cols) + 0.5) * cell_deg
+    grid_lats, grid_lngs = np.meshgrid(cell_lats, cell_lngs, indexing="ij")
+    distances = haversine_km_array(
+        grid_lats.reshape(-1, 1), grid_lngs.reshape(-1, 1), centers[:, 0], centers[:, 1]
+    )
+    nearest = distances.argmin(axis=1)
+    nearest[distances.min(axis=1) > reach_km] = -1
+    return ZoneGrid(float(min_lat), float(min_lng), cell_deg,
+                    nearest.reshape(n_rows, n_cols).astype(np.int16), ids)
+
+
+# ----------------------------------------------------------------------
+# Aggregation
+# ----------------------------------------------------------------------
+class ProfileTable(NamedTuple):
+    grid: ZoneGrid
+    speeds: np.ndarray    # float32 (zones + 1, 168, types) km/h; the last zone row is city-wide
+    samples: np.ndarray   # int32, same shape: fixes behind each bucket
+    built_at: datetime
+
+    def lookup(self, lats, lngs, vehicle_types, hours) -> np.ndarray:
+        """Speeds in km/h for parallel arrays; unknown types get the fixed average."""
+        zones = self.grid.locate(lats, lngs)
+        zones[zones < 0] = self.speeds.shape[0] - 1
+        codes = np.array([TYPE_CODES.get(t, -1) for t in np.atleast_1d(vehicle_types)], dtype=np.int64)
+        hours = np.broadcast_to(np.asarray(hours, dtype=np.int64), codes.shape)
+        zones = np.broadcast_to(zones, codes.shape)
+        known = codes >= 0
+        speeds = speeds_for_types(np.atleast_1d(vehicle_types)).astype(float)
+        speeds[known] = self.speeds[zones[known], hours[known], codes[known]]
+        return speeds
+
+    def lookup_one(self, lat: float, lng: float, vehicle_type: str, hour: int) -> Optional[float]:
+        """Scalar ``lookup``; None for unknown types."""
+        code = TYPE_CODES.get(vehicle_type)
+        if code is None:
+            return None
+        zone = self.grid.locate_one(lat, lng)
+        return float(self.speeds[zone if zone >= 0 else self.speeds.shape[0] - 1, hour, code])
+
+
+def empty_histograms(n_zones: int) -> np.ndarray:
+    """Counts per (zone or outside, hour of week, type, speed bin)."""
+    return np.zeros((n_zones + 1, HOURS_PER_WEEK, len(VEHICLE_TYPES), N_BINS), dtype=np.int64)
+
+
+def add_fixes(histograms: np.ndarray, grid: ZoneGrid, lats, lngs, speeds, recorded_at, vehicle_types) -> int:
+    """Count a batch of fixes into ``histograms``; returns how many were counted."""
+    codes = np.array([TYPE_CODES.get(t, -1) for t in vehicle_types], dtype=np.int64)
+    speeds = np.asarray(speeds, dtype=float)
+    keep = (codes >= 0) & np.isfinite(speeds)
+    if not keep.any():
+        return 0
+    zones = grid.locate(np.asarray(lats, dtype=float)[keep], np.asarray(lngs, dtype=float)[keep])
+    zones[zones < 0] = histograms.shape[0] - 1
+    hours = hour_of_week_array(np.asarray(recorded_at, dtype="datetime64[us]")[keep])
+    bins = np.clip((speeds[keep] / BIN_KMH).astype(np.int64), 0, N_BINS - 1)
+    flat = np.ravel_multi_index((zones, hours, codes[keep], bins), histograms.shape)
+    histograms += np.bincount(flat, minlength=histograms.size).reshape(histograms.shape)
+    return int(keep.sum())
+
+
+def _medians(histograms: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    counts = histograms.sum(axis=-1)
+    cumulative = histograms.cumsum(axis=-1)
+    median_bin = (cumulative * 2 >= counts[..., None]).argmax(axis=-1)
+    return (median_bin + 0.5) * BIN_KMH, counts
+
+
+def build_table(grid: ZoneGrid, histograms: np.ndarray, min_samples: int = 30,
+                built_at: Optional[datetime] = None) -> ProfileTable:
+    """Median speed per bucket, with thin buckets resolved to their fallbacks."""
+    defaults = speeds_for_types(list(VEHICLE_TYPES)).astype(float)
+    city_speed, city_count = _medians(histograms.sum(axis=0))
+    city_speed = np.where(city_count >= min_samples, city_speed, defaults)
+
+    zone_speed, zone_count = _medians(histograms[:-1])
+    speeds = np.empty(histograms.shape[:-1], dtype=np.float32)
+    speeds[:-1] = np.where(zone_count >= min_samples, zone_speed, city_speed)
+    speeds[-1] = city_speed
+    samples = np.concatenate([zone_count, city_count[None]]).astype(np.int32)
+    return ProfileTable(grid, speeds, samples, built_at or datetime.utcnow())
+
+
+def learn_profiles(session, now: Optional[datetime] = None, window_days: int = 14, min_samples: int = 30,
+                   min_speed: float = 2.0, cell_deg: float = 0.005, reach_km: float = 5.0) -> ProfileTable:
+    """Aggregate the last ``window_days`` of moving fixes into a ``ProfileTable``."""
+    from sqlalchemy import select
+
+    from models.vehicle import Vehicle
+    from models.vehicle_position import VehiclePosition
+    from models.zone import Zone
+
+    now = now or datetime.utcnow()
+    zones = session.query(Zone.id, Zone.center_lat, Zone.center_lng).filter(
+        Zone.is_active == True, Zone.center_lat.isnot(None), Zone.center_lng.isnot(None)  # noqa: E712
+    ).order_by(Zone.id).all()
+    grid = build_zone_grid(zones, cell_deg=cell_deg, reach_km=reach_km)
+    histograms = empty_histograms(len(grid.zone_ids))
+
+    # History outlives deleted vehicles; their fixes have no type and are skipped by the join
+    stmt = select(
+        VehiclePosition.lat, VehiclePosition.lng, VehiclePosition.speed,
+        VehiclePosition.recorded_at, Vehicle.vehicle_type,
+    ).join(Vehicle, Vehicle.id == VehiclePosition.vehicle_id).where(
+        VehiclePosition.recorded_at >= now - timedelta(days=window_days),
+        VehiclePosition.recorded_at < now,
+        VehiclePosition.speed >= min_speed,
+    ).execution_options(yield_per=CHUNK)
+    counted = 0
+    for rows in session.execute(stmt).partitions():
+        lats, lngs, speeds, recorded_at, types = zip(*rows)
+        counted += add_fixes(histograms, grid, lats, lngs, speeds, recorded_at, types)
+    logger.info("Speed profiles learned from %d fixes over %d zones", counted, len(grid.zone_ids))
+    return build_table(grid, histograms, min_samples=min_samples, built_at=now)
+
+
+# ----------------------------------------------------------------------
+# Process-wide table
+# ----------------------------------------------------------------------
+class SpeedProfiles:
+    """The current ``ProfileTable`` plus the thread that keeps it fresh.
+
+    Until the first table is built or loaded, every lookup returns the
+    fixed averages, so ETAs match ``geo.estimate_eta``.
+    """
+
+    def __init__(self, window_days: int = 14, refresh_interval: float = 3600.0, min_samples: int = 30,
+                 min_speed: float = 2.0, path: Optional[str] = None):
+        self.window_days = window_days
+        self.refresh_interval = refresh_interval
+        self.min_samples = min_samples
+        self.min_speed = min_speed
+        self.path = path
+        self.table: Optional[ProfileTable] = None
+
+        self._app = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.rebuilds = 0
+        self.loads = 0
+        self.failures = 0
+
+    def init_app(self, app) -> None:
+        self.window_days = int(app.config.get("SPEED_PROFILE_WINDOW_DAYS", self.window_days))
+        self.refresh_interval = float(app.config.get("SPEED_PROFILE_REFRESH_INTERVAL", self.refresh_interval))
+        self.min_samples = int(app.config.get("SPEED_PROFILE_MIN_SAMPLES", self.min_samples))
+        self.path = app.config.get("SPEED_PROFILE_PATH", self.path) or None
+        self._app = app
+        app.extensions["speed_profiles"] = self
+        self.load()
+
+    @property
+    def enabled(self) -> bool:
+        """False when no app is bound or ``refresh_interval`` is 0 (no background aggregation)."""
+        return self._app is not None and self.refresh_interval > 0
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def speeds(self, lats, lngs, vehicle_types, when: Optional[datetime] = None) -> np.ndarray:
+        """Expected speeds in km/h at the given positions and time."""
+        self._ensure_thread()
+        table = self.table
+        if table is None:
+            return speeds_for_types(np.atleast_1d(vehicle_types)).astype(float)
+        return table.lookup(lats, lngs, vehicle_types, hour_of_week(when or datetime.utcnow()))
+
+    def speed(self, lat: float, lng: float, vehicle_type: str, when: Optional[datetime] = None) -> float:
+        self._ensure_thread()
+        table = self.table
+        speed = None
+        if table is not None:
+            speed = table.lookup_one(lat, lng, vehicle_type, hour_of_week(when or datetime.utcnow()))
+        return speed or AVERAGE_SPEEDS_KMH.get(vehicle_type, DEFAULT_SPEED_KMH)
+
+    def eta(self, distance_km: float, vehicle_type: str, lat: float, lng: float,
+            when: Optional[datetime] = None) -> float:
+        """``geo.estimate_eta`` at the learned speed around ``(lat, lng)``."""
+        return estimate_eta(distance_km, vehicle_type, speed_kmh=self.speed(lat, lng, vehicle_type, when))
+
+    def eta_array(self, distances_km, vehicle_types, lats, lngs, when: Optional[datetime] = None) -> np.ndarray:
+        return estimate_eta_array(distances_km, vehicle_types,
+                                  speeds_kmh=self.speeds(lats, lngs, vehicle_types, when))
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+    def rebuild(self, session, now: Optional[datetime] = None) -> ProfileTable:
+        """Aggregate the history now, swap the table in and save it."""
+        table = learn_profiles(session, now=now, window_days=self.window_days,
+                               min_samples=self.min_samples, min_speed=self.min_speed)
+        self.table = table
+        self.rebuilds += 1
+        self.save()
+        return table
+
+    def save(self) -> bool:
+        table = self.table
+        if not self.path or table is None:
+            return False
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh, speeds=table.speeds, samples=table.samples, cells=table.grid.cells,
+                zone_ids=np.asarray(table.grid.zone_ids, dtype=np.int64),
+                origin=np.array([table.grid.min_lat, table.grid.min_lng, table.grid.cell_deg]),
+                built_at=np.array(table.built_at, dtype="datetime64[us]"),
+            )
+        os.replace(tmp, self.path)
+        return True
+
+    def load(self) -> bool:
+        """Load the saved table, if there is one; returns whether it was loaded."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                min_lat, min_lng, cell_deg = data["origin"].tolist()
+                grid = ZoneGrid(min_lat, min_lng, cell_deg, data["cells"], tuple(data["zone_ids"].tolist()))
+                built_at = data["built_at"].astype("datetime64[us]").item()
+                self.table = ProfileTable(grid, data["speeds"], data["samples"], built_at)
+        except (OSError, KeyError, ValueError):
+            logger.warning("Could not load speed profiles from %s", self.path, exc_info=True)
+            return False
+        self.loads += 1
+        return True
+
+    def _saved_is_fresh(self) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.path) < self.refresh_interval
+        except (OSError, TypeError):
+            return False
+
+    def refresh(self) -> None:
+        """Load a fresh saved table from another worker, or aggregate one."""
+        if self.path and self._saved_is_fresh():
+            self.load()
+            return
+        from app.extensions import db
+        with self._app.app_context():
+            try:
+                self.rebuild(db.session)
+            finally:
+                db.session.remove()
+
+    def _ensure_thread(self) -> None:
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="speed-profiles", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                self.failures += 1
+                logger.exception("Speed profile refresh failed")
+            self._stopped.wait(self.refresh_interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def stats(self) -> Dict:
+        table = self.table
+        stats = {
+            "enabled": self.enabled,
+            "rebuilds": self.rebuilds,
+            "loads": self.loads,
+            "failures": self.failures,
+        }
+        if table is not None:
+            zone_samples = table.samples[:-1]
+            stats.update({
+                "built_at": table.built_at.isoformat(),
+                "zones": len(table.grid.zone_ids),
+                "fixes": int(table.samples[-1].sum()),
+                "learned_buckets": int((zone_samples >= self.min_samples).sum()),
+                "buckets": int(zone_samples.size),
+            })
+        return stats
+
+
+speed_profiles = SpeedProfiles()
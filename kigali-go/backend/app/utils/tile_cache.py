@@ -0,0 +1,195 @@
+"""Tile-quantized cache for the "nearby vehicles" endpoints.
+
+Clients rarely send the same center twice: two riders 10 m apart, or one
+rider whose GPS drifts, produce different query strings. So caching whole
+responses by query string almost never hits. Here the center is snapped to
+a tile of about ``tile_km`` and the radius is rounded up to whole tiles.
+The cached unit is the set of vehicles within that rounded radius plus
+half a tile diagonal of the tile center, which covers every request
+centered in the tile. Each request then runs a cheap vectorized pass over
+the cached candidates to compute exact distances, filter to its own radius
+and sort. Nearby users share one candidate scan of the store per tile.
+
+An entry is reused while the store has not changed, or for up to ``ttl``
+seconds after it has. Rebuilds are single-flight. While one request scans
+a tile, other requests for that tile get its previous entry, or wait if
+there is none. ``stats()`` reports hits, misses, the hit rate, ``stale``
+(old entries served during a rebuild) and ``coalesced`` (requests that
+waited). Artifacts derived from an entry, such as pre-encoded records,
+are kept with it through ``TileCandidates.derived``.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.utils.geo import KM_PER_DEGREE_LAT, calculate_distance_km, haversine_km_array
+
+
+class Tile(NamedTuple):
+    row: int
+    col: int
+    rings: int          # radius rounded up to whole tiles
+    center_lat: float
+    center_lng: float
+    cover_km: float     # candidate radius around the tile center
+
+
+class TileCandidates(NamedTuple):
+    """Vehicles around one tile; ``lats[i]``/``lngs[i]`` belong to ``rows[i]``."""
+
+    rows: List
+    lats: np.ndarray
+    lngs: np.ndarray
+    version: int
+    generation: int
+    created: float
+    built_at: datetime
+    memo: Dict[str, Any]
+
+    def select(self, lat: float, lng: float, radius_km: float,
+               limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indexes of the candidates within ``radius_km`` of a center, nearest first, and their distances."""
+        distances = haversine_km_array(lat, lng, self.lats, self.lngs)
+        inside = np.flatnonzero(distances <= radius_km)
+        order = inside[np.argsort(distances[inside], kind="stable")]
+        if limit is not None:
+            order = order[:limit]
+        return order, distances[order]
+
+    def nearby(self, lat: float, lng: float, radius_km: float, limit: Optional[int] = None) -> List[Tuple]:
+        """Same result as ``VehicleStateStore.nearby`` for a center inside the tile."""
+        order, distances = self.select(lat, lng, radius_km, limit)
+        rows = self.rows
+        return [(rows[i], d) for i, d in zip(order.tolist(), distances.tolist())]
+
+    def derived(self, name: str, build: Callable[["TileCandidates"], Any]) -> Any:
+        """``build(self)``, computed once per entry (a race at worst computes it twice)."""
+        value = self.memo.get(name)
+        if value is None:
+            value = self.memo[name] = build(self)
+        return value
+
+
+def snap(lat: float, lng: float, radius_km: float, tile_km: float) -> Tile:
+    """The tile holding ``(lat, lng)`` and the candidate radius that covers ``radius_km`` from anywhere in it."""
+    cell_lat = tile_km / KM_PER_DEGREE_LAT
+    row = math.floor(lat / cell_lat)
+    center_lat = (row + 0.5) * cell_lat
+    cell_lng = tile_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(center_lat)), 0.01))
+    col = math.floor(lng / cell_lng)
+    center_lng = (col + 0.5) * cell_lng
+
+    rings = max(int(math.ceil(radius_km / tile_km - 1e-9)), 1)
+    half_diagonal = max(
+        calculate_distance_km(center_lat, center_lng, row * cell_lat + dr * cell_lat, col * cell_lng + dc * cell_lng)
+        for dr in (0, 1) for dc in (0, 1)
+    )
+    return Tile(row, col, rings, center_lat, center_lng, rings * tile_km + half_diagonal)
+
+
+class TileCache:
+    """Process-local LRU of per-tile vehicle candidates."""
+
+    def __init__(self, tile_km: float = 0.5, ttl: float = 2.0, max_entries: int = 4096,
+                 wait_timeout: float = 5.0):
+        self.tile_km = tile_km
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, TileCandidates]" = OrderedDict()
+        self._flights: Dict[Tuple, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.coalesced = 0
+
+    def init_app(self, app) -> None:
+        self.tile_km = float(app.config.get("REALTIME_TILE_KM", self.tile_km))
+        self.ttl = float(app.config.get("REALTIME_TILE_CACHE_TTL", self.ttl))
+        self.max_entries = int(app.config.get("REALTIME_TILE_CACHE_MAX_ENTRIES", self.max_entries))
+        app.extensions["tile_cache"] = self
+
+    def candidates(self, store, lat: float, lng: float, radius_km: float,
+                   vehicle_type: Optional[str] = None) -> TileCandidates:
+        """Cached candidates for a request centered at ``(lat, lng)``."""
+        tile = snap(lat, lng, radius_km, self.tile_km)
+        key = (tile.row, tile.col, tile.rings, vehicle_type)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.generation == store.generation or now - entry.created < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+                self.misses += 1
+            elif entry is not None:
+                self.stale += 1
+                return entry
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.wait(self.wait_timeout)
+            with self._lock:
+                entry = self._entries.get(key)
+            # The leader failed or is stuck; scan independently
+            return entry if entry is not None else self._scan(store, tile, vehicle_type)
+
+        try:
+            entry = self._scan(store, tile, vehicle_type)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return entry
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    @staticmethod
+    def _scan(store, tile: Tile, vehicle_type: Optional[str]) -> TileCandidates:
+        # Read the version first: a cursor may lag the snapshot, never lead it
+        version, generation = store.version, store.generation
+        rows, lats, lngs = store.area(tile.center_lat, tile.center_lng, tile.cover_km, vehicle_type)
+        return TileCandidates(rows, lats, lngs, version, generation, time.monotonic(), datetime.utcnow(), {})
+
+    def nearby(self, store, lat: float, lng: float, radius_km: float, vehicle_type: Optional[str] = None,
+               limit: Optional[int] = None) -> Tuple[List[Tuple], int]:
+        """``(matches, version)``: vehicles within ``radius_km``, nearest first, and the store version they reflect."""
+        entry = self.candidates(store, lat, lng, radius_km, vehicle_type)
+        return entry.nearby(lat, lng, radius_km, limit), entry.version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "tile_km": self.tile_km,
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+tile_cache = TileCache()
@@ -0,0 +1,446 @@
+"""Mapbox Vector Tiles (MVT 2.1) for stops and zone boundaries.
+
+Stops and zones change rarely, so every non-empty tile from
+``min_zoom`` to ``max_zoom`` is rendered ahead of time. The tiles are kept
+in memory and, when ``cache_dir`` is set, written to
+``<cache_dir>/<zooms>-<version>/<z>/<x>/<y>.mvt``. ``version`` is a digest of the
+source rows. At most every ``check_interval`` seconds, and right after
+this process flushes a stop or zone write, a request recomputes it and
+renders again if the data changed. A process that starts against
+unchanged data loads the tiles from disk. Map clients overzoom past
+``max_zoom``.
+
+The protobuf encoding is written out by hand (varints, zigzag and
+length-delimited fields) because the tile schema is small and fixed.
+Zone polygons are clipped to the tile plus a small buffer and quantized
+to the tile extent, which also drops vertices too close to tell apart.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.utils.web_mercator import MAX_LATITUDE
+
+logger = logging.getLogger(__name__)
+
+EXTENT = 4096
+BUFFER = 64
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+POINT, POLYGON = 1, 3
+_MOVE_TO, _LINE_TO, _CLOSE_PATH = 1, 2, 7
+
+Ring = List[Tuple[float, float]]  # (lng, lat)
+
+
+# ----------------------------------------------------------------------
+# Protobuf primitives
+# ----------------------------------------------------------------------
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Length-delimited field."""
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _packed(number: int, values: Iterable[int]) -> bytes:
+    return _field(number, b"".join(_varint(v) for v in values))
+
+
+def _value(value) -> bytes:
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        return _uint_field(5, value) if value >= 0 else _uint_field(6, _zigzag(value))
+    if isinstance(value, float):
+        return _varint((3 << 3) | 1) + struct.pack("<d", value)
+    return _field(1, str(value).encode("utf-8"))
+
+
+# ----------------------------------------------------------------------
+# Geometry
+# ----------------------------------------------------------------------
+def world_coords(lngs, lats, z: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Web-mercator coordinates in tile units at zoom ``z`` (tile ``x`` spans ``[x, x + 1)``)."""
+    size = float(1 << z)
+    lats = np.clip(np.asarray(lats, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    phi = np.radians(lats)
+    x = (np.asarray(lngs, dtype=float) + 180.0) / 360.0 * size
+    y = (1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / np.pi) / 2.0 * size
+    return x, y
+
+
+def _clip_ring(points: List[Tuple[float, float]], low: float, high: float) -> List[Tuple[float, float]]:
+    """Sutherland-Hodgman clip of a closed ring to the square ``[low, high]``."""
+    for axis, bound, keep_above in ((0, low, True), (0, high, False), (1, low, True), (1, high, False)):
+        if not points:
+            break
+        inside = (lambda p: p[axis] >= bound) if keep_above else (lambda p: p[axis] <= bound)
+        clipped = []
+        previous = points[-1]
+        for current in points:
+            if inside(current) != inside(previous):
+                t = (bound - previous[axis]) / (current[axis] - previous[axis])
+                crossing = [previous[0] + t * (current[0] - previous[0]), previous[1] + t * (current[1] - previous[1])]
+                crossing[axis] = bound
+                clipped.append(tuple(crossing))
+            if inside(current):
+                clipped.append(current)
+            previous = current
+        points = clipped
+    return points
+
+
+def _signed_area(ring: Sequence[Tuple[int, int]]) -> int:
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, list(ring[1:]) + [ring[0]]))
+
+
+def _quantize(points) -> List[Tuple[int, int]]:
+    ring: List[Tuple[int, int]] = []
+    for x, y in points:
+        point = (int(round(x)), int(round(y)))
+        if not ring or ring[-1] != point:
+            ring.append(point)
+    while len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    return ring
+
+
+def _polygon_commands(rings: Sequence[Sequence[Tuple[int, int]]]) -> List[int]:
+    """Command stream for one polygon; ``rings[0]`` is the exterior."""
+    commands: List[int] = []
+    cx = cy = 0
+    for index, ring in enumerate(rings):
+        # Exterior rings wind with positive area in tile coordinates (y down), holes negative
+        if (_signed_area(ring) > 0) != (index == 0):
+            ring = ring[::-1]
+        commands.append(_MOVE_TO | (1 << 3))
+        for position, (x, y) in enumerate(ring):
+            if position == 1:
+                commands.append(_LINE_TO | ((len(ring) - 1) << 3))
+            commands += [_zigzag(x - cx), _zigzag(y - cy)]
+            cx, cy = x, y
+        commands.append(_CLOSE_PATH | (1 << 3))
+    return commands
+
+
+def _point_commands(points: Sequence[Tuple[int, int]]) -> List[int]:
+    commands = [_MOVE_TO | (len(points) << 3)]
+    cx = cy = 0
+    for x, y in points:
+        commands += [_zigzag(x - cx), _zigzag(y - cy)]
+        cx, cy = x, y
+    return commands
+
+
+# ----------------------------------------------------------------------
+# Layers and tiles
+# ----------------------------------------------------------------------
+class Layer:
+    """Features of one MVT layer; keys and values are interned per layer."""
+
+    def __init__(self, name: str, extent: int = EXTENT):
+        self.name = name
+        self.extent = extent
+        self._features: List[bytes] = []
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, object], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def _tags(self, properties: Dict) -> List[int]:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(self._keys.setdefault(key, len(self._keys)))
+            tags.append(self._values.setdefault((type(value), value), len(self._values)))
+        return tags
+
+    def add(self, geom_type: int, commands: List[int], properties: Dict, feature_id: Optional[int] = None) -> None:
+        feature = b""
+        if feature_id is not None:
+            feature += _uint_field(1, feature_id)
+        feature += _packed(2, self._tags(properties)) + _uint_field(3, geom_type) + _packed(4, commands)
+        self._features.append(feature)
+
+    def encode(self) -> bytes:
+        body = _uint_field(15, 2) + _field(1, self.name.encode("utf-8"))
+        body += b"".join(_field(2, feature) for feature in self._features)
+        body += b"".join(_field(3, key.encode("utf-8")) for key in self._keys)
+        body += b"".join(_field(4, _value(value)) for _, value in self._values)
+        return body + _uint_field(5, self.extent)
+
+
+def encode_tile(layers: Iterable[Layer]) -> bytes:
+    """Tile message holding the non-empty ``layers``."""
+    return b"".join(_field(3, layer.encode()) for layer in layers if len(layer))
+
+
+class StopPoint(NamedTuple):
+    id: int
+    lat: float
+    lng: float
+    properties: Dict
+
+
+class ZoneShape(NamedTuple):
+    id: int
+    polygons: List[List[Ring]]   # polygons -> rings -> (lng, lat)
+    properties: Dict
+
+
+def render_tiles(stops: Sequence[StopPoint], zones: Sequence[ZoneShape], min_zoom: int, max_zoom: int,
+                 extent: int = EXTENT, buffer: int = BUFFER) -> Dict[Tuple[int, int, int], bytes]:
+    """Every non-empty ``(z, x, y)`` tile with ``zones`` and ``stops`` layers."""
+    tiles: Dict[Tuple[int, int, int], Dict[str, Layer]] = {}
+
+    def layer(key, name):
+        layers = tiles.setdefault(key, {})
+        if name not in layers:
+            layers[name] = Layer(name, extent)
+        return layers[name]
+
+    for z in range(min_zoom, max_zoom + 1):
+        for zone in zones:
+            for polygon in zone.polygons:
+                exterior = np.asarray(polygon[0], dtype=float)
+                wx, wy = world_coords(exterior[:, 0], exterior[:, 1], z)
+                margin = buffer / extent
+                for tx in range(int(np.floor(wx.min() - margin)), int(np.floor(wx.max() + margin)) + 1):
+                    for ty in range(int(np.floor(wy.min() - margin)), int(np.floor(wy.max() + margin)) + 1):
+                        if not (0 <= tx < (1 << z) and 0 <= ty < (1 << z)):
+                            continue
+                        rings = []
+                        for ring in polygon:
+                            ring = np.asarray(ring, dtype=float)
+                            rx, ry = world_coords(ring[:, 0], ring[:, 1], z)
+                            local = list(zip(((rx - tx) * extent).tolist(), ((ry - ty) * extent).tolist()))
+                            quantized = _quantize(_clip_ring(local, -buffer, extent + buffer))
+                            if len(quantized) >= 3 and _signed_area(quantized):
+                                rings.append(quantized)
+                            elif not rings:
+                                break   # no exterior in this tile; holes alone mean nothing
+                        if rings:
+                            layer((z, tx, ty), "zones").add(POLYGON, _polygon_commands(rings), zone.properties, zone.id)
+
+        if stops:
+            sx, sy = world_coords([s.lng for s in stops], [s.lat for s in stops], z)
+            for stop, x, y in zip(stops, sx.tolist(), sy.tolist()):
+                tx, ty = int(x), int(y)
+                point = (int(round((x - tx) * extent)), int(round((y - ty) * extent)))
+                layer((z, tx, ty), "stops").add(POINT, _point_commands([point]), stop.properties, stop.id)
+
+    return {
+        key: encode_tile(layers[name] for name in ("zones", "stops") if name in layers)
+        for key, layers in tiles.items()
+    }
+
+
+# ----------------------------------------------------------------------
+# Source rows
+# ----------------------------------------------------------------------
+def parse_wkb_polygons(data) -> List[List[Ring]]:
+    """Polygons of a (E)WKB Polygon or MultiPolygon as rings of ``(lng, lat)``."""
+    data = bytes(data)
+    offset = 0
+
+    def geometry():
+        nonlocal offset
+        order = "<" if data[offset] == 1 else ">"
+        (kind,) = struct.unpack_from(order + "I", data, offset + 1)
+        offset += 5
+        if kind & 0x20000000:   # EWKB SRID
+            offset += 4
+        kind &= 0xFFFF
+        if kind == 3:
+            (ring_count,) = struct.unpack_from(order + "I", data, offset)
+            offset += 4
+            rings = []
+            for _ in range(ring_count):
+                (count,) = struct.unpack_from(order + "I", data, offset)
+                offset += 4
+                coords = struct.unpack_from(order + "d" * (2 * count), data, offset)
+                offset += 16 * count
+                rings.append(list(zip(coords[0::2], coords[1::2])))
+            return [rings]
+        if kind == 6:
+            (count,) = struct.unpack_from(order + "I", data, offset)
+            offset += 4
+            return [polygon for _ in range(count) for polygon in geometry()]
+        raise ValueError(f"Unsupported WKB geometry type {kind}")
+
+    return geometry()
+
+
+def load_sources(session) -> Tuple[List[StopPoint], List[ZoneShape], str]:
+    """Active stops and zones with a boundary, plus the digest that versions them."""
+    from sqlalchemy import func
+    from models.stop import Stop
+    from models.zone import Zone
+
+    digest = hashlib.blake2b(digest_size=10)
+    stop_rows = session.query(
+        Stop.id, Stop.lat, Stop.lng, Stop.name, Stop.code, Stop.stop_type, Stop.zone_id, Stop.is_shelter
+    ).filter(Stop.is_active == True).order_by(Stop.id).all()
+    stops = []
+    for row in stop_rows:
+        digest.update(repr(tuple(row)).encode())
+        stops.append(StopPoint(row.id, row.lat, row.lng, {
+            "name": row.name, "code": row.code, "stop_type": row.stop_type,
+            "zone_id": row.zone_id, "is_shelter": bool(row.is_shelter),
+        }))
+
+    boundary = Zone.boundary
+    if session.get_bind().dialect.name == "postgresql":
+        boundary = func.ST_AsBinary(Zone.boundary)
+    zone_rows = session.query(Zone.id, Zone.name, Zone.code, Zone.district, boundary).filter(
+        Zone.is_active == True, Zone.boundary.isnot(None)
+    ).order_by(Zone.id).all()
+    zones = []
+    for zone_id, name, code, district, wkb in zone_rows:
+        wkb = bytes(getattr(wkb, "data", wkb))
+        digest.update(repr((zone_id, name, code, district)).encode() + wkb)
+        try:
+            polygons = parse_wkb_polygons(wkb)
+        except (ValueError, struct.error) as exc:
+            logger.warning("Skipping zone %s boundary: %s", zone_id, exc)
+            continue
+        zones.append(ZoneShape(zone_id, polygons, {"name": name, "code": code, "district": district}))
+    return stops, zones, digest.hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Pre-rendered tile set
+# ----------------------------------------------------------------------
+class RenderedTiles(NamedTuple):
+    version: str
+    tiles: Dict[Tuple[int, int, int], bytes]
+
+
+class VectorTileSet:
+    """Pre-rendered stop/zone tiles, re-rendered when the source rows change."""
+
+    def __init__(self, min_zoom: int = 10, max_zoom: int = 14, cache_dir: Optional[str] = None,
+                 check_interval: float = 60.0):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rendered: Optional[RenderedTiles] = None
+        self._checked = 0.0
+
+    def init_app(self, app) -> None:
+        self.min_zoom = int(app.config.get("MVT_MIN_ZOOM", self.min_zoom))
+        self.max_zoom = int(app.config.get("MVT_MAX_ZOOM", self.max_zoom))
+        self.cache_dir = app.config.get("MVT_CACHE_DIR", self.cache_dir) or None
+        self.check_interval = float(app.config.get("MVT_CHECK_INTERVAL", self.check_interval))
+        app.extensions["vector_tiles"] = self
+        if not event.contains(Session, "after_flush", self._flag_source_flush):
+            event.listen(Session, "after_flush", self._flag_source_flush)
+
+    def _flag_source_flush(self, session, flush_context) -> None:
+        from models.stop import Stop
+        from models.zone import Zone
+        if any(isinstance(obj, (Stop, Zone)) for obj in chain(session.new, session.dirty, session.deleted)):
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """Check the source rows on the next request."""
+        self._checked = 0.0
+
+    def current(self, session, force: bool = False) -> RenderedTiles:
+        """The tile set for the current rows; renders or loads it when they changed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._rendered is not None and not force and now - self._checked < self.check_interval:
+                return self._rendered
+            stops, zones, version = load_sources(session)
+            self._checked = now
+            if self._rendered is None or self._rendered.version != version:
+                tiles = self._load(version)
+                if tiles is None:
+                    started = time.perf_counter()
+                    tiles = render_tiles(stops, zones, self.min_zoom, self.max_zoom)
+                    logger.info("Rendered %d vector tiles (z%d-%d) in %.2fs", len(tiles),
+                                self.min_zoom, self.max_zoom, time.perf_counter() - started)
+                    self._save(version, tiles)
+                self._rendered = RenderedTiles(version, tiles)
+            return self._rendered
+
+    def tile(self, session, z: int, x: int, y: int) -> Tuple[bytes, str]:
+        """``(tile bytes, version)``; empty bytes for tiles without features."""
+        rendered = self.current(session)
+        return rendered.tiles.get((z, x, y), b""), rendered.version
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.cache_dir, f"{self.min_zoom}-{self.max_zoom}-{version}")
+
+    def _load(self, version: str) -> Optional[Dict[Tuple[int, int, int], bytes]]:
+        if not self.cache_dir or not os.path.isdir(self._version_dir(version)):
+            return None
+        root = self._version_dir(version)
+        tiles = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(".mvt"):
+                    z, x = os.path.relpath(dirpath, root).split(os.sep)
+                    with open(os.path.join(dirpath, filename), "rb") as handle:
+                        tiles[(int(z), int(x), int(filename[:-4]))] = handle.read()
+        return tiles
+
+    def _save(self, version: str, tiles: Dict[Tuple[int, int, int], bytes]) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=self.cache_dir)
+            for (z, x, y), data in tiles.items():
+                os.makedirs(os.path.join(staging, str(z), str(x)), exist_ok=True)
+                with open(os.path.join(staging, str(z), str(x), f"{y}.mvt"), "wb") as handle:
+                    handle.write(data)
+            # Publish the whole version at once; a concurrent writer may have won
+            try:
+                os.rename(staging, self._version_dir(version))
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+            # Older versions of this zoom range are never read again
+            prefix = f"{self.min_zoom}-{self.max_zoom}-"
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix) and name != prefix + version:
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+        except OSError as exc:
+            logger.warning("Could not write vector tiles to %s: %s", self.cache_dir, exc)
+
+
+vector_tiles = VectorTileSet()
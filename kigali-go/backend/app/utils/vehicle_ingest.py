@@ -0,0 +1,247 @@
+"""Bulk ingest of vehicle GPS positions from operator feeds.
+
+A batch goes through four steps. Records are parsed and range-checked as
+arrays, and vehicles are resolved by id or registration in a few IN
+queries. Each vehicle keeps only its newest position, and positions no
+newer than the vehicle's ``last_seen`` are dropped. The survivors are
+written with one executemany UPDATE whose WHERE clause repeats the
+``last_seen`` guard, so a concurrent newer write is never overwritten.
+When a write-behind buffer is passed in, the survivors are queued there
+instead and written on its next flush. With history enabled, every fix
+newer than ``last_seen`` is also appended to ``vehicle_positions``,
+including fixes that a newer one in the same batch superseded.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import DateTime, bindparam, func, or_, update
+
+from app.extensions import db
+from app.utils.position_history import record_positions
+from models.vehicle import Vehicle
+
+# Positions stamped further in the future than this are rejected
+MAX_CLOCK_SKEW = timedelta(seconds=60)
+MAX_SPEED_KMH = 300.0
+LOOKUP_CHUNK = 500
+
+
+@dataclass
+class PositionUpdate:
+    vehicle_id: int
+    lat: float
+    lng: float
+    bearing: Optional[float]
+    speed: Optional[float]
+    ts: datetime
+
+
+@dataclass
+class IngestResult:
+    received: int = 0
+    applied: int = 0
+    stale: int = 0
+    unknown: int = 0
+    recorded: int = 0
+    rejected: List[Dict] = field(default_factory=list)
+
+    def to_dict(self, max_errors: int = 100) -> Dict:
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "stale": self.stale,
+            "unknown": self.unknown,
+            "recorded": self.recorded,
+            "rejected": len(self.rejected),
+            "errors": self.rejected[:max_errors],
+        }
+
+
+def parse_timestamp(value, now: datetime) -> datetime:
+    """Naive UTC datetime from ISO 8601 text or epoch seconds/milliseconds; ``None`` means now."""
+    if value is None:
+        return now
+    if isinstance(value, bool):
+        raise ValueError("invalid timestamp")
+    if isinstance(value, (int, float)):
+        seconds = value / 1000.0 if value > 1e11 else float(value)
+        return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _optional_float(value) -> float:
+    return math.nan if value is None else float(value)
+
+
+def validate_positions(records: List, now: datetime) -> Tuple[List[Tuple], List[Dict]]:
+    """Split records into ``(index, key, lat, lng, bearing, speed, ts)`` rows and rejections.
+
+    ``key`` is ``("id", int)`` or ``("registration", str)``. Missing bearing
+    or speed come back as ``None``.
+    """
+    rejected: List[Dict] = []
+    parsed = []
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("record must be an object")
+            if record.get("id") is not None:
+                key = ("id", int(record["id"]))
+            elif record.get("registration"):
+                key = ("registration", str(record["registration"]).strip().upper())
+            else:
+                raise ValueError("id or registration is required")
+            parsed.append((
+                index, key, float(record["lat"]), float(record["lng"]),
+                _optional_float(record.get("bearing")), _optional_float(record.get("speed")),
+                parse_timestamp(record.get("ts"), now),
+            ))
+        except KeyError as exc:
+            rejected.append({"index": index, "error": f"missing field {exc.args[0]}"})
+        except (TypeError, ValueError, OverflowError, OSError) as exc:
+            rejected.append({"index": index, "error": str(exc) or "invalid record"})
+
+    if not parsed:
+        return [], rejected
+
+    # Range checks over the whole batch at once
+    lats = np.array([row[2] for row in parsed])
+    lngs = np.array([row[3] for row in parsed])
+    bearings = np.array([row[4] for row in parsed])
+    speeds = np.array([row[5] for row in parsed])
+    too_new = np.array([row[6] > now + MAX_CLOCK_SKEW for row in parsed])
+    checks = [
+        (~(np.abs(lats) <= 90) | ~(np.abs(lngs) <= 180), "coordinates out of range"),
+        (np.isinf(bearings), "invalid bearing"),
+        (~np.isnan(speeds) & ~((speeds >= 0) & (speeds <= MAX_SPEED_KMH)), "speed out of range"),
+        (too_new, "timestamp is in the future"),
+    ]
+    bad = np.zeros(len(parsed), dtype=bool)
+    for mask, message in checks:
+        for i in np.flatnonzero(mask & ~bad):
+            rejected.append({"index": parsed[i][0], "error": message})
+        bad |= mask
+
+    bearings = np.where(np.isnan(bearings), np.nan, np.mod(bearings, 360.0))
+    rows = [
+        (index, key, lat, lng,
+         None if math.isnan(bearings[i]) else float(bearings[i]),
+         None if math.isnan(speed) else speed, ts)
+        for i, (index, key, lat, lng, _, speed, ts) in enumerate(parsed) if not bad[i]
+    ]
+    rejected.sort(key=lambda error: error["index"])
+    return rows, rejected
+
+
+def resolve_vehicles(session, keys: Iterable[Tuple[str, object]]) -> Dict[Tuple[str, object], Tuple[int, Optional[datetime]]]:
+    """Map ``("id", n)`` / ``("registration", s)`` keys to ``(vehicle_id, last_seen)``."""
+    ids = sorted({value for kind, value in keys if kind == "id"})
+    registrations = sorted({value for kind, value in keys if kind == "registration"})
+    resolved = {}
+    for kind, values, column in (("id", ids, Vehicle.id), ("registration", registrations, Vehicle.registration)):
+        for start in range(0, len(values), LOOKUP_CHUNK):
+            chunk = values[start:start + LOOKUP_CHUNK]
+            query = session.query(Vehicle.id, Vehicle.registration, Vehicle.last_seen).filter(column.in_(chunk))
+            for vehicle_id, registration, last_seen in query:
+                value = vehicle_id if kind == "id" else registration.upper()
+                resolved[(kind, value)] = (vehicle_id, last_seen)
+    return resolved
+
+
+def apply_positions(session, updates: List[PositionUpdate], now: Optional[datetime] = None) -> int:
+    """Write positions with a single executemany UPDATE; returns rows changed.
+
+    Bearing and speed keep their previous values when an update omits
+    them. Rows whose ``last_seen`` is already at or past the update's
+    timestamp are left alone.
+    """
+    if not updates:
+        return 0
+    now = now or datetime.utcnow()
+    table = Vehicle.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .where(or_(table.c.last_seen.is_(None), table.c.last_seen < bindparam("b_ts", type_=DateTime)))
+        .values(
+            current_lat=bindparam("b_lat"),
+            current_lng=bindparam("b_lng"),
+            bearing=func.coalesce(bindparam("b_bearing"), table.c.bearing),
+            speed=func.coalesce(bindparam("b_speed"), table.c.speed),
+            last_seen=bindparam("b_ts", type_=DateTime),
+            updated_at=now,
+        )
+    )
+    params = [
+        {"b_id": u.vehicle_id, "b_lat": u.lat, "b_lng": u.lng, "b_bearing": u.bearing,
+         "b_speed": u.speed, "b_ts": u.ts}
+        for u in updates
+    ]
+    result = session.execute(statement, params)
+    return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(params)
+
+
+def ingest_positions(records: List, session=None, now: Optional[datetime] = None, buffer=None,
+                     history: bool = False) -> IngestResult:
+    """Validate, de-duplicate and apply a batch of position records.
+
+    Commits directly unless an enabled ``PositionBuffer`` is given, in
+    which case ``applied`` and ``recorded`` count what the buffer accepted.
+    """
+    session = session or db.session
+    now = now or datetime.utcnow()
+    result = IngestResult(received=len(records))
+
+    rows, result.rejected = validate_positions(records, now)
+    resolved = resolve_vehicles(session, [row[1] for row in rows])
+
+    latest: Dict[int, PositionUpdate] = {}
+    track: List[PositionUpdate] = []
+    tracked = set()
+    for index, key, lat, lng, bearing, speed, ts in rows:
+        match = resolved.get(key)
+        if match is None:
+            result.unknown += 1
+            continue
+        vehicle_id, last_seen = match
+        if last_seen is not None and ts <= last_seen:
+            result.stale += 1
+            continue
+        update = PositionUpdate(vehicle_id, lat, lng, bearing, speed, ts)
+        if (vehicle_id, ts) not in tracked:
+            tracked.add((vehicle_id, ts))
+            track.append(update)
+        current = latest.get(vehicle_id)
+        if current is not None and current.ts >= ts:
+            result.stale += 1
+            continue
+        if current is not None:
+            result.stale += 1  # superseded by this newer record
+        latest[vehicle_id] = update
+    if not history:
+        track = []
+
+    if buffer is not None and buffer.enabled:
+        result.applied = buffer.submit(latest.values(), history=track)
+        result.recorded = len(track)
+        result.stale += len(latest) - result.applied
+        return result
+
+    try:
+        result.applied = apply_positions(session, list(latest.values()), now=now)
+        result.recorded = record_positions(session, track)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    # Rows that lost the last_seen race inside the UPDATE are stale too
+    result.stale += len(latest) - result.applied
+    return result
@@ -0,0 +1,544 @@
+"""Process-local vehicle state store backing the "nearby vehicles" endpoints.
+
+Positions, bearings, speeds, types and active flags are kept in NumPy arrays
+(one slot per vehicle) so radius and type filters run as a single vectorized
+pass instead of hydrating ``Vehicle`` ORM objects on every request. The store
+is refreshed incrementally from the database-stamped ``Vehicle.change_version``
+and its tombstones, and periodically reloaded in full. The per-slot versions
+also answer delta queries for clients holding a cursor. Cursors never pass
+the database's commit horizon, so a version committed after a higher one
+is still delivered. Long-polling requests
+block on ``wait_for_change``, which wakes when the store applies new rows or
+when this process commits a vehicle write. Positions still waiting in the
+write-behind buffer are overlaid on the database rows after each refresh.
+Every slot write also updates ``counters``, the running fleet totals.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.utils.clustering import ClusterPyramid
+from app.utils.fleet_counters import FleetCounters
+from app.utils.geo import bounding_box, haversine_km_array
+from app.utils.spatial_index import GridIndex
+from models.vehicle import Vehicle, VehicleTombstone
+from models.versioning import CommitHorizon
+
+VEHICLE_TYPES = ("bus", "taxi", "moto")
+TYPE_CODES = {name: code for code, name in enumerate(VEHICLE_TYPES)}
+UNKNOWN_TYPE_CODE = -1
+
+# Changed vehicles further than this outside an area are not reported as removals
+REMOVAL_HALO_KM = 5.0
+
+_CURSOR_PREFIX = "v1:"
+
+
+class VehicleState(NamedTuple):
+    """Immutable snapshot of one vehicle row (the geometry column is never loaded)."""
+
+    id: int
+    vehicle_type: Optional[str]
+    registration: Optional[str]
+    operator: Optional[str]
+    driver_name: Optional[str]
+    driver_phone: Optional[str]
+    capacity: Optional[int]
+    fuel_type: Optional[str]
+    current_lat: Optional[float]
+    current_lng: Optional[float]
+    bearing: Optional[float]
+    speed: Optional[float]
+    route_id: Optional[str]
+    route_name: Optional[str]
+    is_active: Optional[bool]
+    is_available: Optional[bool]
+    last_seen: Optional[datetime]
+    updated_at: Optional[datetime]
+    change_version: int = 0
+
+    def to_dict(self) -> Dict:
+        """Same shape as ``Vehicle.to_dict`` so endpoints can swap sources."""
+        return {
+            "id": self.id,
+            "vehicle_type": self.vehicle_type,
+            "registration": self.registration,
+            "operator": self.operator,
+            "driver_name": self.driver_name,
+            "driver_phone": self.driver_phone,
+            "capacity": self.capacity,
+            "fuel_type": self.fuel_type,
+            "current_lat": self.current_lat,
+            "current_lng": self.current_lng,
+            "bearing": self.bearing,
+            "speed": self.speed,
+            "route_id": self.route_id,
+            "route_name": self.route_name,
+            "is_active": self.is_active,
+            "is_available": self.is_available,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+        }
+
+
+# Projected columns, in VehicleState field order.
+STATE_COLUMNS = tuple(getattr(Vehicle, name) for name in VehicleState._fields)
+
+
+class IndexedFleet(NamedTuple):
+    """Grid index over active, located vehicles; ``rows[i]`` is index point ``i``."""
+
+    index: GridIndex
+    rows: List[VehicleState]
+
+
+class VehicleStateStore:
+    """Struct-of-arrays cache of vehicle state keyed by vehicle id."""
+
+    def __init__(self, refresh_interval: float = 1.0, full_reload_interval: float = 60.0,
+                 initial_capacity: int = 1024, commit_horizon: Optional[CommitHorizon] = None):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.commit_horizon = commit_horizon or CommitHorizon(Vehicle.__tablename__)
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._local_writes = 0
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._last_full_reload = 0.0
+        self._watermark: Optional[int] = None
+        self._horizon: Optional[int] = None  # None where versions commit in order
+        self._generation = 0
+        self._grid_cache: Optional[Tuple[Tuple[int, float], IndexedFleet]] = None
+        self._pyramid_cache: Optional[Tuple[int, ClusterPyramid]] = None
+        self._overlays: List[Callable[[], Iterable]] = []
+        self.counters = FleetCounters()
+
+        self._allocate(initial_capacity)
+
+    def init_app(self, app) -> None:
+        self.refresh_interval = float(app.config.get("VEHICLE_STORE_REFRESH_INTERVAL", self.refresh_interval))
+        self.full_reload_interval = float(
+            app.config.get("VEHICLE_STORE_FULL_RELOAD_INTERVAL", self.full_reload_interval)
+        )
+        app.extensions["vehicle_store"] = self
+        if not event.contains(Session, "after_commit", _notify_vehicle_commit):
+            event.listen(Session, "after_flush", _flag_vehicle_flush)
+            event.listen(Session, "do_orm_execute", _flag_vehicle_statement)
+            event.listen(Session, "after_commit", _notify_vehicle_commit)
+            event.listen(Session, "after_rollback", _clear_vehicle_flag)
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _allocate(self, capacity: int) -> None:
+        self._size = 0
+        self._deleted = 0
+        self._index: Dict[int, int] = {}
+        self._rows: List[VehicleState] = []
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._lat = np.full(capacity, np.nan)
+        self._lng = np.full(capacity, np.nan)
+        self._bearing = np.zeros(capacity)
+        self._speed = np.zeros(capacity)
+        self._type = np.full(capacity, UNKNOWN_TYPE_CODE, dtype=np.int8)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._version = np.zeros(capacity, dtype=np.int64)
+        self.counters.reset()
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        pad = new_capacity - capacity
+        self._ids = np.concatenate([self._ids, np.zeros(pad, dtype=np.int64)])
+        self._lat = np.concatenate([self._lat, np.full(pad, np.nan)])
+        self._lng = np.concatenate([self._lng, np.full(pad, np.nan)])
+        self._bearing = np.concatenate([self._bearing, np.zeros(pad)])
+        self._speed = np.concatenate([self._speed, np.zeros(pad)])
+        self._type = np.concatenate([self._type, np.full(pad, UNKNOWN_TYPE_CODE, dtype=np.int8)])
+        self._active = np.concatenate([self._active, np.zeros(pad, dtype=bool)])
+        self._version = np.concatenate([self._version, np.zeros(pad, dtype=np.int64)])
+
+    def _write_slot(self, slot: int, row: VehicleState) -> None:
+        self._ids[slot] = row.id
+        self._lat[slot] = row.current_lat if row.current_lat is not None else np.nan
+        self._lng[slot] = row.current_lng if row.current_lng is not None else np.nan
+        self._bearing[slot] = row.bearing or 0.0
+        self._speed[slot] = row.speed or 0.0
+        self._type[slot] = TYPE_CODES.get(row.vehicle_type, UNKNOWN_TYPE_CODE)
+        self._active[slot] = bool(row.is_active)
+        self._version[slot] = row.change_version or 0
+        previous = self._rows[slot]
+        if previous is None:
+            self._deleted -= 1
+        self.counters.replace(previous, row)
+        self._rows[slot] = row
+
+    def upsert(self, rows: Iterable) -> int:
+        """Insert or replace rows (tuples in ``VehicleState`` field order)."""
+        rows = [row if isinstance(row, VehicleState) else VehicleState(*row) for row in rows]
+        if not rows:
+            return 0
+        with self._lock:
+            self._grow(self._size + len(rows))
+            for row in rows:
+                slot = self._index.get(row.id)
+                if slot is None:
+                    slot = self._size
+                    self._size += 1
+                    self._index[row.id] = slot
+                    self._rows.append(None)
+                    self._deleted += 1
+                self._write_slot(slot, row)
+                self._watermark = max(self._watermark or 0, row.change_version or 0)
+            self._generation += 1
+            self._changed.notify_all()
+        return len(rows)
+
+    def remove(self, tombstones: Iterable[Tuple[int, int]]) -> int:
+        """Apply ``(vehicle_id, change_version)`` deletions.
+
+        The slot is kept, inactive and stamped with the deletion version, so
+        delta queries can still report the removal.
+        """
+        tombstones = list(tombstones)
+        if not tombstones:
+            return 0
+        with self._lock:
+            self._grow(self._size + len(tombstones))
+            for vehicle_id, version in tombstones:
+                self._watermark = max(self._watermark or 0, version)
+                slot = self._index.get(vehicle_id)
+                if slot is None:
+                    slot = self._size
+                    self._size += 1
+                    self._index[vehicle_id] = slot
+                    self._rows.append(None)
+                    self._ids[slot] = vehicle_id
+                elif self._version[slot] > version or self._rows[slot] is None:
+                    continue  # re-inserted after the delete, or already removed
+                else:
+                    self.counters.replace(self._rows[slot], None)
+                    self._rows[slot] = None
+                self._deleted += 1
+                self._active[slot] = False
+                self._version[slot] = version
+            self._generation += 1
+            self._changed.notify_all()
+        return len(tombstones)
+
+    def load(self, rows: Iterable, tombstones: Iterable[Tuple[int, int]] = ()) -> int:
+        """Replace the whole store with ``rows`` and known deletions."""
+        rows = list(rows)
+        with self._lock:
+            self._allocate(max(len(rows), 16))
+            self._watermark = None
+            self._generation += 1
+            applied = self.upsert(rows)
+            self.remove(tombstones)
+            if self._watermark is None:
+                self._watermark = 0
+            return applied
+
+    def overlay_positions(self, positions: Iterable) -> int:
+        """Apply positions not yet in the database to known vehicles.
+
+        ``positions`` carry ``vehicle_id, lat, lng, bearing, speed, ts`` (see
+        ``PositionUpdate``); ones older than the row's ``last_seen`` are
+        ignored. Change versions are untouched, so delta cursors pick the
+        move up once it is flushed and stamped.
+        """
+        applied = 0
+        with self._lock:
+            for position in positions:
+                slot = self._index.get(position.vehicle_id)
+                row = self._rows[slot] if slot is not None else None
+                if row is None or (row.last_seen is not None and row.last_seen >= position.ts):
+                    continue
+                self._write_slot(slot, row._replace(
+                    current_lat=position.lat,
+                    current_lng=position.lng,
+                    bearing=row.bearing if position.bearing is None else position.bearing,
+                    speed=row.speed if position.speed is None else position.speed,
+                    last_seen=position.ts,
+                ))
+                applied += 1
+            if applied:
+                self._generation += 1
+                self._changed.notify_all()
+        return applied
+
+    def add_overlay(self, source: Callable[[], Iterable]) -> None:
+        """Re-apply ``source()`` positions whenever a refresh replaces rows."""
+        if source not in self._overlays:
+            self._overlays.append(source)
+
+    def __len__(self) -> int:
+        return self._size - self._deleted
+
+    @property
+    def version(self) -> int:
+        """The position a delta cursor points at: every version up to it has been applied.
+
+        This is the highest version applied, capped at the commit horizon of
+        the last refresh. Rows above it may already be applied; a cursor
+        client then receives them again, which is harmless for upserts.
+        """
+        watermark = self._watermark or 0
+        return watermark if self._horizon is None else min(watermark, self._horizon)
+
+    @property
+    def generation(self) -> int:
+        """Bumped on every write; equal generations mean identical contents."""
+        return self._generation
+
+    def get(self, vehicle_id: int) -> Optional[VehicleState]:
+        with self._lock:
+            slot = self._index.get(vehicle_id)
+            return self._rows[slot] if slot is not None else None
+
+    # ------------------------------------------------------------------
+    # Change notification
+    # ------------------------------------------------------------------
+    @property
+    def change_token(self) -> Tuple[int, int]:
+        """Opaque token that changes whenever the store or a local write changes."""
+        return (self._generation, self._local_writes)
+
+    def notify_write(self) -> None:
+        """A vehicle write was committed in this process: refresh on next call and wake waiters."""
+        with self._lock:
+            self._last_refresh = 0.0
+            self._local_writes += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, token: Tuple[int, int], timeout: float) -> bool:
+        """Block until ``change_token`` differs from ``token`` or ``timeout`` passes."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.change_token != token, timeout)
+
+    # ------------------------------------------------------------------
+    # Refresh from the database
+    # ------------------------------------------------------------------
+    def refresh(self, session=None, force: bool = False) -> int:
+        """Pull rows changed since the last refresh; returns the number applied.
+
+        Calls inside ``refresh_interval`` are no-ops, and concurrent callers
+        skip rather than queue behind a refresh that is already running.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return 0
+        if not self._refresh_lock.acquire(blocking=force):
+            return 0
+        try:
+            session = session or db.session
+            full = self._watermark is None or now - self._last_full_reload >= self.full_reload_interval
+            # Read before the rows: every version up to the horizon is committed, so visible below.
+            # Each scan starts from the previous horizon, re-reading versions that may
+            # still have had a lower one in flight.
+            horizon = self.commit_horizon.advance(session)
+            query = session.query(*STATE_COLUMNS)
+            tombstones = session.query(VehicleTombstone.id, VehicleTombstone.change_version)
+            if full:
+                applied = self.load(query.all(), tombstones.all())
+                self._last_full_reload = now
+            else:
+                since = self.version
+                applied = self.upsert(self._unapplied(query.filter(Vehicle.change_version > since)))
+                applied += self.remove(self._unapplied(
+                    tombstones.filter(VehicleTombstone.change_version > since)
+                ))
+            self._horizon = horizon
+            if applied:
+                for source in self._overlays:
+                    self.overlay_positions(source())
+            self._last_refresh = now
+            return applied
+        finally:
+            self._refresh_lock.release()
+
+    def _unapplied(self, rows: Iterable) -> List:
+        """Rows (vehicle id first, change version last) not already in the store at that version."""
+        unapplied = []
+        with self._lock:
+            for row in rows:
+                slot = self._index.get(row[0])
+                if slot is None or self._version[slot] != row[-1]:
+                    unapplied.append(row)
+        return unapplied
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def _area_slots(self, lat: float, lng: float, radius_km: float, vehicle_type: Optional[str],
+                    active_only: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Slots within ``radius_km`` and their distances, unsorted (caller holds the lock)."""
+        n = self._size
+        lats = self._lat[:n]
+        lngs = self._lng[:n]
+
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        mask = (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        if active_only:
+            mask &= self._active[:n]
+        if vehicle_type:
+            mask &= self._type[:n] == TYPE_CODES.get(vehicle_type, UNKNOWN_TYPE_CODE)
+
+        slots = np.flatnonzero(mask)
+        distances = haversine_km_array(lat, lng, lats[slots], lngs[slots])
+        keep = distances <= radius_km
+        return slots[keep], distances[keep]
+
+    def nearby(self, lat: float, lng: float, radius_km: float, vehicle_type: Optional[str] = None,
+               active_only: bool = True, limit: Optional[int] = None) -> List[Tuple[VehicleState, float]]:
+        """Vehicles within ``radius_km`` of a point, nearest first, as ``(state, distance_km)``."""
+        with self._lock:
+            slots, distances = self._area_slots(lat, lng, radius_km, vehicle_type, active_only)
+            order = np.argsort(distances, kind="stable")
+            if limit is not None:
+                order = order[:limit]
+            rows = self._rows
+            return [(rows[slots[i]], float(distances[i])) for i in order]
+
+    def area(self, lat: float, lng: float, radius_km: float, vehicle_type: Optional[str] = None
+             ) -> Tuple[List[VehicleState], np.ndarray, np.ndarray]:
+        """Active vehicles within ``radius_km`` as ``(rows, lats, lngs)``, in no particular order."""
+        with self._lock:
+            slots, _ = self._area_slots(lat, lng, radius_km, vehicle_type, True)
+            rows = self._rows
+            return [rows[slot] for slot in slots], self._lat[slots], self._lng[slots]
+
+    def in_bounds(self, min_lat: float, max_lat: float, min_lng: float, max_lng: float,
+                  vehicle_type: Optional[str] = None) -> Tuple[List[VehicleState], str]:
+        """Active vehicles in the tile-style box ``(min_lat, max_lat] x [min_lng, max_lng)``, by id, with a state digest.
+
+        The digest changes whenever a vehicle in the box moves, changes or
+        leaves it, or another one enters, including write-behind moves that
+        carry no new change version.
+        """
+        with self._lock:
+            n = self._size
+            lats = self._lat[:n]
+            lngs = self._lng[:n]
+            mask = (lats > min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs < max_lng) & self._active[:n]
+            if vehicle_type:
+                mask &= self._type[:n] == TYPE_CODES.get(vehicle_type, UNKNOWN_TYPE_CODE)
+            slots = np.flatnonzero(mask)
+            slots = slots[np.argsort(self._ids[slots], kind="stable")]
+            digest = hashlib.blake2b(digest_size=12)
+            for column in (self._ids, self._version, self._lat, self._lng, self._bearing, self._speed):
+                digest.update(column[slots].tobytes())
+            rows = self._rows
+            return [rows[slot] for slot in slots], digest.hexdigest()
+
+    def changes_since(self, version: int, lat: float, lng: float, radius_km: float,
+                      vehicle_type: Optional[str] = None, halo_km: float = REMOVAL_HALO_KM
+                      ) -> Tuple[List[Tuple[VehicleState, float]], List[int], int]:
+        """Delta of one area since ``version``: ``(upserts, removed_ids, current_version)``.
+
+        Upserts are vehicles changed after ``version`` that are now in the
+        area, nearest first. Removals are vehicles changed after ``version``
+        that are now outside it, inactive or deleted. Only vehicles within
+        ``halo_km`` of the area count as removals, so fleet-wide movement
+        does not flood every client.
+        """
+        with self._lock:
+            n = self._size
+            slots = np.flatnonzero(self._version[:n] > version)
+            distances = haversine_km_array(lat, lng, self._lat[slots], self._lng[slots])
+            in_area = self._active[slots] & (distances <= radius_km)
+            if vehicle_type:
+                in_area &= self._type[slots] == TYPE_CODES.get(vehicle_type, UNKNOWN_TYPE_CODE)
+            # NaN distances (no position) compare False, so they stay candidates
+            removed = ~in_area & ~(distances > radius_km + halo_km)
+
+            order = np.argsort(distances[in_area], kind="stable")
+            upsert_slots = slots[in_area][order]
+            upsert_distances = distances[in_area][order]
+            rows = self._rows
+            upserts = [(rows[slot], float(distance)) for slot, distance in zip(upsert_slots, upsert_distances)]
+            return upserts, self._ids[slots[removed]].tolist(), self.version
+
+    def grid_index(self, cell_km: float = 1.0) -> IndexedFleet:
+        """Grid index over active vehicles with a position, rebuilt only after changes."""
+        with self._lock:
+            key = (self._generation, cell_km)
+            if self._grid_cache is not None and self._grid_cache[0] == key:
+                return self._grid_cache[1]
+            n = self._size
+            slots = np.flatnonzero(self._active[:n] & ~np.isnan(self._lat[:n]))
+            fleet = IndexedFleet(
+                index=GridIndex(self._lat[slots], self._lng[slots], cell_km=cell_km),
+                rows=[self._rows[slot] for slot in slots],
+            )
+            self._grid_cache = (key, fleet)
+            return fleet
+
+    def cluster_pyramid(self) -> ClusterPyramid:
+        """Cluster pyramid over active vehicles with a position, rebuilt only after changes."""
+        with self._lock:
+            if self._pyramid_cache is not None and self._pyramid_cache[0] == self._generation:
+                return self._pyramid_cache[1]
+            n = self._size
+            slots = np.flatnonzero(self._active[:n] & ~np.isnan(self._lat[:n]))
+            pyramid = ClusterPyramid(self._lat[slots], self._lng[slots], self._type[slots], VEHICLE_TYPES)
+            self._pyramid_cache = (self._generation, pyramid)
+            return pyramid
+
+
+def _flag_vehicle_flush(session, flush_context) -> None:
+    if any(isinstance(obj, Vehicle) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["vehicle_writes"] = True
+
+
+def _flag_vehicle_statement(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    # Core statements against the table (bulk ingest) carry no mappers
+    if getattr(orm_execute_state.statement, "table", None) is Vehicle.__table__ or any(
+        mapper.class_ is Vehicle for mapper in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info["vehicle_writes"] = True
+
+
+def _notify_vehicle_commit(session) -> None:
+    if session.info.pop("vehicle_writes", False):
+        vehicle_store.notify_write()
+
+
+def _clear_vehicle_flag(session) -> None:
+    session.info.pop("vehicle_writes", None)
+
+
+def encode_cursor(version: int) -> str:
+    """Opaque delta cursor for a store version."""
+    return base64.urlsafe_b64encode(f"{_CURSOR_PREFIX}{int(version)}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Store version encoded in ``cursor``; raises ``ValueError`` if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not raw.startswith(_CURSOR_PREFIX) or not raw[len(_CURSOR_PREFIX):].isdigit():
+        raise ValueError("Invalid cursor")
+    return int(raw[len(_CURSOR_PREFIX):])
+
+
+vehicle_store = VehicleStateStore()
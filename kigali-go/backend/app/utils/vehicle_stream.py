@@ -0,0 +1,63 @@
+"""Per-client area subscriptions for the live vehicle stream.
+
+A subscription remembers which vehicle states it last sent for one
+center/radius/type area. Each poll against the vehicle store yields only
+the vehicles that changed or entered the area (upserts) and the ids that
+left it or were deactivated (removals). Polls are skipped entirely while
+the store generation is unchanged.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.serializers import dumps
+from app.utils.vehicle_store import VehicleState, VehicleStateStore
+
+
+class AreaChanges(NamedTuple):
+    """Delta between two polls of one subscription."""
+
+    upserts: List[Tuple[VehicleState, float]]
+    removed: List[int]
+
+    def __bool__(self) -> bool:
+        return bool(self.upserts or self.removed)
+
+
+class AreaSubscription:
+    """Tracks what one client has been sent for a center/radius/type area."""
+
+    def __init__(self, lat: float, lng: float, radius_km: float, vehicle_type: Optional[str] = None):
+        self.lat = lat
+        self.lng = lng
+        self.radius_km = radius_km
+        self.vehicle_type = vehicle_type
+        self._sent: Dict[int, VehicleState] = {}
+        self._generation: Optional[int] = None
+
+    def _matches(self, store: VehicleStateStore) -> List[Tuple[VehicleState, float]]:
+        self._generation = store.generation
+        return store.nearby(self.lat, self.lng, self.radius_km, vehicle_type=self.vehicle_type)
+
+    def snapshot(self, store: VehicleStateStore) -> List[Tuple[VehicleState, float]]:
+        """Everything currently in the area; resets what the client is assumed to hold."""
+        matches = self._matches(store)
+        self._sent = {state.id: state for state, _ in matches}
+        return matches
+
+    def poll(self, store: VehicleStateStore) -> AreaChanges:
+        """Vehicles that moved, changed or entered, and ids that left, since the last call."""
+        if store.generation == self._generation:
+            return AreaChanges([], [])
+        matches = self._matches(store)
+        current = {state.id: state for state, _ in matches}
+        upserts = [(state, distance) for state, distance in matches if self._sent.get(state.id) != state]
+        removed = [vehicle_id for vehicle_id in self._sent if vehicle_id not in current]
+        self._sent = current
+        return AreaChanges(upserts, removed)
+
+
+def sse_event(event: str, payload, event_id: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message with a JSON body."""
+    message = f"event: {event}\ndata: {dumps(payload).decode('utf-8')}\n\n"
+    return f"id: {event_id}\n{message}" if event_id else message
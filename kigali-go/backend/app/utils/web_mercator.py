@@ -0,0 +1,50 @@
+"""Web-mercator ("slippy map") tile maths.
+
+Tiles follow the XYZ scheme used by Google Maps, Leaflet and OSM. Zoom
+``z`` splits the world into ``2**z`` by ``2**z`` tiles, with ``x`` growing
+eastwards from the antimeridian and ``y`` growing southwards from about
+85.05 degrees north. A tile covers ``[x, x + 1)`` and ``[y, y + 1)`` in
+tile space, which is ``[min_lng, max_lng)`` and ``(min_lat, max_lat]``.
+A point on a shared edge therefore belongs to exactly one tile.
+"""
+from __future__ import annotations
+
+import math
+from typing import Tuple
+
+MAX_ZOOM = 22
+MAX_LATITUDE = 85.0511287798
+
+
+def validate_tile(z: int, x: int, y: int) -> None:
+    """Raise ``ValueError`` unless ``z/x/y`` names an existing tile."""
+    if not 0 <= z <= MAX_ZOOM:
+        raise ValueError(f"Zoom must be between 0 and {MAX_ZOOM}")
+    size = 1 << z
+    if not (0 <= x < size and 0 <= y < size):
+        raise ValueError(f"Tile x and y must be between 0 and {size - 1} at zoom {z}")
+
+
+def tile_lng(x: float, z: int) -> float:
+    """Longitude of the west edge of tile column ``x`` (fractions allowed)."""
+    return x / (1 << z) * 360.0 - 180.0
+
+
+def tile_lat(y: float, z: int) -> float:
+    """Latitude of the north edge of tile row ``y`` (fractions allowed)."""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / (1 << z)))))
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """``(min_lat, max_lat, min_lng, max_lng)`` of a tile."""
+    return tile_lat(y + 1, z), tile_lat(y, z), tile_lng(x, z), tile_lng(x + 1, z)
+
+
+def tile_for(lat: float, lng: float, z: int) -> Tuple[int, int]:
+    """``(x, y)`` of the tile holding a point at zoom ``z``."""
+    size = 1 << z
+    lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+    x = int((lng + 180.0) / 360.0 * size)
+    phi = math.radians(lat)
+    y = int((1 - math.log(math.tan(phi) + 1 / math.cos(phi)) / math.pi) / 2 * size)
+    return min(max(x, 0), size - 1), min(max(y, 0), size - 1)
@@ -0,0 +1,173 @@
+"""Compact binary encoding of realtime vehicle lists.
+
+Clients that send ``Accept: application/vnd.kigali.vehicles`` get a
+fixed-layout little-endian payload instead of JSON. JSON stays the
+default. A vehicle is one 29-byte record with:
+
+* coordinates quantized to 1e-5 degrees (about 1.1 m);
+* the vehicle type as an enum code;
+* the bearing in 256 steps per turn;
+* the speed, distance, ETA and age as small integers;
+* the registration and route name as indexes into a deduplicated string
+  table at the end of the payload.
+
+Layout::
+
+    header   magic "KGVP", version u8, record size u8, string count u32,
+             vehicle count u32, removed count u32, center lat/lng i32 (1e-5 deg),
+             timestamp u64 (ms since epoch)
+    cursor   u16 length + UTF-8
+    records  RECORD_DTYPE x vehicle count
+    removed  u32 vehicle ids x removed count
+    strings  (u8 length + UTF-8) x string count
+
+All-ones integer fields mean "unknown". ``decode_vehicles`` is the reference
+decoder.
+"""
+from __future__ import annotations
+
+import struct
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from flask import Response
+
+from app.utils.speed_profiles import speed_profiles
+from app.utils.vehicle_store import TYPE_CODES, VEHICLE_TYPES
+
+MEDIA_TYPE = "application/vnd.kigali.vehicles"
+MAGIC = b"KGVP"
+VERSION = 2  # 2: u32 string indexes and count, for fleets with more than 65,534 strings
+COORD_SCALE = 1e5
+
+_HEADER = struct.Struct("<4sBBIIIiiQ")
+RECORD_DTYPE = np.dtype([
+    ("id", "<u4"),
+    ("type", "u1"),          # index into VEHICLE_TYPES, 255 unknown
+    ("lat", "<i4"),          # 1e-5 degrees
+    ("lng", "<i4"),
+    ("bearing", "u1"),       # 256 steps per turn
+    ("speed", "u1"),         # km/h, capped at 254
+    ("distance", "<u2"),     # 10 m units
+    ("eta", "<u2"),          # 0.1 minute units
+    ("age", "<u2"),          # seconds since last_seen
+    ("registration", "<u4"),  # string table index
+    ("route", "<u4"),
+])
+_NONE8, _NONE16, _NONE32 = 0xFF, 0xFFFF, 0xFFFFFFFF
+_EPOCH = datetime(1970, 1, 1)
+
+
+def wants_packed(accept_mimetypes) -> bool:
+    """True when the client prefers the packed format over JSON."""
+    return accept_mimetypes.best_match(["application/json", MEDIA_TYPE]) == MEDIA_TYPE
+
+
+def packed_response(body: bytes) -> Response:
+    response = Response(body, mimetype=MEDIA_TYPE)
+    response.vary.add("Accept")
+    return response
+
+
+def encode_vehicles(matches: Sequence[Tuple[object, Optional[float]]], center: Tuple[float, float],
+                    cursor: str = "", removed: Sequence[int] = (),
+                    now: Optional[datetime] = None) -> bytes:
+    """Encode ``(vehicle, distance_km)`` pairs; the ETA is estimated from the distance."""
+    now = now or datetime.utcnow()
+    records = np.zeros(len(matches), dtype=RECORD_DTYPE)
+    strings: Dict[str, int] = {}
+
+    def string_index(value) -> int:
+        if not value:
+            return _NONE32
+        return strings.setdefault(str(value), len(strings))
+
+    if matches:
+        vehicles = [vehicle for vehicle, _ in matches]
+        distances = np.array([np.nan if d is None else d for _, d in matches], dtype=float)
+        types = [vehicle.vehicle_type for vehicle in vehicles]
+
+        def column(name):
+            return np.array([getattr(v, name) for v in vehicles], dtype=float)
+
+        records["id"] = [v.id for v in vehicles]
+        records["type"] = [TYPE_CODES.get(t, _NONE8) for t in types]
+        records["lat"] = np.round(np.nan_to_num(column("current_lat")) * COORD_SCALE)
+        records["lng"] = np.round(np.nan_to_num(column("current_lng")) * COORD_SCALE)
+        records["bearing"] = np.round(np.nan_to_num(column("bearing")) % 360 * 256 / 360).astype(int) % 256
+        records["speed"] = np.round(np.clip(np.nan_to_num(column("speed")), 0, 254))
+        unknown = np.isnan(distances)
+        distances = np.nan_to_num(distances)
+        eta = speed_profiles.eta_array(distances, types, column("current_lat"), column("current_lng")) * 10
+        records["distance"] = np.where(unknown, _NONE16, np.round(np.clip(distances * 100, 0, _NONE16 - 1)))
+        records["eta"] = np.where(unknown, _NONE16, np.round(np.clip(eta, 0, _NONE16 - 1)))
+        records["age"] = [
+            min(max(int((now - v.last_seen).total_seconds()), 0), _NONE16 - 1) if v.last_seen else _NONE16
+            for v in vehicles
+        ]
+        records["registration"] = [string_index(v.registration) for v in vehicles]
+        records["route"] = [string_index(v.route_name) for v in vehicles]
+
+    cursor_bytes = cursor.encode("utf-8")
+    header = _HEADER.pack(
+        MAGIC, VERSION, RECORD_DTYPE.itemsize, len(strings), len(records), len(removed),
+        int(round(center[0] * COORD_SCALE)), int(round(center[1] * COORD_SCALE)),
+        int((now - _EPOCH).total_seconds() * 1000),
+    )
+    table = b"".join(bytes([len(encoded)]) + encoded for encoded in map(_table_string, strings))
+    return b"".join([
+        header, struct.pack("<H", len(cursor_bytes)), cursor_bytes, records.tobytes(),
+        np.asarray(removed, dtype="<u4").tobytes(), table,
+    ])
+
+
+def _table_string(value: str) -> bytes:
+    """UTF-8 cut to 255 bytes on a character boundary."""
+    return value.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8")
+
+
+def decode_vehicles(data: bytes) -> Dict:
+    """Reference decoder; returns plain dicts with values in natural units."""
+    magic, version, record_size, string_count, count, removed_count, lat, lng, timestamp = \
+        _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError("Not a packed vehicle payload")
+    offset = _HEADER.size
+    (cursor_length,) = struct.unpack_from("<H", data, offset)
+    offset += 2
+    cursor = data[offset:offset + cursor_length].decode("utf-8")
+    offset += cursor_length
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=count, offset=offset)
+    offset += count * record_size
+    removed = np.frombuffer(data, dtype="<u4", count=removed_count, offset=offset).tolist()
+    offset += removed_count * 4
+    strings: List[str] = []
+    for _ in range(string_count):
+        length = data[offset]
+        strings.append(data[offset + 1:offset + 1 + length].decode("utf-8"))
+        offset += 1 + length
+
+    def unknown(value, none, scale=1):
+        return None if value == none else value / scale
+
+    vehicles = [{
+        "id": int(r["id"]),
+        "vehicle_type": VEHICLE_TYPES[r["type"]] if r["type"] < len(VEHICLE_TYPES) else None,
+        "lat": int(r["lat"]) / COORD_SCALE,
+        "lng": int(r["lng"]) / COORD_SCALE,
+        "bearing": int(r["bearing"]) * 360 / 256,
+        "speed": int(r["speed"]),
+        "distance_km": unknown(int(r["distance"]), _NONE16, 100),
+        "eta_minutes": unknown(int(r["eta"]), _NONE16, 10),
+        "age_seconds": unknown(int(r["age"]), _NONE16),
+        "registration": None if r["registration"] == _NONE32 else strings[r["registration"]],
+        "route_name": None if r["route"] == _NONE32 else strings[r["route"]],
+    } for r in records]
+    return {
+        "vehicles": vehicles,
+        "removed": removed,
+        "cursor": cursor,
+        "center": {"lat": lat / COORD_SCALE, "lng": lng / COORD_SCALE},
+        "timestamp": _EPOCH + timedelta(milliseconds=timestamp),
+    }
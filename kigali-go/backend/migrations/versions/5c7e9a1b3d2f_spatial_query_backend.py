@@ -0,0 +1,73 @@
+"""spatial query backend: synced geometry, geography indexes, sqlite r*tree
+
+Revision ID: 5c7e9a1b3d2f
+Revises: 0a1b2c3d4e5f
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+from models.spatial import postgis_sync_ddl, rtree_table_name, sqlite_rtree_ddl
+
+# revision identifiers, used by Alembic.
+revision = '5c7e9a1b3d2f'
+down_revision = '0a1b2c3d4e5f'
+branch_labels = None
+depends_on = None
+
+POINT_TABLES = [
+    ('vehicles', 'current_lat', 'current_lng'),
+    ('stops', 'lat', 'lng'),
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        # Pin the SRID so geography casts and <-> compare like with like
+        for table_name, lat_col, lng_col in POINT_TABLES:
+            op.execute(
+                f'ALTER TABLE {table_name} ALTER COLUMN location TYPE geometry(POINT, 4326) '
+                f'USING ST_SetSRID(location, 4326)'
+            )
+            for statement in postgis_sync_ddl(table_name, lat_col, lng_col):
+                op.execute(statement)
+            # Backfill rows written before the trigger existed
+            op.execute(
+                f'UPDATE {table_name} SET location = ST_SetSRID(ST_MakePoint({lng_col}, {lat_col}), 4326) '
+                f'WHERE {lat_col} IS NOT NULL AND {lng_col} IS NOT NULL'
+            )
+        op.execute(
+            'ALTER TABLE zones ALTER COLUMN boundary TYPE geometry(POLYGON, 4326) '
+            'USING ST_SetSRID(boundary, 4326)'
+        )
+
+    elif dialect == 'sqlite':
+        for table_name, lat_col, lng_col in POINT_TABLES:
+            for statement in sqlite_rtree_ddl(table_name, lat_col, lng_col):
+                op.execute(statement)
+            op.execute(
+                f'INSERT OR REPLACE INTO {rtree_table_name(table_name)} '
+                f'SELECT id, {lat_col}, {lat_col}, {lng_col}, {lng_col} FROM {table_name} '
+                f'WHERE {lat_col} IS NOT NULL AND {lng_col} IS NOT NULL'
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('ALTER TABLE zones ALTER COLUMN boundary TYPE geometry(POLYGON) USING boundary')
+        for table_name, _, _ in POINT_TABLES:
+            op.execute(f'DROP INDEX IF EXISTS ix_{table_name}_location_geog')
+            op.execute(f'DROP TRIGGER IF EXISTS trg_{table_name}_sync_location ON {table_name}')
+            op.execute(f'DROP FUNCTION IF EXISTS {table_name}_sync_location()')
+            op.execute(f'ALTER TABLE {table_name} ALTER COLUMN location TYPE geometry(POINT) USING location')
+
+    elif dialect == 'sqlite':
+        for table_name, _, _ in POINT_TABLES:
+            rtree = rtree_table_name(table_name)
+            for suffix in ('insert', 'update', 'delete'):
+                op.execute(f'DROP TRIGGER IF EXISTS {rtree}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {rtree}')
@@ -0,0 +1,62 @@
+"""vehicle change versions and tombstones for delta feeds
+
+Revision ID: 7d2e4f6a8b1c
+Revises: 5c7e9a1b3d2f
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models.versioning import postgres_versioning_ddl, sqlite_versioning_ddl, tombstone_table_name
+
+# revision identifiers, used by Alembic.
+revision = '7d2e4f6a8b1c'
+down_revision = '5c7e9a1b3d2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    op.add_column('vehicles', sa.Column('change_version', sa.BigInteger(), nullable=False, server_default='0'))
+    op.create_index('ix_vehicles_change_version', 'vehicles', ['change_version'], unique=False)
+    op.create_table(
+        tombstone_table_name('vehicles'),
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('change_version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_vehicles_tombstones_change_version', tombstone_table_name('vehicles'), ['change_version'], unique=False
+    )
+
+    if dialect == 'postgresql':
+        for statement in postgres_versioning_ddl('vehicles'):
+            op.execute(statement)
+        # The stamping trigger gives every existing row its own version
+        op.execute('UPDATE vehicles SET change_version = 0')
+    elif dialect == 'sqlite':
+        op.execute('UPDATE vehicles SET change_version = id')
+        for statement in sqlite_versioning_ddl('vehicles'):
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('DROP TRIGGER IF EXISTS trg_vehicles_tombstone ON vehicles')
+        op.execute('DROP FUNCTION IF EXISTS vehicles_record_tombstone()')
+        op.execute('DROP TRIGGER IF EXISTS trg_vehicles_change_version ON vehicles')
+        op.execute('DROP FUNCTION IF EXISTS vehicles_stamp_change_version()')
+        op.execute('DROP SEQUENCE IF EXISTS vehicles_change_version_seq')
+    elif dialect == 'sqlite':
+        for name in ('change_version_insert', 'change_version_update', 'tombstone'):
+            op.execute(f'DROP TRIGGER IF EXISTS vehicles_{name}')
+
+    op.drop_index('ix_vehicles_tombstones_change_version', table_name=tombstone_table_name('vehicles'))
+    op.drop_table(tombstone_table_name('vehicles'))
+    op.drop_index('ix_vehicles_change_version', table_name='vehicles')
+    op.drop_column('vehicles', 'change_version')
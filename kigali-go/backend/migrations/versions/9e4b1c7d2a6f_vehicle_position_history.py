@@ -0,0 +1,49 @@
+"""vehicle position history table, partitioned by day on PostgreSQL
+
+Revision ID: 9e4b1c7d2a6f
+Revises: 7d2e4f6a8b1c
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.vehicle_position import postgres_default_partition_ddl, postgres_partition_ddl
+
+# revision identifiers, used by Alembic.
+revision = '9e4b1c7d2a6f'
+down_revision = '7d2e4f6a8b1c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    op.create_table(
+        'vehicle_positions',
+        sa.Column('vehicle_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('recorded_at', sa.DateTime(), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lng', sa.Float(), nullable=False),
+        sa.Column('bearing', sa.Float(), nullable=True),
+        sa.Column('speed', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('vehicle_id', 'recorded_at'),
+        postgresql_partition_by='RANGE (recorded_at)',
+        sqlite_with_rowid=False,
+    )
+    op.create_index('ix_vehicle_positions_recorded_at', 'vehicle_positions', ['recorded_at'], unique=False)
+
+    if dialect == 'postgresql':
+        op.execute(postgres_default_partition_ddl())
+        today = datetime.utcnow().date()
+        for offset in range(3):
+            op.execute(postgres_partition_ddl(today + timedelta(days=offset)))
+
+
+def downgrade():
+    # Dropping the parent drops every partition with it
+    op.drop_index('ix_vehicle_positions_recorded_at', table_name='vehicle_positions')
+    op.drop_table('vehicle_positions')
@@ -0,0 +1,33 @@
+"""assign the transaction id before stamping vehicle change versions
+
+Revision ID: b8f3c2d9e1a4
+Revises: 9e4b1c7d2a6f
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+from models.versioning import postgres_stamp_function_ddl
+
+# revision identifiers, used by Alembic.
+revision = 'b8f3c2d9e1a4'
+down_revision = '9e4b1c7d2a6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(postgres_stamp_function_ddl('vehicles'))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+        CREATE OR REPLACE FUNCTION vehicles_stamp_change_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_version := nextval('vehicles_change_version_seq');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """)
@@ -7,7 +7,8 @@ from app.extensions import db
 
 # Import all models to ensure they're registered
 from .user import User
-from .vehicle import Vehicle
+from .vehicle import Vehicle, VehicleTombstone
+from .vehicle_position import VehiclePosition
 from .zone import Zone
 from .stop import Stop
 from .trip import Trip
@@ -16,5 +17,5 @@ from .fare_rule import FareRule
 from .saved_location import SavedLocation
 
 __all__ = [
-    'db', 'User', 'Vehicle', 'Zone', 'Stop', 'Trip', 'Report', 'FareRule', 'SavedLocation'
+    'db', 'User', 'Vehicle', 'VehicleTombstone', 'VehiclePosition', 'Zone', 'Stop', 'Trip', 'Report', 'FareRule', 'SavedLocation'
 ]
@@ -0,0 +1,227 @@
+"""
+Spatial DDL and query backend for the point tables (vehicles, stops)
+
+On PostgreSQL a trigger keeps the PostGIS ``location`` column in sync with
+the plain lat/lng columns, so bulk UPDATEs and raw SQL writers never leave
+it stale, and radius/nearest queries run as ``ST_DWithin``/``<->`` against
+GiST indexes. On SQLite an R*Tree virtual table (``<table>_rtree``) mirrors
+the lat/lng columns through triggers and serves as the spatial index.
+Other dialects fall back to a bounding-box filter on the lat/lng columns.
+Every backend reports haversine-compatible distances in km.
+"""
+
+from sqlalchemy import DDL, event, func
+from sqlalchemy.sql import column, table
+
+from app.utils.geo import EARTH_RADIUS_KM, bounding_box, haversine_km_array
+
+# Table name -> (lat column, lng column), filled by register_spatial_ddl
+POINT_COLUMNS = {}
+
+# Mean earth radius used by PostGIS for spherical geography maths
+POSTGIS_SPHERE_RADIUS_KM = 6371.0088
+
+# Search radius cap for nearest() when no max_km is given
+DEFAULT_NEAREST_MAX_KM = 50.0
+
+
+def rtree_table_name(table_name):
+    """Name of the R*Tree virtual table mirroring ``table_name``"""
+    return f'{table_name}_rtree'
+
+
+def postgis_sync_ddl(table_name, lat_col, lng_col):
+    """Trigger that derives ``location`` from lat/lng, plus a geography GiST index"""
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {table_name}_sync_location() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.{lat_col} IS NULL OR NEW.{lng_col} IS NULL THEN
+                NEW.location := NULL;
+            ELSE
+                NEW.location := ST_SetSRID(ST_MakePoint(NEW.{lng_col}, NEW.{lat_col}), 4326);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f'DROP TRIGGER IF EXISTS trg_{table_name}_sync_location ON {table_name}',
+        f"""
+        CREATE TRIGGER trg_{table_name}_sync_location
+        BEFORE INSERT OR UPDATE OF {lat_col}, {lng_col} ON {table_name}
+        FOR EACH ROW EXECUTE PROCEDURE {table_name}_sync_location()
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS ix_{table_name}_location_geog
+        ON {table_name} USING gist (geography(location))
+        """,
+    ]
+
+
+def sqlite_rtree_ddl(table_name, lat_col, lng_col):
+    """R*Tree virtual table and the triggers that keep it in sync"""
+    rtree = rtree_table_name(table_name)
+    located = f'NEW.{lat_col} IS NOT NULL AND NEW.{lng_col} IS NOT NULL'
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {rtree} USING rtree(id, min_lat, max_lat, min_lng, max_lng)',
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table_name}
+        WHEN {located}
+        BEGIN
+            INSERT OR REPLACE INTO {rtree} VALUES
+                (NEW.id, NEW.{lat_col}, NEW.{lat_col}, NEW.{lng_col}, NEW.{lng_col});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {rtree}_update AFTER UPDATE OF {lat_col}, {lng_col} ON {table_name}
+        BEGIN
+            DELETE FROM {rtree} WHERE id = OLD.id;
+            INSERT INTO {rtree}
+                SELECT NEW.id, NEW.{lat_col}, NEW.{lat_col}, NEW.{lng_col}, NEW.{lng_col}
+                WHERE {located};
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table_name}
+        BEGIN
+            DELETE FROM {rtree} WHERE id = OLD.id;
+        END
+        """,
+    ]
+
+
+def register_spatial_ddl(point_table, lat_col, lng_col):
+    """Attach the per-dialect spatial DDL to ``db.create_all()`` for ``point_table``"""
+    POINT_COLUMNS[point_table.name] = (lat_col, lng_col)
+    for statement in postgis_sync_ddl(point_table.name, lat_col, lng_col):
+        event.listen(point_table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    for statement in sqlite_rtree_ddl(point_table.name, lat_col, lng_col):
+        event.listen(point_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def spatial_backend(query):
+    """Backend name for the database behind ``query``: postgis, rtree or bbox"""
+    dialect = query.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return 'postgis'
+    if dialect == 'sqlite':
+        return 'rtree'
+    return 'bbox'
+
+
+def _point_columns(model):
+    lat_col, lng_col = POINT_COLUMNS[model.__tablename__]
+    return getattr(model, lat_col), getattr(model, lng_col)
+
+
+def _postgis_point(lat, lng):
+    return func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326)
+
+
+def _postgis_query(query, model, lat, lng, radius_km):
+    """Add the ST_DWithin filter and a ``distance_km`` column"""
+    # PostGIS measures on a slightly larger sphere; rescale so the radius
+    # and distances agree with haversine_km_array.
+    metres_per_km = 1000.0 * POSTGIS_SPHERE_RADIUS_KM / EARTH_RADIUS_KM
+    point = func.geography(_postgis_point(lat, lng))
+    location = func.geography(model.location)
+    query = query.filter(
+        model.location.isnot(None),
+        func.ST_DWithin(location, point, radius_km * metres_per_km, False)
+    )
+    distance = func.ST_Distance(location, point, False) / metres_per_km
+    return query.add_columns(distance.label('distance_km'))
+
+
+def _result(row, width):
+    """The entity of a single-entity query, else the row's first ``width`` columns as a tuple"""
+    return row[0] if width == 1 else tuple(row[:width])
+
+
+def _bbox_candidates(query, model, lat, lng, radius_km, backend):
+    """Rows inside the bounding box of the radius, with their exact distances"""
+    width = len(query.column_descriptions)
+    lat_attr, lng_attr = _point_columns(model)
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    if backend == 'rtree':
+        rtree = table(
+            rtree_table_name(model.__tablename__),
+            column('id'), column('min_lat'), column('max_lat'), column('min_lng'), column('max_lng')
+        )
+        query = query.join(rtree, rtree.c.id == model.id).filter(
+            rtree.c.max_lat >= min_lat, rtree.c.min_lat <= max_lat,
+            rtree.c.max_lng >= min_lng, rtree.c.min_lng <= max_lng
+        )
+    else:
+        query = query.filter(lat_attr.between(min_lat, max_lat), lng_attr.between(min_lng, max_lng))
+
+    rows = query.add_columns(lat_attr, lng_attr).all()
+    distances = haversine_km_array(lat, lng, [row[-2] for row in rows], [row[-1] for row in rows])
+    return [(_result(row, width), float(distance)) for row, distance in zip(rows, distances) if distance <= radius_km]
+
+
+def within_bounds(query, model, min_lat, max_lat, min_lng, max_lng):
+    """``query`` restricted to points in ``(min_lat, max_lat] x [min_lng, max_lng)`` (not executed)
+
+    The box is closed to the north and west like a web-mercator tile, so
+    adjacent tiles never share a point.
+    """
+    backend = spatial_backend(query)
+    lat_attr, lng_attr = _point_columns(model)
+    if backend == 'postgis':
+        envelope = func.ST_MakeEnvelope(min_lng, min_lat, max_lng, max_lat, 4326)
+        query = query.filter(model.location.op('&&')(envelope))
+    elif backend == 'rtree':
+        rtree = table(
+            rtree_table_name(model.__tablename__),
+            column('id'), column('min_lat'), column('max_lat'), column('min_lng'), column('max_lng')
+        )
+        query = query.join(rtree, rtree.c.id == model.id).filter(
+            rtree.c.max_lat >= min_lat, rtree.c.min_lat <= max_lat,
+            rtree.c.max_lng >= min_lng, rtree.c.min_lng <= max_lng
+        )
+    # R*Tree boxes are stored as 32-bit floats; the exact filter keeps tile edges crisp
+    return query.filter(lat_attr > min_lat, lat_attr <= max_lat, lng_attr >= min_lng, lng_attr < max_lng)
+
+
+def within_radius(query, model, lat, lng, radius_km, limit=None):
+    """Rows of ``query`` within ``radius_km`` of a point.
+
+    ``query`` selects either ``model`` itself or columns of it (and of
+    joined tables). Returns ``[(entity, distance_km)]``, or
+    ``[(column tuple, distance_km)]`` for column queries, nearest first.
+    """
+    backend = spatial_backend(query)
+    if backend == 'postgis':
+        width = len(query.column_descriptions)
+        query = _postgis_query(query, model, lat, lng, radius_km).order_by('distance_km')
+        if limit is not None:
+            query = query.limit(limit)
+        return [(_result(row, width), float(row[-1])) for row in query.all()]
+
+    matches = sorted(_bbox_candidates(query, model, lat, lng, radius_km, backend), key=lambda m: m[1])
+    return matches[:limit] if limit is not None else matches
+
+
+def nearest(query, model, lat, lng, k=1, max_km=None):
+    """The ``k`` rows of ``query`` closest to a point.
+
+    Uses the ``<->`` index operator on PostGIS; elsewhere the search box is
+    doubled until it holds ``k`` rows within its radius (or hits ``max_km``).
+    Returns pairs like ``within_radius``, sorted nearest first.
+    """
+    max_km = DEFAULT_NEAREST_MAX_KM if max_km is None else max_km
+    backend = spatial_backend(query)
+    if backend == 'postgis':
+        width = len(query.column_descriptions)
+        query = _postgis_query(query, model, lat, lng, max_km)
+        query = query.order_by(model.location.op('<->')(_postgis_point(lat, lng))).limit(k)
+        matches = [(_result(row, width), float(row[-1])) for row in query.all()]
+        return sorted(matches, key=lambda m: m[1])
+
+    radius_km = min(1.0, max_km)
+    while True:
+        matches = _bbox_candidates(query, model, lat, lng, radius_km, backend)
+        if len(matches) >= k or radius_km >= max_km:
+            return sorted(matches, key=lambda m: m[1])[:k]
+        radius_km = min(radius_km * 2, max_km)
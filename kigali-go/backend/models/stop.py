@@ -5,6 +5,7 @@ Stop model for KigaliGo application
 from . import db
 from datetime import datetime
 from geoalchemy2 import Geometry
+from .spatial import register_spatial_ddl, within_radius
 
 class Stop(db.Model):
     """Stop model for bus stops and taxi stands"""
@@ -17,7 +18,7 @@ class Stop(db.Model):
     # Location
     lat = db.Column(db.Float, nullable=False)
     lng = db.Column(db.Float, nullable=False)
-    location = db.Column(Geometry('POINT'), nullable=True)
+    location = db.Column(Geometry('POINT', srid=4326), nullable=True)  # Synced from lat/lng by trigger
     
     # Zone relationship
     zone_id = db.Column(db.Integer, db.ForeignKey('zones.id'), nullable=False)
@@ -57,23 +58,19 @@ class Stop(db.Model):
     @classmethod
     def find_nearby_stops(cls, lat, lng, radius_km=1.0, stop_type=None):
         """Find stops within radius of given location"""
-        # Simple distance calculation - in production, use PostGIS spatial queries
-        stops = cls.query.filter(cls.is_active == True).all()
+        query = cls.query.filter(cls.is_active == True)
+        if stop_type is not None:
+            query = query.filter((cls.stop_type == stop_type) | (cls.stop_type == 'combined'))
         
         nearby_stops = []
-        for stop in stops:
-            # Calculate distance using Haversine formula (simplified)
-            distance = ((lat - stop.lat) ** 2 + (lng - stop.lng) ** 2) ** 0.5 * 111  # Rough km conversion
-            
-            if distance <= radius_km:
-                if stop_type is None or stop.stop_type == stop_type or stop.stop_type == 'combined':
-                    stop_dict = stop.to_dict()
-                    stop_dict['distance_km'] = round(distance, 2)
-                    nearby_stops.append(stop_dict)
-        
-        # Sort by distance
-        nearby_stops.sort(key=lambda x: x['distance_km'])
+        for stop, distance in within_radius(query, cls, lat, lng, radius_km):
+            stop_dict = stop.to_dict()
+            stop_dict['distance_km'] = round(distance, 2)
+            nearby_stops.append(stop_dict)
         return nearby_stops
     
     def __repr__(self):
         return f'<Stop {self.name} ({self.code})>'
+
+
+register_spatial_ddl(Stop.__table__, 'lat', 'lng')
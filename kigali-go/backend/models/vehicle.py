@@ -6,6 +6,8 @@ from . import db
 from datetime import datetime
 from geoalchemy2 import Geometry
 from sqlalchemy import func, CheckConstraint
+from .spatial import register_spatial_ddl
+from .versioning import register_versioning_ddl
 
 class Vehicle(db.Model):
     """Vehicle model for buses, taxis, and motorcycles"""
@@ -14,6 +16,7 @@ class Vehicle(db.Model):
         db.Index('ix_vehicles_active', 'is_active'),
         db.Index('ix_vehicles_vehicle_type', 'vehicle_type'),
         db.Index('ix_vehicles_lat_lng', 'current_lat', 'current_lng'),
+        db.Index('ix_vehicles_change_version', 'change_version'),
         CheckConstraint('bearing >= 0 AND bearing < 360', name='ck_vehicles_bearing_range'),
     )
     
@@ -29,7 +32,7 @@ class Vehicle(db.Model):
     # Location data
     current_lat = db.Column(db.Float, nullable=True)
     current_lng = db.Column(db.Float, nullable=True)
-    location = db.Column(Geometry('POINT'), nullable=True)
+    location = db.Column(Geometry('POINT', srid=4326), nullable=True)  # Synced from lat/lng by trigger
     bearing = db.Column(db.Float, nullable=True)  # Direction in degrees
     speed = db.Column(db.Float, nullable=True)  # km/h
     
@@ -45,6 +48,8 @@ class Vehicle(db.Model):
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Stamped by the database on every write; drives delta feeds and store refreshes
+    change_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     
     # Relationships
     trips = db.relationship('Trip', backref='vehicle', lazy=True)
@@ -65,12 +70,7 @@ class Vehicle(db.Model):
                 self.bearing = None
         self.speed = speed
         self.last_seen = datetime.utcnow()
-        
-        # Update PostGIS geometry if available
-        if hasattr(db, 'func'):
-            self.location = db.func.ST_SetSRID(
-                db.func.ST_MakePoint(lng, lat), 4326
-            )
+        # location is derived from current_lat/current_lng by the database
     
     def to_dict(self):
         """Convert to dictionary for API responses"""
@@ -96,3 +96,15 @@ class Vehicle(db.Model):
     
     def __repr__(self):
         return f'<Vehicle {self.registration} ({self.vehicle_type})>'
+
+
+class VehicleTombstone(db.Model):
+    """Ids of deleted vehicles, stamped from the same change-version sequence"""
+    __tablename__ = 'vehicles_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    change_version = db.Column(db.BigInteger, nullable=False, index=True)
+
+
+register_spatial_ddl(Vehicle.__table__, 'current_lat', 'current_lng')
+register_versioning_ddl(Vehicle.__table__)
@@ -0,0 +1,83 @@
+"""
+Append-only vehicle position history
+
+One row per accepted GPS fix, keyed by (vehicle_id, recorded_at). On
+PostgreSQL the table is range-partitioned by day on ``recorded_at``, so
+retention drops whole partitions and a trajectory query touches only the
+days it spans. A DEFAULT partition catches rows for days that have no
+partition yet. On SQLite the table is WITHOUT ROWID, which stores each
+vehicle's fixes contiguously in key order.
+"""
+
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import DDL, event
+
+from . import db
+
+
+class VehiclePosition(db.Model):
+    """One historical GPS fix of a vehicle"""
+    __tablename__ = 'vehicle_positions'
+    __table_args__ = (
+        db.Index('ix_vehicle_positions_recorded_at', 'recorded_at'),
+        {'postgresql_partition_by': 'RANGE (recorded_at)', 'sqlite_with_rowid': False},
+    )
+
+    # No foreign key: history outlives deleted vehicles until retention drops it
+    vehicle_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    recorded_at = db.Column(db.DateTime, primary_key=True)
+    lat = db.Column(db.Float, nullable=False)
+    lng = db.Column(db.Float, nullable=False)
+    bearing = db.Column(db.Float, nullable=True)
+    speed = db.Column(db.Float, nullable=True)  # km/h
+
+    def to_dict(self):
+        """Convert to dictionary for API responses"""
+        return {
+            'vehicle_id': self.vehicle_id,
+            'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None,
+            'lat': self.lat,
+            'lng': self.lng,
+            'bearing': self.bearing,
+            'speed': self.speed,
+        }
+
+    def __repr__(self):
+        return f'<VehiclePosition {self.vehicle_id}@{self.recorded_at}>'
+
+
+def partition_name(day, table_name='vehicle_positions'):
+    """Name of the daily partition holding ``day``"""
+    return f'{table_name}_p{day:%Y%m%d}'
+
+
+def postgres_partition_ddl(day, table_name='vehicle_positions'):
+    """CREATE statement for the partition covering ``day`` (a date)"""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    return (
+        f'CREATE TABLE IF NOT EXISTS {partition_name(day, table_name)} PARTITION OF {table_name} '
+        f"FOR VALUES FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')"
+    )
+
+
+def postgres_default_partition_ddl(table_name='vehicle_positions'):
+    return f'CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT'
+
+
+def partition_day(name, table_name='vehicle_positions'):
+    """Inverse of ``partition_name``; None for the default or foreign tables"""
+    prefix = f'{table_name}_p'
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+event.listen(
+    VehiclePosition.__table__, 'after_create',
+    DDL(postgres_default_partition_ddl()).execute_if(dialect='postgresql')
+)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Change-version DDL for tables served as delta feeds (vehicles)
+
+Every insert or update stamps the row's ``change_version`` with a value
+that is larger than any stamped before, and every delete records a
+``<table>_tombstones`` row stamped the same way. On PostgreSQL the value
+comes from a sequence and on SQLite from MAX() + 1 over both tables.
+Because the database assigns the versions, a cursor issued by one worker
+stays meaningful to every other worker.
+
+A PostgreSQL sequence value is taken when the statement runs but becomes
+visible at commit, so a reader can see version 102 before 101. Readers
+therefore only hand out cursors up to ``CommitHorizon``, below which every
+stamping transaction has ended. SQLite serializes writers, so its versions
+commit in order.
+"""
+
+from collections import deque
+
+from sqlalchemy import DDL, event, text
+
+
+def tombstone_table_name(table_name):
+    """Name of the table recording deleted ids of ``table_name``"""
+    return f'{table_name}_tombstones'
+
+
+def postgres_stamp_function_ddl(table_name):
+    """Trigger function stamping ``change_version`` from the table's sequence
+
+    The transaction id is assigned before the sequence is read, so any
+    holder of a version is visible in snapshots taken after it (see
+    ``CommitHorizon``).
+    """
+    return f"""
+        CREATE OR REPLACE FUNCTION {table_name}_stamp_change_version() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_current_xact_id();
+            NEW.change_version := nextval('{table_name}_change_version_seq');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+
+
+def postgres_versioning_ddl(table_name):
+    """Sequence, a BEFORE INSERT/UPDATE stamping trigger and a tombstone trigger"""
+    tombstones = tombstone_table_name(table_name)
+    return [
+        f'CREATE SEQUENCE IF NOT EXISTS {table_name}_change_version_seq',
+        postgres_stamp_function_ddl(table_name),
+        f'DROP TRIGGER IF EXISTS trg_{table_name}_change_version ON {table_name}',
+        f"""
+        CREATE TRIGGER trg_{table_name}_change_version
+        BEFORE INSERT OR UPDATE ON {table_name}
+        FOR EACH ROW EXECUTE PROCEDURE {table_name}_stamp_change_version()
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION {table_name}_record_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO {tombstones} (id, change_version)
+            VALUES (OLD.id, nextval('{table_name}_change_version_seq'))
+            ON CONFLICT (id) DO UPDATE SET change_version = EXCLUDED.change_version;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f'DROP TRIGGER IF EXISTS trg_{table_name}_tombstone ON {table_name}',
+        f"""
+        CREATE TRIGGER trg_{table_name}_tombstone
+        AFTER DELETE ON {table_name}
+        FOR EACH ROW EXECUTE PROCEDURE {table_name}_record_tombstone()
+        """,
+    ]
+
+
+def sqlite_versioning_ddl(table_name):
+    """AFTER INSERT/UPDATE/DELETE triggers; both MAX() lookups are index-backed"""
+    tombstones = tombstone_table_name(table_name)
+    next_version = (
+        f'(SELECT MAX(v) + 1 FROM ('
+        f'SELECT IFNULL(MAX(change_version), 0) AS v FROM {table_name} '
+        f'UNION ALL SELECT IFNULL(MAX(change_version), 0) FROM {tombstones}))'
+    )
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_change_version_insert AFTER INSERT ON {table_name}
+        BEGIN
+            UPDATE {table_name} SET change_version = {next_version} WHERE id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_change_version_update AFTER UPDATE ON {table_name}
+        WHEN NEW.change_version IS OLD.change_version
+        BEGIN
+            UPDATE {table_name} SET change_version = {next_version} WHERE id = NEW.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table_name}_tombstone AFTER DELETE ON {table_name}
+        BEGIN
+            INSERT OR REPLACE INTO {tombstones} (id, change_version) VALUES (OLD.id, {next_version});
+        END
+        """,
+    ]
+
+
+def register_versioning_ddl(versioned_table):
+    """Attach the per-dialect versioning DDL to ``db.create_all()``"""
+    for statement in postgres_versioning_ddl(versioned_table.name):
+        event.listen(versioned_table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    for statement in sqlite_versioning_ddl(versioned_table.name):
+        event.listen(versioned_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+class CommitHorizon:
+    """Highest change version below which every stamping transaction has ended
+
+    Each ``advance`` reads the sequence and then the snapshot's ``xmax``.
+    Any transaction holding a version up to that reading has an id below
+    ``xmax``. Once the snapshot ``xmin`` reaches it, they have all
+    committed or rolled back and the reading becomes the horizon.
+    """
+
+    def __init__(self, table_name):
+        self.sequence = f'{table_name}_change_version_seq'
+        self.horizon = 0
+        self._pending = deque()  # (sequence reading, snapshot xmax), both ascending
+
+    def advance(self, session):
+        """Current horizon, or None where versions commit in order (not PostgreSQL)"""
+        if session.get_bind().dialect.name != 'postgresql':
+            return None
+        last_value, is_called = session.execute(
+            text(f'SELECT last_value, is_called FROM {self.sequence}')
+        ).one()
+        reading = last_value if is_called else last_value - 1
+        xmin, xmax = session.execute(text(
+            'SELECT pg_snapshot_xmin(s)::text::bigint, pg_snapshot_xmax(s)::text::bigint '
+            'FROM pg_current_snapshot() AS s'
+        )).one()
+        if reading > self.horizon and not (self._pending and self._pending[-1][0] == reading):
+            self._pending.append((reading, xmax))
+        while self._pending and self._pending[0][1] <= xmin:
+            self.horizon = self._pending.popleft()[0]
+        return self.horizon
@@ -5,6 +5,9 @@ Zone model for KigaliGo application
 from . import db
 from datetime import datetime
 from geoalchemy2 import Geometry
+from sqlalchemy import func
+from app.utils.geo import calculate_distance_km
+from .spatial import spatial_backend
 
 class Zone(db.Model):
     """Zone model for Kigali sectors/districts"""
@@ -18,7 +21,7 @@ class Zone(db.Model):
     # Geographic data
     center_lat = db.Column(db.Float, nullable=False)
     center_lng = db.Column(db.Float, nullable=False)
-    boundary = db.Column(Geometry('POLYGON'), nullable=True)
+    boundary = db.Column(Geometry('POLYGON', srid=4326), nullable=True)
     
     # Metadata
     population = db.Column(db.Integer, nullable=True)
@@ -50,11 +53,22 @@ class Zone(db.Model):
     @classmethod
     def find_zone_by_location(cls, lat, lng):
         """Find zone containing given coordinates"""
-        # Simple bounding box search - in production, use PostGIS spatial queries
-        zones = cls.query.filter(
-            cls.center_lat - 0.01 <= lat <= cls.center_lat + 0.01,
-            cls.center_lng - 0.01 <= lng <= cls.center_lng + 0.01,
-            cls.is_active == True
+        query = cls.query.filter(cls.is_active == True)
+        
+        # Zones with a drawn boundary answer exactly on PostGIS
+        if spatial_backend(query) == 'postgis':
+            point = func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326)
+            zone = query.filter(
+                cls.boundary.isnot(None),
+                func.ST_Contains(cls.boundary, point)
+            ).first()
+            if zone:
+                return zone
+        
+        # Otherwise pick the closest zone centre within ~1 km
+        zones = query.filter(
+            cls.center_lat.between(lat - 0.01, lat + 0.01),
+            cls.center_lng.between(lng - 0.01, lng + 0.01)
         ).all()
         
         if zones:
@@ -63,7 +77,7 @@ class Zone(db.Model):
             closest_zone = None
             
             for zone in zones:
-                distance = ((lat - zone.center_lat) ** 2 + (lng - zone.center_lng) ** 2) ** 0.5
+                distance = calculate_distance_km(lat, lng, zone.center_lat, zone.center_lng)
                 if distance < min_distance:
                     min_distance = distance
                     closest_zone = zone
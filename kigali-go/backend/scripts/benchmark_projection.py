@@ -0,0 +1,140 @@
+"""
+Benchmark ORM hydration against column-tuple projections on the read paths
+
+Inserts synthetic vehicles and stops into the configured database inside
+a transaction, then times loading them three ways:
+- full ORM entities (the old path, including geometry and driver columns);
+- the ``VehicleState`` / ``STOP_PROJECTION`` column tuples the endpoints use now;
+- a map-marker projection (id/type/lat/lng/bearing).
+
+Peak Python allocations are measured with tracemalloc. The transaction is
+rolled back at the end, so the database is left untouched.
+
+Usage: python scripts/benchmark_projection.py [--vehicles 10000] [--stops 1000] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.extensions import db
+from app.utils.serializers import STOP_PROJECTION, stop_query
+from app.utils.vehicle_store import STATE_COLUMNS, VehicleState
+from models.stop import Stop
+from models.vehicle import Vehicle
+from models.zone import Zone
+
+KIGALI_BOUNDS = {'min_lat': -1.99, 'max_lat': -1.89, 'min_lng': 30.00, 'max_lng': 30.16}
+VEHICLE_TYPES = ('bus', 'taxi', 'moto')
+
+
+def insert_fixtures(session, vehicles, stops, rng):
+    """Synthetic rows over Kigali; ids are left to the database"""
+    now = datetime.utcnow()
+    session.execute(insert(Vehicle), [{
+        'vehicle_type': VEHICLE_TYPES[i % 3],
+        'registration': f'BENCH{i:06d}',
+        'operator': 'Benchmark',
+        'driver_name': f'Driver {i}',
+        'driver_phone': '0780000000',
+        'capacity': 30,
+        'current_lat': float(rng.uniform(KIGALI_BOUNDS['min_lat'], KIGALI_BOUNDS['max_lat'])),
+        'current_lng': float(rng.uniform(KIGALI_BOUNDS['min_lng'], KIGALI_BOUNDS['max_lng'])),
+        'bearing': float(rng.uniform(0, 360)),
+        'speed': float(rng.uniform(0, 60)),
+        'route_name': 'Benchmark route',
+        'is_active': True,
+        'is_available': True,
+        'last_seen': now,
+    } for i in range(vehicles)])
+
+    zone = Zone(name='Benchmark zone', code='BNZ', center_lat=-1.95, center_lng=30.06)
+    session.add(zone)
+    session.flush()
+    session.execute(insert(Stop), [{
+        'name': f'Benchmark stop {i}',
+        'code': f'BNS{i:05d}',
+        'lat': float(rng.uniform(KIGALI_BOUNDS['min_lat'], KIGALI_BOUNDS['max_lat'])),
+        'lng': float(rng.uniform(KIGALI_BOUNDS['min_lng'], KIGALI_BOUNDS['max_lng'])),
+        'zone_id': zone.id,
+        'stop_type': 'bus',
+        'is_active': True,
+    } for i in range(stops)])
+    session.flush()
+
+
+def measure(session, func, repeat):
+    """Median milliseconds and peak traced KiB of ``func()``; the identity map is emptied per run"""
+    timings = []
+    for _ in range(repeat):
+        session.expunge_all()
+        start = time.perf_counter()
+        count = len(func())
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Traced separately; tracemalloc slows the timed runs down
+    session.expunge_all()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return count, float(np.median(timings)), peak
+
+
+def cases(session):
+    active_vehicles = Vehicle.is_active == True  # noqa: E712
+    return [
+        ('vehicles: ORM entities', lambda: session.query(Vehicle).filter(active_vehicles).all()),
+        ('vehicles: VehicleState tuples', lambda: [
+            VehicleState(*row) for row in session.query(*STATE_COLUMNS).filter(active_vehicles).all()
+        ]),
+        ('vehicles: marker columns', lambda: session.query(
+            Vehicle.id, Vehicle.vehicle_type, Vehicle.current_lat, Vehicle.current_lng, Vehicle.bearing
+        ).filter(active_vehicles).all()),
+        ('stops: ORM to_dict', lambda: [
+            stop.to_dict() for stop in session.query(Stop).filter(Stop.is_active == True).all()  # noqa: E712
+        ]),
+        ('stops: projection dicts', lambda: STOP_PROJECTION.dicts(
+            stop_query(session).filter(Stop.is_active == True)  # noqa: E712
+        )),
+    ]
+
+
+def run(session, vehicles, stops, repeat):
+    insert_fixtures(session, vehicles, stops, np.random.default_rng(7))
+    results = []
+    for name, func in cases(session):
+        count, median_ms, peak_kib = measure(session, func, repeat)
+        results.append((name, count, median_ms, peak_kib))
+        print(f"{name:32s} rows {count:6d}  median {median_ms:8.1f} ms  peak {peak_kib:9.0f} KiB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=10000)
+    parser.add_argument('--stops', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        session = db.session
+        try:
+            run(session, args.vehicles, args.stops, args.repeat)
+        finally:
+            session.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark nearest-vehicle-per-stop lookups used by /realtime/stops/eta
+
+Compares the old per-pair haversine scan with the grid spatial index on
+synthetic data spread over Kigali (default: 500 stops x 5,000 vehicles).
+No database is needed; only the in-memory join is timed.
+
+Usage: python scripts/benchmark_stop_eta.py [--stops 500] [--vehicles 5000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import calculate_distance_km
+from app.utils.spatial_index import GridIndex
+
+KIGALI_BOUNDS = {'min_lat': -1.99, 'max_lat': -1.89, 'min_lng': 30.00, 'max_lng': 30.16}
+MAX_KM = 1.0
+
+
+def random_points(rng, count):
+    lats = rng.uniform(KIGALI_BOUNDS['min_lat'], KIGALI_BOUNDS['max_lat'], count)
+    lngs = rng.uniform(KIGALI_BOUNDS['min_lng'], KIGALI_BOUNDS['max_lng'], count)
+    return lats, lngs
+
+
+def naive_nearest(stop_lats, stop_lngs, vehicle_lats, vehicle_lngs):
+    """The previous implementation: haversine for every stop/vehicle pair"""
+    result = []
+    for s_lat, s_lng in zip(stop_lats, stop_lngs):
+        best, best_distance = -1, float('inf')
+        for i, (v_lat, v_lng) in enumerate(zip(vehicle_lats, vehicle_lngs)):
+            distance = calculate_distance_km(s_lat, s_lng, v_lat, v_lng)
+            if distance < MAX_KM and distance < best_distance:
+                best, best_distance = i, distance
+        result.append(best)
+    return np.array(result)
+
+
+def grid_nearest(stop_lats, stop_lngs, vehicle_lats, vehicle_lngs):
+    """Build the grid and run one batched lookup (build cost included)"""
+    index = GridIndex(vehicle_lats, vehicle_lngs, cell_km=MAX_KM)
+    return index.nearest(stop_lats, stop_lngs, MAX_KM)[0]
+
+
+def time_call(func, *args, repeat=1):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, min(timings), float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stops', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-naive', action='store_true', help='Skip the slow O(stops x vehicles) scan')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    stop_lats, stop_lngs = random_points(rng, args.stops)
+    vehicle_lats, vehicle_lngs = random_points(rng, args.vehicles)
+
+    print(f"{args.stops} stops x {args.vehicles} vehicles, max distance {MAX_KM} km")
+
+    grid_result, grid_min, grid_median = time_call(
+        grid_nearest, stop_lats, stop_lngs, vehicle_lats, vehicle_lngs, repeat=args.repeat
+    )
+    print(f"grid index : min {grid_min:8.2f} ms  median {grid_median:8.2f} ms")
+
+    if not args.skip_naive:
+        naive_result, naive_min, _ = time_call(
+            naive_nearest, stop_lats, stop_lngs, vehicle_lats, vehicle_lngs
+        )
+        print(f"naive scan : {naive_min:8.2f} ms  (speed-up x{naive_min / grid_median:.0f})")
+        if not np.array_equal(naive_result, grid_result):
+            print("WARNING: results differ between implementations")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
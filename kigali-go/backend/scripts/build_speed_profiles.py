@@ -0,0 +1,45 @@
+"""
+Learn the per-zone, per-hour-of-week ETA speed table
+
+Aggregates the last SPEED_PROFILE_WINDOW_DAYS of vehicle_positions into
+speed profiles and writes them to SPEED_PROFILE_PATH. API processes load
+the file instead of aggregating themselves while it is newer than
+SPEED_PROFILE_REFRESH_INTERVAL. Run it from cron (hourly, say) next to
+maintain_position_history.py.
+
+Usage: python scripts/build_speed_profiles.py [--path FILE] [--window-days 14]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.extensions import db
+from app.utils.speed_profiles import speed_profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--path', help='Output file (default: SPEED_PROFILE_PATH)')
+    parser.add_argument('--window-days', type=int, help='History to aggregate (default: SPEED_PROFILE_WINDOW_DAYS)')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.path:
+        speed_profiles.path = args.path
+    if args.window_days:
+        speed_profiles.window_days = args.window_days
+    if not speed_profiles.path:
+        parser.error('Set SPEED_PROFILE_PATH or pass --path')
+    with app.app_context():
+        speed_profiles.rebuild(db.session)
+    print(json.dumps(dict(speed_profiles.stats(), path=speed_profiles.path), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Daily maintenance for the vehicle position history
+
+Creates the next days' partitions (PostgreSQL), thins fixes older than
+POSITION_HISTORY_COMPACT_AFTER_DAYS to one per vehicle per
+POSITION_HISTORY_COMPACT_INTERVAL seconds, and drops fixes past
+POSITION_HISTORY_RETENTION_DAYS. Run it once a day, e.g. from cron.
+
+Usage: python scripts/maintain_position_history.py [--compact-days 1]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.extensions import db
+from app.utils.position_history import maintain_position_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--compact-days', type=int, default=1,
+                        help='How many days before the compaction cutoff to thin (default: 1)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        report = maintain_position_history(
+            db.session,
+            retention_days=app.config['POSITION_HISTORY_RETENTION_DAYS'],
+            compact_after_days=app.config['POSITION_HISTORY_COMPACT_AFTER_DAYS'],
+            compact_interval=app.config['POSITION_HISTORY_COMPACT_INTERVAL'],
+            compact_days=args.compact_days,
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Pre-render the stop and zone vector tiles
+
+Renders every non-empty tile between MVT_MIN_ZOOM and MVT_MAX_ZOOM and
+writes it under MVT_CACHE_DIR, so API processes load the tiles from disk
+at their first request instead of rendering them. Run it after deploys
+and after bulk stop or zone imports.
+
+Usage: python scripts/render_vector_tiles.py [--cache-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.extensions import db
+from app.utils.vector_tiles import vector_tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cache-dir', help='Output directory (default: MVT_CACHE_DIR)')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.cache_dir:
+        vector_tiles.cache_dir = args.cache_dir
+    if not vector_tiles.cache_dir:
+        parser.error('Set MVT_CACHE_DIR or pass --cache-dir')
+    with app.app_context():
+        rendered = vector_tiles.current(db.session, force=True)
+    print(json.dumps({
+        'version': rendered.version,
+        'tiles': len(rendered.tiles),
+        'bytes': sum(len(data) for data in rendered.tiles.values()),
+        'zooms': [vector_tiles.min_zoom, vector_tiles.max_zoom],
+        'cache_dir': vector_tiles.cache_dir,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,66 @@
-import requests
-import time
+"""
+Run the fleet simulator as a sidecar process
+
+Advances the SIM* vehicles (or, with --all-vehicles, every active vehicle)
+each tick and writes the fleet straight to the database in one statement,
+without going through the API. Use this
+instead of /simulation/vehicles/auto-simulate/start when the API runs
+several workers.
+
+Usage: python scripts/run_simulation.py [--interval 2] [--vehicles 50000] [--mode routes] [--all-vehicles]
+"""
+
+import argparse
+import os
 import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.extensions import db
+from app.utils.fleet_simulator import fleet_simulator
 
-API_URL = "http://localhost:5000/api/v1/simulation/vehicles/simulate"
 
 def run_simulation():
-    print(f"Starting simulation loop targeting: {API_URL}")
-    print("Press Ctrl+C to stop")
-    
-    count = 0
-    try:
-        while True:
-            try:
-                response = requests.post(API_URL)
-                if response.status_code == 200:
-                    data = response.json()
-                    print(f"[{count}] Moved {data.get('moved_count', 0)} vehicles")
-                else:
-                    print(f"[{count}] Error: {response.status_code} - {response.text}")
-            except requests.exceptions.ConnectionError:
-                print(f"[{count}] Connection error. Is the backend running?")
-            except Exception as e:
-                print(f"[{count}] Error: {e}")
-            
-            count += 1
-            time.sleep(2) # Run every 2 seconds
-            
-    except KeyboardInterrupt:
-        print("\nSimulation stopped")
+    parser = argparse.ArgumentParser(description='Run the vehicle fleet simulator')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='Seconds between ticks (default: SIMULATION_INTERVAL)')
+    parser.add_argument('--vehicles', type=int, default=None,
+                        help='Spawn simulated vehicles until this many are active')
+    parser.add_argument('--mode', choices=['free', 'routes'], default=None,
+                        help='free: random bearings; routes: buses follow stop sequences, others run stop-to-stop trips')
+    parser.add_argument('--all-vehicles', action='store_true',
+                        help='Also move real vehicles, not only SIM* ones')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.all_vehicles:
+            fleet_simulator.set_simulated_only(False)
+        if args.vehicles:
+            print(f"Spawned {fleet_simulator.spawn(db.session, args.vehicles)} simulated vehicles")
+        fleet_simulator.set_mode(db.session, args.mode or fleet_simulator.mode)
+        interval = args.interval or fleet_simulator.interval
+        print(f"Simulating {fleet_simulator.load(db.session)} vehicles every {interval}s ({fleet_simulator.mode} mode)")
+        print("Press Ctrl+C to stop")
+
+        count = 0
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    result = fleet_simulator.tick(db.session, dt=interval)
+                    print(f"[{count}] Moved {result['moved_count']} vehicles in {result['tick_seconds']:.3f}s")
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[{count}] Error: {e}")
+                count += 1
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("\nSimulation stopped")
+
 
 if __name__ == "__main__":
     run_simulation()
@@ -0,0 +1,61 @@
+"""
+Unit tests for the precomputed stop arrival board
+"""
+
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.arrival_board import build_board
+from app.utils.spatial_index import GridIndex
+from app.utils.vehicle_store import IndexedFleet
+from tests.test_vehicle_store import make_state
+
+STOPS = [
+    {'id': 10, 'name': 'Nyabugogo', 'lat': -1.9441, 'lng': 30.0619, 'stop_type': 'bus'},
+    {'id': 11, 'name': 'Kacyiru', 'lat': -1.9307, 'lng': 30.1182, 'stop_type': 'moto'},
+    {'id': 12, 'name': 'No position', 'lat': None, 'lng': None, 'stop_type': 'bus'},
+]
+
+
+def fleet_of(states):
+    return IndexedFleet(
+        index=GridIndex([s.current_lat for s in states], [s.current_lng for s in states]),
+        rows=list(states),
+    )
+
+
+class TestArrivalBoard(unittest.TestCase):
+    """Soonest approaching vehicles per stop"""
+
+    def test_approaching_vehicles_sorted_by_eta(self):
+        # make_state vehicles head due east at 30 km/h
+        states = [
+            make_state(1, -1.9441, 30.0529),               # 1 km west, heading at the stop
+            make_state(2, -1.9441, 30.0709),               # 1 km east, driving away
+            make_state(3, -1.9441, 30.0574, 'moto'),       # 0.5 km west, faster type
+            make_state(4, -1.9441, 30.0600),               # 0.2 km west
+            make_state(5, -1.9307, 30.1180, 'taxi'),       # at the other stop
+        ]
+        board = build_board(STOPS, fleet_of(states), size=2, radius_km=2.0)
+
+        self.assertEqual(set(board.stops), {10, 11})
+        arrivals = board.stops[10].arrivals
+        self.assertEqual([a['id'] for a in arrivals], [4, 3])
+        self.assertLessEqual(arrivals[0]['eta_minutes'], arrivals[1]['eta_minutes'])
+        self.assertEqual([a['id'] for a in board.stops[11].arrivals], [5])
+
+    def test_near(self):
+        board = build_board(STOPS, fleet_of([]), radius_km=2.0)
+        self.assertEqual(board.stops[10].arrivals, ())
+        near = board.near(-1.9441, 30.0619, 10.0)
+        self.assertEqual([entry.stop['id'] for entry, _ in near], [10, 11])
+        self.assertAlmostEqual(near[0][1], 0.0)
+        self.assertEqual([entry.stop['id'] for entry, _ in board.near(-1.9441, 30.0619, 10.0, 'moto')], [11])
+
+
+if __name__ == '__main__':
+    unittest.main()
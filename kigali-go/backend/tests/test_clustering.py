@@ -0,0 +1,67 @@
+"""
+Unit tests for hierarchical grid clustering
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.clustering import MAX_CLUSTER_ZOOM, ClusterPyramid
+from app.utils.web_mercator import tile_bounds, tile_for
+
+KIGALI = (-2.05, -1.85, 29.95, 30.20)
+
+
+class TestClusterPyramid(unittest.TestCase):
+    """Test cases for cluster counts, centroids and payload bounds"""
+
+    def setUp(self):
+        """20,000 typed points over Kigali"""
+        rng = np.random.default_rng(11)
+        self.lats = rng.uniform(-2.05, -1.85, 20000)
+        self.lngs = rng.uniform(29.95, 30.20, 20000)
+        self.codes = rng.integers(0, 3, 20000)
+        self.pyramid = ClusterPyramid(self.lats, self.lngs, self.codes, ('bus', 'taxi', 'moto'))
+
+    def test_every_level_conserves_points(self):
+        """Each zoom accounts for every point exactly once"""
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            _, clusters = self.pyramid.clusters(zoom, *KIGALI, max_clusters=10 ** 6)
+            self.assertEqual(sum(c['count'] for c in clusters), 20000, zoom)
+
+    def test_centroid_and_type_counts(self):
+        """A cluster's centroid and type counts match the points in its cell"""
+        x, y = tile_for(-1.95, 30.06, 12)
+        min_lat, max_lat, min_lng, max_lng = tile_bounds(12, x, y)
+        inside = (self.lats > min_lat) & (self.lats <= max_lat) & (self.lngs >= min_lng) & (self.lngs < max_lng)
+
+        # At zoom 10 the whole z12 tile is one cell; query a box strictly inside it
+        _, clusters = self.pyramid.clusters(10, min_lat + 1e-9, max_lat, min_lng, max_lng - 1e-9)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['count'], int(inside.sum()))
+        self.assertAlmostEqual(clusters[0]['lat'], float(self.lats[inside].mean()), places=5)
+        self.assertEqual(clusters[0]['by_type']['taxi'], int((self.codes[inside] == 1).sum()))
+
+    def test_type_filter(self):
+        """Filtered clusters count and average only the chosen types"""
+        _, clusters = self.pyramid.clusters(11, *KIGALI, point_types=['moto'])
+        self.assertEqual(sum(c['count'] for c in clusters), int((self.codes == 2).sum()))
+        self.assertTrue(all(set(c['by_type']) == {'moto'} for c in clusters))
+        with self.assertRaises(ValueError):
+            self.pyramid.clusters(11, *KIGALI, point_types=['tram'])
+
+    def test_payload_is_bounded(self):
+        """Views needing too many cells step up to a coarser zoom"""
+        zoom, clusters = self.pyramid.clusters(16, *KIGALI, max_clusters=200)
+        self.assertLessEqual(len(clusters), 200)
+        self.assertLess(zoom, 16)
+        self.assertEqual(sum(c['count'] for c in clusters), 20000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Unit tests for dead-reckoned vehicle positions
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.dead_reckoning import extrapolate, predict_records
+from app.utils.geo import calculate_distance_km
+from app.utils.serializers import realtime_vehicle_records
+from tests.test_vehicle_store import make_state
+
+NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+
+class TestDeadReckoning(unittest.TestCase):
+    """Straight-line extrapolation bounded by fix age"""
+
+    def test_moves_along_bearing(self):
+        """30 km/h due east for 36 s covers 300 m east"""
+        prediction = extrapolate([-1.95], [30.06], [90.0], [30.0], [36.0])
+        self.assertTrue(prediction.predicted[0])
+        self.assertAlmostEqual(prediction.lats[0], -1.95, places=4)
+        self.assertGreater(prediction.lngs[0], 30.06)
+        moved = calculate_distance_km(-1.95, 30.06, prediction.lats[0], prediction.lngs[0])
+        self.assertAlmostEqual(moved, 0.3, places=4)
+
+    def test_bounds(self):
+        """Stale, stationary and unknown-age vehicles keep their reported position"""
+        prediction = extrapolate(
+            [-1.95, -1.95, -1.95, -1.95], [30.06] * 4, [0.0] * 4,
+            [30.0, 30.0, 0.5, 30.0], [10.0, 120.0, 10.0, np.nan],
+            max_age=45.0, horizon=20.0,
+        )
+        self.assertEqual(prediction.predicted.tolist(), [True, False, False, False])
+        np.testing.assert_allclose(prediction.lats[1:], [-1.95] * 3)
+        np.testing.assert_allclose(prediction.valid_for, [20.0, 0.0, 0.0, 0.0])
+        # The horizon shrinks as the fix ages past max_age - horizon
+        self.assertEqual(extrapolate([0], [0], [0], [30], [40.0], max_age=45.0, horizon=20.0).valid_for[0], 5.0)
+
+    def test_predict_records(self):
+        """Realtime records get predicted positions and keep the fix as reported_*"""
+        moving = make_state(1, -1.95, 30.06, updated_at=NOW - timedelta(seconds=12))
+        stale = make_state(2, -1.95, 30.07, updated_at=NOW - timedelta(minutes=5))
+        matches = [(moving, 0.5), (stale, 1.0)]
+        records = predict_records(realtime_vehicle_records(matches), [moving, stale], NOW)
+
+        self.assertTrue(records[0]['predicted'])
+        self.assertEqual(records[0]['reported_lng'], 30.06)
+        self.assertGreater(records[0]['lng'], 30.06)
+        self.assertEqual(records[0]['lng'], records[0]['current_lng'])
+        self.assertEqual(records[0]['position_age_s'], 12.0)
+        self.assertEqual(records[0]['valid_for_s'], 20.0)
+
+        self.assertFalse(records[1]['predicted'])
+        self.assertEqual(records[1]['lng'], 30.07)
+        self.assertEqual(records[1]['valid_for_s'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Unit tests for the Google Directions cache
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.directions_cache import DirectionsCache
+
+NYABUGOGO = (-1.9441, 30.0619)
+KIMIRONKO = (-1.9355, 30.1266)
+ROUTES = [{'summary': 'KN 1 Rd', 'legs': [{'distance': {'value': 7400}, 'duration': {'value': 1320}}]}]
+
+
+class TestDirectionsCache(unittest.TestCase):
+    """Snapped keys, LRU with TTL and the SQLite tier"""
+
+    def test_snapped_keys(self):
+        cache = DirectionsCache(snap_deg=0.001)
+        key = cache.key(*NYABUGOGO, *KIMIRONKO)
+        # About 30 m away snaps to the same cell; 300 m away does not
+        self.assertEqual(cache.key(-1.94420, 30.06195, *KIMIRONKO), key)
+        self.assertNotEqual(cache.key(-1.9470, 30.0619, *KIMIRONKO), key)
+        self.assertNotEqual(cache.key(*KIMIRONKO, *NYABUGOGO), key)
+        self.assertNotEqual(cache.key(*NYABUGOGO, *KIMIRONKO, mode='walking'), key)
+
+    def test_lru_and_ttl(self):
+        cache = DirectionsCache(max_entries=2)
+        for name in ('a', 'b'):
+            cache.put(name, ROUTES)
+        self.assertEqual(cache.get('a'), ROUTES)
+        cache.put('c', ROUTES)
+        # 'b' was least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), ROUTES)
+
+        expired = DirectionsCache(ttl=-1)
+        expired.put('a', ROUTES)
+        self.assertIsNone(expired.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['memory_hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'directions.sqlite')
+            first = DirectionsCache(path=path)
+            key = first.key(*NYABUGOGO, *KIMIRONKO)
+            first.put(key, ROUTES)
+
+            restarted = DirectionsCache(path=path)
+            self.assertEqual(restarted.get(key), ROUTES)
+            self.assertEqual(restarted.get(key), ROUTES)
+            stats = restarted.stats()
+            self.assertEqual((stats['disk_hits'], stats['memory_hits']), (1, 1))
+
+            restarted.clear()
+            reopened = DirectionsCache(path=path)
+            self.assertIsNone(reopened.get(key))
+            for cache in (first, restarted, reopened):
+                cache.close()
+
+    def test_directions_counts_misses_and_fetch_errors(self):
+        cache = DirectionsCache()
+        with mock.patch.dict(os.environ, {'GOOGLE_MAPS_API_KEY': 'test-key'}), \
+                mock.patch('app.utils.directions_cache.fetch_directions', side_effect=[None, ROUTES]) as fetch:
+            self.assertIsNone(cache.directions(*NYABUGOGO, *KIMIRONKO))
+            self.assertEqual(cache.directions(*NYABUGOGO, *KIMIRONKO), ROUTES)
+            self.assertEqual(cache.directions(*NYABUGOGO, *KIMIRONKO), ROUTES)
+        self.assertEqual(fetch.call_count, 2)
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['fetch_errors'], stats['memory_hits']), (2, 1, 1))
+
+    def test_missing_api_key_is_not_a_miss(self):
+        cache = DirectionsCache()
+        env = {k: v for k, v in os.environ.items() if k != 'GOOGLE_MAPS_API_KEY'}
+        with mock.patch.dict(os.environ, env, clear=True), \
+                mock.patch('app.utils.directions_cache.fetch_directions') as fetch:
+            self.assertIsNone(cache.directions(*NYABUGOGO, *KIMIRONKO))
+        fetch.assert_not_called()
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['fetch_errors']), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
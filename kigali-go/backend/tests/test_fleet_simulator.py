@@ -0,0 +1,144 @@
+"""
+Unit tests for the vectorized fleet simulator
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.fleet_simulator import FleetSimulator, KIGALI_BOUNDS
+from app.utils.geo import haversine_km_array
+from app.utils.route_simulation import DWELL_SECONDS, RouteNetwork, densify
+from models.vehicle import Vehicle
+
+STOPS = [
+    ('NYB001', -1.9441, 30.0619),
+    ('CC001', -1.9500, 30.0580),
+    ('KAC001', -1.9400, 30.0800),
+    ('KIM001', -1.9200, 30.0900),
+]
+
+
+def make_fleet(n, seed=1):
+    """Simulator with n vehicles in central Kigali heading north at 36 km/h"""
+    simulator = FleetSimulator(seed=seed)
+    simulator._reset_arrays(n)
+    simulator.ids[:] = np.arange(1, n + 1)
+    simulator.lat[:] = -1.95
+    simulator.lng[:] = 30.06
+    simulator.speed[:] = 36.0
+    return simulator
+
+
+class TestFleetSimulator(unittest.TestCase):
+    """Movement is vectorized and stays inside the city bounds"""
+
+    def test_step_distance(self):
+        simulator = make_fleet(1000)
+        simulator.step(10.0)
+        moved = haversine_km_array(-1.95, 30.06, simulator.lat, simulator.lng)
+        # 36 km/h for 10 s is 100 m (111 km per degree approximation)
+        np.testing.assert_allclose(moved, 0.1, rtol=0.01)
+
+    def test_bounds_and_bearing_range(self):
+        simulator = make_fleet(5000)
+        simulator.bearing[:] = np.random.default_rng(2).uniform(0, 360, 5000)
+        for _ in range(200):
+            simulator.step(30.0)
+        self.assertTrue(np.all(simulator.lat >= KIGALI_BOUNDS['min_lat']))
+        self.assertTrue(np.all(simulator.lat <= KIGALI_BOUNDS['max_lat']))
+        self.assertTrue(np.all(simulator.lng >= KIGALI_BOUNDS['min_lng']))
+        self.assertTrue(np.all(simulator.lng <= KIGALI_BOUNDS['max_lng']))
+        self.assertTrue(np.all((simulator.bearing >= 0) & (simulator.bearing < 360)))
+
+
+class TestSimulatedFleet(unittest.TestCase):
+    """Only SIM* vehicles are counted and moved unless a run asks for all"""
+
+    def setUp(self):
+        """Two real vehicles in a vehicles table without the geometry column"""
+        engine = create_engine('sqlite://')
+        columns = ', '.join(
+            'id INTEGER PRIMARY KEY' if column.name == 'id' else column.name
+            for column in Vehicle.__table__.columns if column.name != 'location'
+        )
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'CREATE TABLE vehicles ({columns})')
+            conn.exec_driver_sql(
+                "INSERT INTO vehicles (id, vehicle_type, registration, current_lat, current_lng, is_active) "
+                "VALUES (1, 'bus', 'RAB001A', -1.95, 30.06, 1), (2, 'taxi', 'RAB002B', -1.94, 30.07, 1)"
+            )
+        self.session = Session(engine)
+
+    def tearDown(self):
+        self.session.close()
+
+    def positions(self):
+        rows = self.session.execute(text('SELECT id, current_lat, current_lng FROM vehicles ORDER BY id'))
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def test_real_vehicles_untouched(self):
+        simulator = FleetSimulator(seed=1)
+        self.assertEqual(simulator.spawn(self.session, 3), 3)
+        before = self.positions()
+        self.assertEqual(simulator.tick(self.session, dt=10.0)['moved_count'], 3)
+        after = self.positions()
+        self.assertEqual([after[1], after[2]], [before[1], before[2]])
+        self.assertTrue(all(after[i] != before[i] for i in (3, 4, 5)))
+
+    def test_all_vehicles_on_request(self):
+        simulator = FleetSimulator(seed=1)
+        simulator.set_simulated_only(False)
+        self.assertEqual(simulator.spawn(self.session, 3), 1)
+        self.assertEqual(simulator.tick(self.session, dt=10.0)['moved_count'], 3)
+        self.assertNotEqual(self.positions()[1], (-1.95, 30.06))
+
+
+
+class TestRouteSimulation(unittest.TestCase):
+    """Vehicles advance along precomputed paths and dwell at stops"""
+
+    def test_densify_spacing(self):
+        lats, lngs, bearings, vertex_km = densify([-1.95, -1.94], [30.06, 30.06], 0.025)
+        self.assertAlmostEqual(vertex_km[-1], 1.112, places=2)
+        steps = haversine_km_array(lats[:-1], lngs[:-1], lats[1:], lngs[1:])
+        self.assertTrue(np.all(steps <= 0.0251))
+        self.assertTrue(np.allclose(bearings, 0.0))  # due north
+
+    def test_bus_follows_route_and_turns_around(self):
+        simulator = make_fleet(1)
+        simulator.network = RouteNetwork(STOPS, rng=simulator.rng)
+        forward = simulator.network.route_paths['RT001']
+        simulator.path[:] = forward
+        simulator.speed[:] = 36.0
+
+        visited, dwelled = set(), 0
+        for _ in range(400):
+            simulator._step_routes(5.0)
+            visited.add(int(simulator.path[0]))
+            dwelled += simulator.dwell[0] == DWELL_SECONDS
+        self.assertEqual(visited, {forward, forward + 1})
+        self.assertGreaterEqual(dwelled, 3)
+        # Every position is on the Nyabugogo - City Center - Kacyiru corridor
+        self.assertTrue(-1.951 <= simulator.lat[0] <= -1.939)
+
+    def test_trips_start_from_last_destination(self):
+        network = RouteNetwork(STOPS, routes={}, rng=np.random.default_rng(3))
+        trips = network.random_trip(50)
+        following = network.next_paths(trips)
+        paths = network.paths
+        ends = paths.offsets[trips] + paths.counts[trips] - 1
+        starts = paths.offsets[following]
+        np.testing.assert_allclose(paths.lat[ends], paths.lat[starts])
+        np.testing.assert_allclose(paths.lng[ends], paths.lng[starts])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests for the shared geo math helpers
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import (
+    bearing_array,
+    bounding_box,
+    calculate_bearing,
+    calculate_distance_km,
+    destination_array,
+    estimate_eta,
+    estimate_eta_array,
+    haversine_km_array,
+)
+
+NYABUGOGO = (-1.9441, 30.0619)
+KACYIRU = (-1.9307, 30.1182)
+
+
+class TestGeo(unittest.TestCase):
+    """Scalar and batched helpers must agree"""
+
+    def test_distance_nyabugogo_kacyiru(self):
+        """Nyabugogo to Kacyiru is a little over 6 km"""
+        distance = calculate_distance_km(*NYABUGOGO, *KACYIRU)
+        self.assertAlmostEqual(distance, 6.44, delta=0.05)
+
+    def test_distance_zero(self):
+        """Distance from a point to itself is zero"""
+        self.assertEqual(calculate_distance_km(*NYABUGOGO, *NYABUGOGO), 0.0)
+
+    def test_batched_distance_matches_scalar(self):
+        """Vectorized haversine agrees with the scalar version"""
+        lats = np.array([-1.95, -1.92, -1.97, -1.9441])
+        lngs = np.array([30.058, 30.09, 30.09, 30.0619])
+        batched = haversine_km_array(NYABUGOGO[0], NYABUGOGO[1], lats, lngs)
+        scalar = [calculate_distance_km(*NYABUGOGO, la, ln) for la, ln in zip(lats, lngs)]
+        np.testing.assert_allclose(batched, scalar, rtol=1e-9)
+
+    def test_bearing(self):
+        """Due north is 0 degrees and due east is 90 degrees"""
+        self.assertAlmostEqual(calculate_bearing(0, 30, 1, 30), 0.0, places=6)
+        self.assertAlmostEqual(calculate_bearing(0, 30, 0, 31), 90.0, places=6)
+        batched = bearing_array(0, 30, np.array([1.0, 0.0, -1.0]), np.array([30.0, 31.0, 30.0]))
+        np.testing.assert_allclose(batched, [0.0, 90.0, 180.0], atol=1e-6)
+
+    def test_destination_round_trip(self):
+        """Travelling along a bearing lands at that distance and bearing"""
+        lats, lngs = destination_array(NYABUGOGO[0], NYABUGOGO[1], np.array([0.0, 75.0, 200.0]), 1.5)
+        for lat, lng, bearing in zip(lats, lngs, [0.0, 75.0, 200.0]):
+            self.assertAlmostEqual(calculate_distance_km(*NYABUGOGO, lat, lng), 1.5, places=6)
+            self.assertAlmostEqual(calculate_bearing(*NYABUGOGO, lat, lng), bearing, places=4)
+
+    def test_bounding_box_contains_radius(self):
+        """Every point within the radius lies inside the box"""
+        min_lat, max_lat, min_lng, max_lng = bounding_box(*NYABUGOGO, 2.0)
+        self.assertLess(min_lat, NYABUGOGO[0])
+        self.assertGreater(max_lat, NYABUGOGO[0])
+        self.assertGreater(calculate_distance_km(*NYABUGOGO, max_lat, NYABUGOGO[1]), 1.99)
+        self.assertGreater(calculate_distance_km(*NYABUGOGO, NYABUGOGO[0], max_lng), 1.99)
+        self.assertLess(min_lng, max_lng)
+
+    def test_eta(self):
+        """ETA uses the shared speed table"""
+        self.assertEqual(estimate_eta(15, 'bus'), 30.0)
+        self.assertEqual(estimate_eta(20, 'taxi'), 30.0)
+        self.assertEqual(estimate_eta(25, 'moto'), 30.0)
+        self.assertEqual(estimate_eta(10, 'bus', traffic_factor=0.5), 40.0)
+
+    def test_batched_eta_matches_scalar(self):
+        """Vectorized ETA agrees with the scalar version, including unknown types"""
+        distances = [1.2, 3.4, 5.6, 7.8]
+        types = ['bus', 'taxi', 'moto', 'tuktuk']
+        expected = [estimate_eta(d, t) for d, t in zip(distances, types)]
+        np.testing.assert_allclose(estimate_eta_array(distances, types), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
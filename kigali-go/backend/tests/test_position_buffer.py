@@ -0,0 +1,75 @@
+"""
+Unit tests for the write-behind position buffer
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.position_buffer import PositionBuffer
+from app.utils.vehicle_ingest import PositionUpdate
+from app.utils.vehicle_store import VehicleStateStore
+from tests.test_vehicle_store import make_state
+
+
+T0 = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def position(vehicle_id, lat, seconds, bearing=None):
+    return PositionUpdate(vehicle_id, lat, 30.06, bearing, None, T0 + timedelta(seconds=seconds))
+
+
+class TestPositionBuffer(unittest.TestCase):
+    """Only the newest position per vehicle is kept"""
+
+    def test_coalesces_to_latest(self):
+        buffer = PositionBuffer()
+        accepted = buffer.submit([position(1, -1.94, 2), position(1, -1.95, 4), position(2, -1.96, 2)])
+        self.assertEqual(accepted, 3)
+        # An older report for vehicle 1 is dropped
+        self.assertEqual(buffer.submit([position(1, -1.90, 3)]), 0)
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.get(1).lat, -1.95)
+        stats = buffer.stats()
+        self.assertEqual(stats['submitted'], 4)
+        self.assertEqual(stats['coalesced'], 2)
+        self.assertFalse(stats['enabled'])
+
+    def test_history_is_bounded(self):
+        buffer = PositionBuffer(max_history=3)
+        buffer.submit([], history=[position(1, -1.94, s) for s in range(5)])
+        # A failed flush puts the history back without growing past the bound
+        with self.assertLogs('app.utils.position_buffer', level='ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.submit([], history=[position(1, -1.94, 5)])
+        self.assertEqual([fix.ts for fix in buffer._history], [T0 + timedelta(seconds=s) for s in (3, 4, 5)])
+        stats = buffer.stats()
+        self.assertEqual((stats['pending_history'], stats['dropped_history']), (3, 3))
+
+
+class TestStoreOverlay(unittest.TestCase):
+    """Pending positions are visible through the vehicle store"""
+
+    def test_overlay_positions(self):
+        store = VehicleStateStore()
+        store.load([make_state(1, -1.9441, 30.0619, 'bus', updated_at=T0)])
+        row = store.get(1)
+        applied = store.overlay_positions([
+            PositionUpdate(1, -1.9450, 30.0625, 45.0, None, row.last_seen + timedelta(seconds=2)),
+            PositionUpdate(1, -1.9999, 30.0999, None, None, row.last_seen - timedelta(seconds=2)),
+            PositionUpdate(9, -1.9450, 30.0625, None, None, row.last_seen),
+        ])
+        self.assertEqual(applied, 1)
+        moved = store.get(1)
+        self.assertEqual((moved.current_lat, moved.bearing), (-1.9450, 45.0))
+        self.assertEqual(moved.speed, row.speed)
+        self.assertEqual(moved.change_version, row.change_version)
+        self.assertEqual([v.id for v, _ in store.nearby(-1.9450, 30.0625, 0.1)], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
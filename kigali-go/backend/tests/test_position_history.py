@@ -0,0 +1,43 @@
+"""
+Unit tests for trajectory downsampling
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.position_history import downsample
+
+
+class TestDownsample(unittest.TestCase):
+    """Largest-Triangle-Three-Buckets keeps endpoints and corners"""
+
+    def test_short_tracks_untouched(self):
+        lats = np.linspace(-1.95, -1.94, 10)
+        self.assertEqual(downsample(lats, lats + 32, 10).tolist(), list(range(10)))
+
+    def test_budget_and_order(self):
+        t = np.arange(43200)
+        lats = -1.95 + 0.01 * np.sin(t / 3000)
+        lngs = 30.06 + 0.01 * np.cos(t / 2000)
+        selected = downsample(lats, lngs, 500)
+        self.assertEqual(len(selected), 500)
+        self.assertEqual((selected[0], selected[-1]), (0, 43199))
+        self.assertTrue(np.all(np.diff(selected) > 0))
+
+    def test_keeps_corner(self):
+        """An L-shaped track keeps the turning point"""
+        lats = np.concatenate([np.linspace(-1.96, -1.94, 500), np.full(500, -1.94)])
+        lngs = np.concatenate([np.full(500, 30.05), np.linspace(30.05, 30.07, 500)])
+        selected = downsample(lats, lngs, 20)
+        corner = np.hypot(lats[selected] + 1.94, lngs[selected] - 30.05).min()
+        self.assertLess(corner, 1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+Unit tests for the serialization layer and the encoded response cache
+"""
+
+import unittest
+import json
+import sys
+import os
+import threading
+import time
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import estimate_eta
+from app.utils.serializers import (
+    EncodedResponseCache, dumps, dumps_with, encode_realtime_vehicles, realtime_vehicle_records,
+)
+from app.utils.tile_cache import TileCache
+from app.utils.vehicle_store import VehicleStateStore
+from tests.test_vehicle_store import make_state
+
+
+class TestSerializers(unittest.TestCase):
+    """Test cases for JSON encoding and vehicle records"""
+
+    def test_dumps_is_compact_and_handles_datetimes(self):
+        """Datetimes encode as ISO 8601 and output has no padding"""
+        body = dumps({'at': datetime(2024, 1, 1, 12, 0), 'n': [1, 2]})
+        self.assertIsInstance(body, bytes)
+        self.assertNotIn(b' ', body)
+        self.assertEqual(json.loads(body), {'at': '2024-01-01T12:00:00', 'n': [1, 2]})
+
+    def test_realtime_vehicle_records(self):
+        """Records carry legacy aliases, the rounded distance and the ETA"""
+        state = make_state(5, -1.9441, 30.0619, 'moto')._replace(bearing=None, speed=None)
+        record, = realtime_vehicle_records([(state, 1.2345)])
+        self.assertEqual((record['type'], record['vehicle_type']), ('moto', 'moto'))
+        self.assertEqual((record['lat'], record['current_lat']), (-1.9441, -1.9441))
+        self.assertEqual((record['heading'], record['bearing'], record['speed']), (0, 0, 0))
+        self.assertEqual(record['distance_km'], 1.23)
+        self.assertEqual(record['eta_minutes'], estimate_eta(1.2345, 'moto'))
+        self.assertEqual(record['updated_at'], '2025-01-01T00:00:00')
+        self.assertEqual(realtime_vehicle_records([]), [])
+
+    def test_encode_realtime_vehicles_matches_records(self):
+        """Tile-shared fragments encode the same records as the per-request path"""
+        store = VehicleStateStore()
+        store.load([make_state(i + 1, -1.9441 + i * 0.001, 30.0619, ('bus', 'taxi', 'moto')[i % 3])
+                    for i in range(20)])
+        cache = TileCache(tile_km=0.5, ttl=60.0)
+        for lat in (-1.9441, -1.9400):
+            entry = cache.candidates(store, lat, 30.0619, 1.0)
+            order, distances = entry.select(lat, 30.0619, 1.0)
+            matches = [(entry.rows[i], d) for i, d in zip(order.tolist(), distances.tolist())]
+            encoded = encode_realtime_vehicles(entry, order, distances)
+            self.assertEqual(json.loads(encoded), realtime_vehicle_records(matches))
+        self.assertEqual(json.loads(encode_realtime_vehicles(entry, order[:0], distances[:0])), [])
+
+    def test_dumps_with_prepends_encoded_value(self):
+        """Pre-encoded JSON is spliced in as the first key"""
+        self.assertEqual(json.loads(dumps_with({'a': 1}, 'v', b'[1,2]')), {'v': [1, 2], 'a': 1})
+        self.assertEqual(json.loads(dumps_with({}, 'v', b'[]')), {'v': []})
+
+
+class TestEncodedResponseCache(unittest.TestCase):
+    """Test cases for versioned, expiring and bounded entries"""
+
+    def test_hit_requires_same_version(self):
+        """A stored body is reused only while its version is current"""
+        cache = EncodedResponseCache(ttl=60.0)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {'count': len(builds)}
+
+        first = cache.fetch(('k',), 1, build)
+        self.assertIs(cache.fetch(('k',), 1, build), first)
+        second = cache.fetch(('k',), 2, build)
+        self.assertEqual(len(builds), 2)
+        self.assertNotEqual(first.etag, second.etag)
+        self.assertEqual(json.loads(second.body), {'count': 2})
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 2))
+
+    def test_expiry_and_eviction(self):
+        """Entries expire after their TTL and the oldest are evicted"""
+        cache = EncodedResponseCache(ttl=60.0, max_entries=2)
+        cache.put('expired', 0, {}, ttl=0.0)
+        self.assertIsNone(cache.get('expired', 0))
+        for key in ('a', 'b', 'c'):
+            cache.put(key, 0, {'key': key})
+        self.assertIsNone(cache.get('a', 0))
+        self.assertIsNotNone(cache.get('c', 0))
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_concurrent_misses_build_once(self):
+        """Callers missing together share one build"""
+        cache = EncodedResponseCache(ttl=60.0)
+        started, release = threading.Event(), threading.Event()
+        builds = []
+
+        def build():
+            builds.append(1)
+            started.set()
+            release.wait(5)
+            return {'n': len(builds)}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.fetch('k', 1, build)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(cache.fetch('k', 1, build)))
+                     for _ in range(8)]
+        for thread in followers:
+            thread.start()
+        while cache.stats()['coalesced'] < 8:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(len({entry.etag for entry in results}), 1)
+        self.assertEqual(len(results), 9)
+
+    def test_stale_entry_served_during_rebuild(self):
+        """While a new version is built, other callers get the previous body"""
+        cache = EncodedResponseCache(ttl=60.0, stale_ttl=5.0)
+        old = cache.fetch('k', 1, lambda: {'v': 1})
+        started, release = threading.Event(), threading.Event()
+
+        def slow_build():
+            started.set()
+            release.wait(5)
+            return {'v': 2}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.fetch('k', 2, slow_build)))
+        leader.start()
+        started.wait(5)
+        self.assertIs(cache.fetch('k', 2, slow_build), old)
+        self.assertEqual(cache.stats()['stale'], 1)
+        release.set()
+        leader.join(5)
+        self.assertEqual(json.loads(results[0].body), {'v': 2})
+        self.assertIs(cache.fetch('k', 2, slow_build), results[0])
+
+    def test_failed_build_is_not_cached(self):
+        """An exception reaches the caller and the next call builds again"""
+        cache = EncodedResponseCache(ttl=60.0)
+
+        def failing():
+            raise RuntimeError('database down')
+
+        with self.assertRaises(RuntimeError):
+            cache.fetch('k', 1, failing)
+        self.assertEqual(json.loads(cache.fetch('k', 1, lambda: {'ok': True}).body), {'ok': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
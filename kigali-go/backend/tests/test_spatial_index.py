@@ -0,0 +1,73 @@
+"""
+Unit tests for the grid spatial index
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import haversine_km_array
+from app.utils.spatial_index import GridIndex
+
+
+class TestGridIndex(unittest.TestCase):
+    """Grid lookups must match a brute-force scan"""
+
+    def setUp(self):
+        """Random points scattered over Kigali"""
+        rng = np.random.default_rng(42)
+        self.point_lats = rng.uniform(-1.99, -1.89, 2000)
+        self.point_lngs = rng.uniform(30.00, 30.16, 2000)
+        self.query_lats = rng.uniform(-1.99, -1.89, 300)
+        self.query_lngs = rng.uniform(30.00, 30.16, 300)
+
+    def brute_force_nearest(self, max_km):
+        """Reference nearest-neighbour via the full distance matrix"""
+        matrix = haversine_km_array(
+            self.query_lats[:, None], self.query_lngs[:, None],
+            self.point_lats[None, :], self.point_lngs[None, :]
+        )
+        matrix[matrix > max_km] = np.inf
+        idx = np.argmin(matrix, axis=1)
+        dist = matrix[np.arange(len(idx)), idx]
+        idx[np.isinf(dist)] = -1
+        return idx, dist
+
+    def test_nearest_matches_brute_force(self):
+        """Nearest point and distance agree with the exhaustive scan"""
+        for cell_km, max_km in [(1.0, 1.0), (0.5, 1.0), (1.0, 0.3)]:
+            index = GridIndex(self.point_lats, self.point_lngs, cell_km=cell_km)
+            idx, dist = index.nearest(self.query_lats, self.query_lngs, max_km)
+            expected_idx, expected_dist = self.brute_force_nearest(max_km)
+            np.testing.assert_array_equal(idx, expected_idx)
+            np.testing.assert_allclose(dist, expected_dist)
+
+    def test_pairs_within_counts(self):
+        """Every pair inside the radius is found exactly once"""
+        index = GridIndex(self.point_lats, self.point_lngs, cell_km=1.0)
+        query_idx, point_idx, distances = index.pairs_within(self.query_lats, self.query_lngs, 0.8)
+        matrix = haversine_km_array(
+            self.query_lats[:, None], self.query_lngs[:, None],
+            self.point_lats[None, :], self.point_lngs[None, :]
+        )
+        self.assertEqual(len(query_idx), int((matrix <= 0.8).sum()))
+        self.assertEqual(len(set(zip(query_idx.tolist(), point_idx.tolist()))), len(query_idx))
+        self.assertTrue(np.all(distances <= 0.8))
+
+    def test_empty_inputs(self):
+        """No points or no queries yield no matches"""
+        empty = GridIndex([], [], cell_km=1.0)
+        idx, dist = empty.nearest([-1.95], [30.06], 1.0)
+        self.assertEqual(idx.tolist(), [-1])
+        self.assertTrue(np.isinf(dist[0]))
+        index = GridIndex(self.point_lats, self.point_lngs)
+        self.assertEqual(len(index.nearest([], [], 1.0)[0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Unit tests for the SQLite R*Tree spatial query backend
+"""
+
+import unittest
+import sys
+import os
+
+import numpy as np
+from sqlalchemy import Column, Float, Integer, create_engine, text
+from sqlalchemy.orm import Session, declarative_base
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import haversine_km_array
+from models.spatial import nearest, register_spatial_ddl, spatial_backend, within_bounds, within_radius
+
+Base = declarative_base()
+
+
+class Place(Base):
+    """Minimal point table wired up like vehicles/stops"""
+    __tablename__ = 'places'
+
+    id = Column(Integer, primary_key=True)
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+
+
+register_spatial_ddl(Place.__table__, 'lat', 'lng')
+
+
+class TestSpatialQuery(unittest.TestCase):
+    """Indexed queries must match a brute-force scan"""
+
+    def setUp(self):
+        """Random places scattered over Kigali"""
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = Session(engine)
+
+        rng = np.random.default_rng(3)
+        self.lats = rng.uniform(-1.99, -1.89, 500)
+        self.lngs = rng.uniform(30.00, 30.16, 500)
+        self.session.add_all(
+            Place(id=i + 1, lat=float(la), lng=float(ln)) for i, (la, ln) in enumerate(zip(self.lats, self.lngs))
+        )
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_backend_is_rtree(self):
+        """SQLite uses the R*Tree mirror, kept in sync by triggers"""
+        query = self.session.query(Place)
+        self.assertEqual(spatial_backend(query), 'rtree')
+        self.assertEqual(self.session.execute(text('SELECT count(*) FROM places_rtree')).scalar(), 500)
+
+        place = self.session.get(Place, 1)
+        place.lat, place.lng = None, None
+        self.session.delete(self.session.get(Place, 2))
+        self.session.commit()
+        self.assertEqual(self.session.execute(text('SELECT count(*) FROM places_rtree')).scalar(), 498)
+
+    def test_within_radius_matches_brute_force(self):
+        """Radius query returns exactly the places inside, nearest first"""
+        distances = haversine_km_array(-1.95, 30.06, self.lats, self.lngs)
+        expected = set((np.flatnonzero(distances <= 1.5) + 1).tolist())
+
+        matches = within_radius(self.session.query(Place), Place, -1.95, 30.06, 1.5)
+        self.assertEqual({place.id for place, _ in matches}, expected)
+        found = [distance for _, distance in matches]
+        self.assertEqual(found, sorted(found))
+
+    def test_column_queries(self):
+        """Column queries come back as tuples of their own columns"""
+        entities = within_radius(self.session.query(Place), Place, -1.95, 30.06, 1.5)
+        rows = within_radius(self.session.query(Place.id, Place.lat), Place, -1.95, 30.06, 1.5)
+        self.assertEqual([(p.id, p.lat) for p, _ in entities], [row for row, _ in rows])
+        self.assertEqual([d for _, d in entities], [d for _, d in rows])
+
+        ids = within_radius(self.session.query(Place.id), Place, -1.95, 30.06, 1.5)
+        self.assertEqual([p.id for p, _ in entities], [i for i, _ in ids])
+        nearest_rows = nearest(self.session.query(Place.id, Place.lng), Place, -1.95, 30.06, k=3)
+        self.assertEqual(len(nearest_rows[0][0]), 2)
+
+    def test_nearest(self):
+        """k nearest places agree with the exhaustive scan"""
+        distances = haversine_km_array(-1.95, 30.06, self.lats, self.lngs)
+        expected = (np.argsort(distances)[:5] + 1).tolist()
+
+        matches = nearest(self.session.query(Place), Place, -1.95, 30.06, k=5)
+        self.assertEqual([place.id for place, _ in matches], expected)
+        self.assertEqual(nearest(self.session.query(Place), Place, 10.0, 10.0, k=1, max_km=2.0), [])
+
+    def test_within_bounds(self):
+        """Box query returns exactly the places in the tile-style box"""
+        inside = (self.lats > -1.96) & (self.lats <= -1.93) & (self.lngs >= 30.05) & (self.lngs < 30.09)
+        expected = set((np.flatnonzero(inside) + 1).tolist())
+
+        query = within_bounds(self.session.query(Place.id), Place, -1.96, -1.93, 30.05, 30.09)
+        self.assertEqual({row.id for row in query.all()}, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
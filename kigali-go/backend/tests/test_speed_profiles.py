@@ -0,0 +1,89 @@
+"""
+Unit tests for the learned per-zone, per-hour ETA speeds
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import estimate_eta
+from app.utils.speed_profiles import (
+    SpeedProfiles, add_fixes, build_table, build_zone_grid, empty_histograms, hour_of_week,
+    hour_of_week_array,
+)
+
+NYABUGOGO = (1, -1.9441, 30.0619)
+KACYIRU = (2, -1.9307, 30.1182)
+MONDAY_8AM = datetime(2025, 1, 6, 8, 15)
+
+
+def learned_table(min_samples=10):
+    """Buses crawl at 12 km/h around Nyabugogo on Monday 08:00 and run at 36 km/h in Kacyiru"""
+    grid = build_zone_grid([NYABUGOGO, KACYIRU], cell_deg=0.005, reach_km=3.0)
+    histograms = empty_histograms(len(grid.zone_ids))
+    n = 40
+    add_fixes(histograms, grid, [-1.944] * n, [30.062] * n, np.full(n, 12.5), [MONDAY_8AM] * n, ['bus'] * n)
+    add_fixes(histograms, grid, [-1.931] * n, [30.118] * n, np.full(n, 36.5), [MONDAY_8AM] * n, ['bus'] * n)
+    # Too few taxi fixes to override the fallback, and a fix with no known type
+    add_fixes(histograms, grid, [-1.944] * 3, [30.062] * 3, [10.0] * 3, [MONDAY_8AM] * 3, ['taxi'] * 3)
+    add_fixes(histograms, grid, [-1.944], [30.062], [5.0], [MONDAY_8AM], [None])
+    return build_table(grid, histograms, min_samples=min_samples, built_at=MONDAY_8AM)
+
+
+class TestSpeedProfiles(unittest.TestCase):
+    """Table lookups pick the zone, hour and type bucket, with fallbacks"""
+
+    def test_hour_of_week(self):
+        stamps = [MONDAY_8AM, datetime(2025, 1, 12, 23, 59), datetime(1970, 1, 1)]
+        self.assertEqual(hour_of_week_array(stamps).tolist(), [hour_of_week(s) for s in stamps])
+        self.assertEqual(hour_of_week(MONDAY_8AM), 8)
+
+    def test_zone_grid(self):
+        grid = build_zone_grid([NYABUGOGO, KACYIRU], reach_km=3.0)
+        zones = grid.locate([-1.944, -1.931, -1.5, np.nan], [30.062, 30.118, 30.0, 30.0])
+        self.assertEqual(zones.tolist(), [0, 1, -1, -1])
+
+    def test_lookup(self):
+        table = learned_table()
+        speeds = table.lookup(
+            [-1.944, -1.931, -1.944, -1.944, -1.0], [30.062, 30.118, 30.062, 30.062, 30.0],
+            ['bus', 'bus', 'taxi', 'walk', 'bus'], hour_of_week(MONDAY_8AM),
+        )
+        # Zone medians; thin taxi bucket and unknown type fall back to the fixed
+        # averages; outside every zone the city-wide bus median applies
+        self.assertEqual(speeds[:4].tolist(), [13.0, 37.0, 40.0, 35.0])
+        self.assertIn(speeds[4], (13.0, 37.0))
+        # Another hour has no samples at all
+        later = table.lookup([-1.944], [30.062], ['bus'], hour_of_week(MONDAY_8AM + timedelta(hours=5)))
+        self.assertEqual(later.tolist(), [30.0])
+
+    def test_eta_uses_table(self):
+        profiles = SpeedProfiles()
+        self.assertEqual(profiles.eta(2.0, 'bus', -1.944, 30.062, MONDAY_8AM), estimate_eta(2.0, 'bus'))
+        profiles.table = learned_table()
+        self.assertEqual(profiles.eta(2.0, 'bus', -1.944, 30.062, MONDAY_8AM), round(2.0 / 13.0 * 60, 1))
+        etas = profiles.eta_array([2.0, 2.0], ['bus', 'bus'], [-1.944, -1.931], [30.062, 30.118], MONDAY_8AM)
+        self.assertEqual(etas.tolist(), [round(2.0 / 13.0 * 60, 1), round(2.0 / 37.0 * 60, 1)])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            saved = SpeedProfiles(path=os.path.join(tmp, 'speeds.npz'))
+            saved.table = learned_table()
+            self.assertTrue(saved.save())
+            loaded = SpeedProfiles(path=saved.path)
+            self.assertTrue(loaded.load())
+        np.testing.assert_array_equal(loaded.table.speeds, saved.table.speeds)
+        self.assertEqual(loaded.table.grid.zone_ids, (1, 2))
+        self.assertEqual(loaded.table.built_at, MONDAY_8AM)
+        self.assertEqual(loaded.speed(-1.931, 30.118, 'bus', MONDAY_8AM), 37.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Unit tests for the tile-quantized nearby-vehicle cache
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.tile_cache import TileCache, snap
+from app.utils.vehicle_store import VehicleStateStore
+from tests.test_vehicle_store import make_state
+
+
+class TestTileCache(unittest.TestCase):
+    """Test cases for tile snapping, exact post-filtering and hit accounting"""
+
+    def setUp(self):
+        """A random fleet of 2,000 vehicles over central Kigali"""
+        rng = np.random.default_rng(7)
+        lats = rng.uniform(-1.99, -1.90, 2000)
+        lngs = rng.uniform(30.02, 30.14, 2000)
+        types = rng.choice(['bus', 'taxi', 'moto'], 2000)
+        self.store = VehicleStateStore()
+        self.store.load([
+            make_state(i + 1, float(lat), float(lng), str(t), change_version=i + 1)
+            for i, (lat, lng, t) in enumerate(zip(lats, lngs, types))
+        ])
+        self.cache = TileCache(tile_km=0.5, ttl=60.0)
+        self.rng = rng
+
+    def test_matches_store_for_any_center(self):
+        """Results equal a direct store scan for centers anywhere in the tile"""
+        for _ in range(50):
+            lat = float(self.rng.uniform(-1.97, -1.92))
+            lng = float(self.rng.uniform(30.04, 30.12))
+            radius = float(self.rng.uniform(0.1, 3.0))
+            vehicle_type = self.rng.choice([None, 'bus', 'moto'])
+            expected = self.store.nearby(lat, lng, radius, vehicle_type=vehicle_type)
+            matches, version = self.cache.nearby(self.store, lat, lng, radius, vehicle_type=vehicle_type)
+            self.assertEqual([v.id for v, _ in matches], [v.id for v, _ in expected])
+            self.assertEqual(version, self.store.version)
+
+    def test_nearby_centers_share_an_entry(self):
+        """Two riders 10 m apart hit the same tile entry"""
+        self.cache.nearby(self.store, -1.9441, 30.0619, 1.0)
+        self.cache.nearby(self.store, -1.94419, 30.06195, 1.0)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_store_changes_after_ttl_miss(self):
+        """Changed stores are served from cache only within the TTL"""
+        self.cache.nearby(self.store, -1.9441, 30.0619, 1.0)
+        self.store.upsert([make_state(99999, -1.9441, 30.0619, 'bus', change_version=99999)])
+
+        matches, _ = self.cache.nearby(self.store, -1.9441, 30.0619, 1.0)
+        self.assertNotIn(99999, [v.id for v, _ in matches])
+
+        self.cache.ttl = 0.0
+        matches, version = self.cache.nearby(self.store, -1.9441, 30.0619, 1.0)
+        self.assertEqual(matches[0][0].id, 99999)
+        self.assertEqual(version, 99999)
+
+    def _slow_area(self):
+        """Make store scans block until ``release`` is set; returns (scans, started, release)"""
+        scans, started, release = [], threading.Event(), threading.Event()
+        area = self.store.area
+
+        def slow_area(*args, **kwargs):
+            scans.append(1)
+            started.set()
+            release.wait(5)
+            return area(*args, **kwargs)
+
+        self.store.area = slow_area
+        return scans, started, release
+
+    def test_concurrent_misses_scan_once(self):
+        """Requests missing the same tile together share one store scan"""
+        scans, started, release = self._slow_area()
+        results = []
+        leader = threading.Thread(target=lambda: results.append(
+            self.cache.candidates(self.store, -1.9441, 30.0619, 1.0)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(
+            self.cache.candidates(self.store, -1.94419, 30.06195, 1.0))) for _ in range(8)]
+        for thread in followers:
+            thread.start()
+        while self.cache.stats()['coalesced'] < 8:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(len(scans), 1)
+        self.assertEqual(len(results), 9)
+        self.assertEqual(len({id(entry) for entry in results}), 1)
+
+    def test_stale_entry_served_during_rescan(self):
+        """While a changed tile is rescanned, other requests get its previous entry"""
+        self.cache.ttl = 0.0
+        old = self.cache.candidates(self.store, -1.9441, 30.0619, 1.0)
+        self.store.upsert([make_state(99999, -1.9441, 30.0619, 'bus', change_version=99999)])
+        scans, started, release = self._slow_area()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(
+            self.cache.candidates(self.store, -1.9441, 30.0619, 1.0)))
+        leader.start()
+        started.wait(5)
+        self.assertIs(self.cache.candidates(self.store, -1.9441, 30.0619, 1.0), old)
+        self.assertEqual(self.cache.stats()['stale'], 1)
+        release.set()
+        leader.join(5)
+        self.assertEqual(results[0].version, 99999)
+        self.assertEqual(len(scans), 1)
+
+    def test_cover_radius_reaches_tile_corners(self):
+        """The candidate radius covers the query radius from every tile corner"""
+        tile = snap(-1.9441, 30.0619, 0.7, 0.5)
+        self.assertEqual(tile.rings, 2)
+        self.assertGreaterEqual(tile.cover_km, 0.7 + 0.5 * np.sqrt(2) / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+Unit tests for the stop/zone vector tile encoder
+"""
+
+import unittest
+import struct
+import sys
+import os
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.vector_tiles import (
+    StopPoint, VectorTileSet, ZoneShape, _varint, _zigzag, parse_wkb_polygons, render_tiles,
+)
+from app.utils.web_mercator import tile_for
+
+
+def read_message(data):
+    """Minimal protobuf reader: {field: [values]} with varints and raw bytes"""
+    fields, offset = {}, 0
+
+    def varint():
+        nonlocal offset
+        value = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                return value
+
+    while offset < len(data):
+        key = varint()
+        if key & 7 == 0:
+            value = varint()
+        elif key & 7 == 1:
+            value = data[offset:offset + 8]
+            offset += 8
+        else:
+            length = varint()
+            value = data[offset:offset + length]
+            offset += length
+        fields.setdefault(key >> 3, []).append(value)
+    return fields
+
+
+def read_packed(data):
+    values, offset = [], 0
+    while offset < len(data):
+        value = shift = 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        values.append(value)
+    return values
+
+
+def polygon_wkb(rings):
+    body = struct.pack('<BII', 1, 3, len(rings))
+    for ring in rings:
+        body += struct.pack('<I', len(ring)) + b''.join(struct.pack('<dd', *p) for p in ring)
+    return body
+
+
+SQUARE = [(30.05, -1.96), (30.07, -1.96), (30.07, -1.94), (30.05, -1.94), (30.05, -1.96)]
+HOLE = [(30.055, -1.955), (30.055, -1.945), (30.065, -1.945), (30.065, -1.955), (30.055, -1.955)]
+
+
+class TestVectorTiles(unittest.TestCase):
+    """Test cases for protobuf primitives, WKB parsing and rendered tiles"""
+
+    def test_varint_and_zigzag(self):
+        """Varints and zigzag follow the protobuf encoding"""
+        self.assertEqual(_varint(1), b'\x01')
+        self.assertEqual(_varint(300), b'\xac\x02')
+        self.assertEqual([_zigzag(v) for v in (0, -1, 1, -2, 2)], [0, 1, 2, 3, 4])
+
+    def test_parse_wkb_polygon_and_multipolygon(self):
+        """Polygon and MultiPolygon WKB parse into rings of (lng, lat)"""
+        polygon = polygon_wkb([SQUARE, HOLE])
+        self.assertEqual(parse_wkb_polygons(polygon), [[SQUARE, HOLE]])
+        multi = struct.pack('<BII', 1, 6, 2) + polygon + polygon_wkb([SQUARE])
+        self.assertEqual(len(parse_wkb_polygons(multi)), 2)
+
+    def test_rendered_tile_layers(self):
+        """A tile holds the zone polygon with its hole and the stops inside it"""
+        stops = [StopPoint(1, -1.95, 30.06, {'name': 'Centre', 'is_shelter': True}),
+                 StopPoint(2, -1.941, 30.051, {'name': 'Corner', 'is_shelter': False})]
+        zones = [ZoneShape(7, [[SQUARE, HOLE]], {'name': 'Test', 'code': 'TST'})]
+        tiles = render_tiles(stops, zones, 10, 10)
+
+        x, y = tile_for(-1.95, 30.06, 10)
+        tile = read_message(tiles[(10, x, y)])
+        layers = {read_message(layer)[1][0].decode(): read_message(layer) for layer in tile[3]}
+        self.assertEqual(sorted(layers), ['stops', 'zones'])
+        self.assertEqual(len(layers['stops'][2]), 2)
+        self.assertEqual(layers['stops'][5], [4096])
+
+        zone = read_message(layers['zones'][2][0])
+        self.assertEqual((zone[1], zone[3]), ([7], [3]))
+        commands = read_packed(zone[4][0])
+        # Two rings: MoveTo(1), LineTo(n), ClosePath(1) each
+        self.assertEqual(sum(1 for c in commands if c == (7 | 1 << 3)), 2)
+
+        # Exterior winds positive, the hole negative (tile coordinates, y down)
+        rings, ring, cx, cy, i = [], [], 0, 0, 0
+        while i < len(commands):
+            command, count = commands[i] & 7, commands[i] >> 3
+            i += 1
+            if command == 7:
+                rings.append(ring)
+                ring = []
+                continue
+            for _ in range(count):
+                dx, dy = commands[i], commands[i + 1]
+                cx += (dx >> 1) ^ -(dx & 1)
+                cy += (dy >> 1) ^ -(dy & 1)
+                ring.append((cx, cy))
+                i += 2
+        area = [sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(r, r[1:] + r[:1])) for r in rings]
+        self.assertGreater(area[0], 0)
+        self.assertLess(area[1], 0)
+
+    def test_disk_tier_round_trip(self):
+        """Saved tiles load back for the same version"""
+        tiles = render_tiles([StopPoint(1, -1.95, 30.06, {'name': 'A'})], [], 10, 11)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            tile_set = VectorTileSet(min_zoom=10, max_zoom=11, cache_dir=cache_dir)
+            tile_set._save('abc', tiles)
+            self.assertEqual(tile_set._load('abc'), tiles)
+            self.assertIsNone(tile_set._load('other'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Unit tests for bulk GPS position validation
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.vehicle_ingest import parse_timestamp, validate_positions
+
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+class TestParseTimestamp(unittest.TestCase):
+    """ISO text and epoch seconds/milliseconds all become naive UTC"""
+
+    def test_formats(self):
+        expected = datetime(2026, 3, 1, 11, 59, 30)
+        self.assertEqual(parse_timestamp('2026-03-01T11:59:30Z', NOW), expected)
+        self.assertEqual(parse_timestamp('2026-03-01T13:59:30+02:00', NOW), expected)
+        epoch = (expected - datetime(1970, 1, 1)).total_seconds()
+        self.assertEqual(parse_timestamp(epoch, NOW), expected)
+        self.assertEqual(parse_timestamp(int(epoch * 1000), NOW), expected)
+        self.assertEqual(parse_timestamp(None, NOW), NOW)
+
+
+class TestValidatePositions(unittest.TestCase):
+    """Bad records are reported by index; good ones are normalised"""
+
+    def test_valid_records(self):
+        rows, rejected = validate_positions([
+            {'id': '7', 'lat': -1.9441, 'lng': 30.0619, 'bearing': -90, 'speed': 25},
+            {'registration': ' rab 123a ', 'lat': -1.95, 'lng': 30.06},
+        ], NOW)
+        self.assertEqual(rejected, [])
+        self.assertEqual(rows[0][1], ('id', 7))
+        self.assertEqual(rows[0][4], 270.0)
+        self.assertEqual(rows[0][6], NOW)
+        self.assertEqual(rows[1][1], ('registration', 'RAB 123A'))
+        self.assertIsNone(rows[1][4])
+        self.assertIsNone(rows[1][5])
+
+    def test_rejections(self):
+        records = [
+            {'id': 1, 'lat': -1.94, 'lng': 30.06},
+            {'id': 2, 'lat': 91, 'lng': 30.06},
+            {'id': 3, 'lat': -1.94},
+            {'lat': -1.94, 'lng': 30.06},
+            {'id': 5, 'lat': -1.94, 'lng': 30.06, 'speed': -4},
+            {'id': 6, 'lat': -1.94, 'lng': 30.06, 'ts': (NOW + timedelta(hours=1)).isoformat()},
+            {'id': 7, 'lat': float('nan'), 'lng': 30.06},
+            'not an object',
+        ]
+        rows, rejected = validate_positions(records, NOW)
+        self.assertEqual([row[0] for row in rows], [0])
+        self.assertEqual([error['index'] for error in rejected], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(rejected[1]['error'], 'missing field lng')
+        self.assertEqual(rejected[4]['error'], 'timestamp is in the future')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,340 @@
+"""
+Unit tests for the in-memory vehicle state store
+"""
+
+import unittest
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.utils.vehicle_ingest import PositionUpdate
+from app.utils.vehicle_store import VehicleState, VehicleStateStore, decode_cursor, encode_cursor
+from models.versioning import CommitHorizon, postgres_versioning_ddl, sqlite_versioning_ddl
+
+
+def make_state(vehicle_id, lat, lng, vehicle_type='bus', is_active=True, updated_at=None, change_version=0):
+    """Build a VehicleState with sensible defaults"""
+    return VehicleState(
+        id=vehicle_id, vehicle_type=vehicle_type, registration=f'RAB{vehicle_id:03d}',
+        operator='KigaliGo', driver_name=None, driver_phone=None, capacity=4, fuel_type=None,
+        current_lat=lat, current_lng=lng, bearing=90.0, speed=30.0, route_id=None,
+        route_name=None, is_active=is_active, is_available=True,
+        last_seen=updated_at, updated_at=updated_at or datetime(2025, 1, 1),
+        change_version=change_version,
+    )
+
+
+class TestVehicleStateStore(unittest.TestCase):
+    """Test cases for radius and type filtering"""
+
+    def setUp(self):
+        """Load a handful of vehicles around Nyabugogo"""
+        self.store = VehicleStateStore()
+        self.store.load([
+            make_state(1, -1.9441, 30.0619, 'bus'),
+            make_state(2, -1.9450, 30.0625, 'taxi'),
+            make_state(3, -1.9200, 30.0900, 'moto'),        # Kimironko, ~4 km away
+            make_state(4, -1.9442, 30.0620, 'bus', is_active=False),
+            make_state(5, None, None, 'moto'),
+        ])
+
+    def test_radius_filter_sorted_by_distance(self):
+        """Only active vehicles inside the radius are returned, nearest first"""
+        matches = self.store.nearby(-1.9441, 30.0619, 1.0)
+        self.assertEqual([v.id for v, _ in matches], [1, 2])
+        self.assertLessEqual(matches[0][1], matches[1][1])
+
+    def test_large_radius_includes_far_vehicle(self):
+        """Kimironko is about 4 km from Nyabugogo"""
+        ids = [v.id for v, _ in self.store.nearby(-1.9441, 30.0619, 5.0)]
+        self.assertIn(3, ids)
+        self.assertNotIn(4, ids)
+        self.assertNotIn(5, ids)
+
+    def test_type_filter(self):
+        """Type filter is applied in the same pass"""
+        matches = self.store.nearby(-1.9441, 30.0619, 5.0, vehicle_type='taxi')
+        self.assertEqual([v.id for v, _ in matches], [2])
+
+    def test_upsert_moves_existing_vehicle(self):
+        """Upserting an existing id replaces its slot instead of appending"""
+        self.store.upsert([make_state(2, -1.9200, 30.0900, 'taxi', updated_at=datetime(2025, 1, 2))])
+        self.assertEqual(len(self.store), 5)
+        ids = [v.id for v, _ in self.store.nearby(-1.9441, 30.0619, 1.0)]
+        self.assertEqual(ids, [1])
+
+    def test_upsert_grows_capacity(self):
+        """Store grows past its initial capacity"""
+        store = VehicleStateStore(initial_capacity=2)
+        base = datetime(2025, 1, 1)
+        store.upsert(make_state(i, -1.95, 30.06, updated_at=base + timedelta(seconds=i)) for i in range(1, 50))
+        self.assertEqual(len(store), 49)
+        self.assertEqual(len(store.nearby(-1.95, 30.06, 0.1)), 49)
+
+    def test_in_bounds_digest(self):
+        """The box digest tracks moves inside the box and vehicles entering it"""
+        rows, digest = self.store.in_bounds(-1.95, -1.94, 30.06, 30.07)
+        self.assertEqual([v.id for v in rows], [1, 2])
+        self.assertEqual(self.store.in_bounds(-1.95, -1.94, 30.06, 30.07)[1], digest)
+
+        self.store.upsert([make_state(2, -1.9451, 30.0626, 'taxi')])
+        moved = self.store.in_bounds(-1.95, -1.94, 30.06, 30.07)[1]
+        self.assertNotEqual(moved, digest)
+
+        self.store.upsert([make_state(3, -1.9445, 30.0630, 'moto')])
+        rows, entered = self.store.in_bounds(-1.95, -1.94, 30.06, 30.07)
+        self.assertEqual([v.id for v in rows], [1, 2, 3])
+        self.assertNotEqual(entered, moved)
+
+    def test_to_dict_matches_vehicle_shape(self):
+        """VehicleState.to_dict mirrors Vehicle.to_dict keys"""
+        state = self.store.get(1)
+        self.assertEqual(state.to_dict()['registration'], 'RAB001')
+        self.assertIn('driver_phone', state.to_dict())
+
+
+class TestVehicleChanges(unittest.TestCase):
+    """Test cases for versioned delta queries"""
+
+    def setUp(self):
+        """Three vehicles near Nyabugogo at versions 1-3"""
+        self.store = VehicleStateStore()
+        self.store.load([
+            make_state(1, -1.9441, 30.0619, 'bus', change_version=1),
+            make_state(2, -1.9450, 30.0625, 'taxi', change_version=2),
+            make_state(3, -1.9445, 30.0630, 'moto', change_version=3),
+        ])
+
+    def test_no_changes_at_current_version(self):
+        """A cursor at the current version sees nothing"""
+        upserts, removed, version = self.store.changes_since(self.store.version, -1.9441, 30.0619, 1.0)
+        self.assertEqual((upserts, removed, version), ([], [], 3))
+
+    def test_moves_deactivations_and_deletes(self):
+        """Moves are upserts; deactivated, departed and deleted vehicles are removals"""
+        self.store.upsert([
+            make_state(1, -1.9443, 30.0621, 'bus', change_version=4),
+            make_state(2, -1.9450, 30.0625, 'taxi', is_active=False, change_version=5),
+            make_state(4, -1.9200, 30.0900, 'moto', change_version=6),   # ~4 km away, never inside
+            make_state(5, -1.5000, 30.5000, 'bus', change_version=7),    # far beyond the halo
+        ])
+        self.store.remove([(3, 8)])
+
+        upserts, removed, version = self.store.changes_since(3, -1.9441, 30.0619, 1.0)
+        self.assertEqual([v.id for v, _ in upserts], [1])
+        self.assertEqual(sorted(removed), [2, 3, 4])
+        self.assertEqual(version, 8)
+        self.assertIsNone(self.store.get(3))
+        self.assertEqual(len(self.store), 4)
+
+    def test_reinsert_after_delete(self):
+        """A newer row revives a deleted id; stale tombstones are ignored"""
+        self.store.remove([(2, 4)])
+        self.store.upsert([make_state(2, -1.9450, 30.0625, 'taxi', change_version=5)])
+        self.store.remove([(2, 4)])
+        self.assertIsNotNone(self.store.get(2))
+        upserts, removed, _ = self.store.changes_since(3, -1.9441, 30.0619, 1.0)
+        self.assertEqual(([v.id for v, _ in upserts], removed), ([2], []))
+
+    def test_wait_for_change(self):
+        """Waiters wake on upserts and local writes, and time out otherwise"""
+        token = self.store.change_token
+        self.assertFalse(self.store.wait_for_change(token, 0.05))
+
+        timer = threading.Timer(0.05, self.store.upsert, [[make_state(1, -1.9443, 30.0621, change_version=4)]])
+        timer.start()
+        self.assertTrue(self.store.wait_for_change(token, 5.0))
+        timer.join()
+
+        token = self.store.change_token
+        threading.Timer(0.05, self.store.notify_write).start()
+        self.assertTrue(self.store.wait_for_change(token, 5.0))
+
+    def test_cursor_round_trip(self):
+        """Cursors are opaque but decode to the version; garbage is rejected"""
+        self.assertEqual(decode_cursor(encode_cursor(1234)), 1234)
+        for bad in ['', 'not-a-cursor', encode_cursor(5)[:-1] + '!']:
+            with self.assertRaises(ValueError):
+                decode_cursor(bad)
+
+
+class ScriptedHorizon:
+    """Stands in for PostgreSQL's commit horizon"""
+
+    def __init__(self):
+        self.horizon = None
+
+    def advance(self, session):
+        return self.horizon
+
+
+class TestOutOfOrderCommits(unittest.TestCase):
+    """A version committed after a higher one still reaches cursor clients"""
+
+    def setUp(self):
+        """Vehicle and tombstone tables on SQLite with the stamping triggers"""
+        engine = create_engine('sqlite://')
+        columns = ', '.join(
+            'id INTEGER PRIMARY KEY' if name == 'id' else
+            'change_version INTEGER NOT NULL DEFAULT 0' if name == 'change_version' else name
+            for name in VehicleState._fields
+        )
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'CREATE TABLE vehicles ({columns})')
+            conn.exec_driver_sql(
+                'CREATE TABLE vehicles_tombstones (id INTEGER PRIMARY KEY, change_version INTEGER NOT NULL)'
+            )
+            for statement in sqlite_versioning_ddl('vehicles'):
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(
+                "INSERT INTO vehicles (id, vehicle_type, current_lat, current_lng, is_active) "
+                "VALUES (1, 'bus', -1.9441, 30.0619, 1), (2, 'taxi', -1.9450, 30.0625, 1)"
+            )
+        self.session = Session(engine)
+        self.horizon = ScriptedHorizon()
+        self.store = VehicleStateStore(commit_horizon=self.horizon)
+
+    def tearDown(self):
+        self.session.close()
+
+    def commit_move(self, vehicle_id, lat, version):
+        """Commit a move stamped with the version its transaction took earlier"""
+        self.session.execute(
+            text('UPDATE vehicles SET current_lat = :lat, change_version = :version WHERE id = :id'),
+            {'lat': lat, 'version': version, 'id': vehicle_id},
+        )
+        self.session.commit()
+
+    def test_cursor_waits_for_lower_version(self):
+        """B (version 4) commits while A (version 3) is in flight; A is delivered once it commits"""
+        self.horizon.horizon = 2
+        self.store.refresh(self.session, force=True)
+        cursor = self.store.version
+        self.assertEqual(cursor, 2)
+
+        self.commit_move(2, -1.9452, 4)
+        self.store.refresh(self.session, force=True)
+        upserts, _, cursor = self.store.changes_since(cursor, -1.9441, 30.0619, 1.0)
+        self.assertEqual([v.id for v, _ in upserts], [2])
+        self.assertEqual(cursor, 2)
+
+        self.commit_move(1, -1.9443, 3)
+        self.horizon.horizon = 4
+        self.store.refresh(self.session, force=True)
+        upserts, _, cursor = self.store.changes_since(cursor, -1.9441, 30.0619, 1.0)
+        self.assertEqual(sorted(v.id for v, _ in upserts), [1, 2])
+        self.assertEqual(self.store.get(1).current_lat, -1.9443)
+        self.assertEqual(cursor, 4)
+
+    def test_rescan_skips_applied_rows(self):
+        """Re-reading rows above the horizon does not count them as changes again"""
+        self.horizon.horizon = 2
+        self.store.refresh(self.session, force=True)
+        self.commit_move(2, -1.9452, 4)
+        self.assertEqual(self.store.refresh(self.session, force=True), 1)
+        generation = self.store.generation
+        self.assertEqual(self.store.refresh(self.session, force=True), 0)
+        self.assertEqual(self.store.generation, generation)
+
+
+@unittest.skipUnless(os.environ.get('TEST_POSTGRES_URL'), 'set TEST_POSTGRES_URL to run against PostgreSQL')
+class TestPostgresCommitHorizon(unittest.TestCase):
+    """Two sessions committing sequence-stamped rows out of order"""
+
+    def setUp(self):
+        self.engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE IF EXISTS horizon_probe, horizon_probe_tombstones')
+            conn.exec_driver_sql('DROP SEQUENCE IF EXISTS horizon_probe_change_version_seq')
+            conn.exec_driver_sql(
+                'CREATE TABLE horizon_probe (id integer PRIMARY KEY, change_version bigint NOT NULL DEFAULT 0)'
+            )
+            conn.exec_driver_sql(
+                'CREATE TABLE horizon_probe_tombstones (id integer PRIMARY KEY, change_version bigint NOT NULL)'
+            )
+            for statement in postgres_versioning_ddl('horizon_probe'):
+                conn.exec_driver_sql(statement)
+
+    def tearDown(self):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE IF EXISTS horizon_probe, horizon_probe_tombstones')
+            conn.exec_driver_sql('DROP SEQUENCE IF EXISTS horizon_probe_change_version_seq')
+        self.engine.dispose()
+
+    def test_horizon_stays_below_open_transaction(self):
+        horizon = CommitHorizon('horizon_probe')
+        first, second, reader = Session(self.engine), Session(self.engine), Session(self.engine)
+        try:
+            first.execute(text('INSERT INTO horizon_probe (id) VALUES (1)'))
+            second.execute(text('INSERT INTO horizon_probe (id) VALUES (2)'))
+            second.commit()
+
+            visible = reader.execute(text('SELECT max(change_version) FROM horizon_probe')).scalar()
+            self.assertEqual(visible, 2)
+            self.assertEqual(horizon.advance(reader), 0)
+            reader.commit()
+
+            first.commit()
+            self.assertEqual(horizon.advance(reader), 2)
+        finally:
+            for session in (first, second, reader):
+                session.close()
+
+
+class TestFleetCounters(unittest.TestCase):
+    """Test cases for the running fleet counts kept by the store"""
+
+    TODAY = datetime(2025, 1, 2, 12, 0)
+
+    def setUp(self):
+        """The Nyabugogo fleet: two seen today, one inactive, one without a location"""
+        self.store = VehicleStateStore()
+        self.store.load([
+            make_state(1, -1.9441, 30.0619, 'bus', updated_at=self.TODAY, change_version=1),
+            make_state(2, -1.9450, 30.0625, 'taxi', updated_at=self.TODAY, change_version=2),
+            make_state(3, -1.9200, 30.0900, 'moto', updated_at=self.TODAY - timedelta(days=1), change_version=3),
+            make_state(4, -1.9442, 30.0620, 'bus', is_active=False, change_version=4),
+            make_state(5, None, None, 'moto', change_version=5),
+        ])
+
+    def counts(self):
+        return self.store.counters.snapshot(today=self.TODAY.date())
+
+    def test_counts_after_load(self):
+        """Counts match what the COUNT queries used to return"""
+        self.assertEqual(self.counts(), {
+            'total': 5, 'active': 4, 'with_location': 3, 'seen_today': 2,
+            'by_type': {'bus': 2, 'taxi': 1, 'moto': 2},
+        })
+
+    def test_counts_follow_writes(self):
+        """Upserts, removals and overlays adjust the counts by their difference"""
+        self.store.upsert([
+            make_state(2, -1.9450, 30.0625, 'taxi', is_active=False, change_version=6),
+            make_state(5, -1.9445, 30.0630, 'moto', updated_at=self.TODAY, change_version=7),
+            make_state(6, -1.9446, 30.0631, 'taxi', change_version=8),
+        ])
+        self.store.remove([(1, 9), (99, 10)])
+        self.store.overlay_positions([PositionUpdate(3, -1.9210, 30.0910, None, None, self.TODAY)])
+
+        self.assertEqual(self.counts(), {
+            'total': 5, 'active': 3, 'with_location': 3, 'seen_today': 2,
+            'by_type': {'bus': 1, 'taxi': 2, 'moto': 2},
+        })
+
+    def test_full_reload_resets_counts(self):
+        """A full reload starts the counts from scratch"""
+        self.store.load([make_state(7, -1.9441, 30.0619, 'bus')])
+        self.assertEqual(self.counts()['total'], 1)
+        self.assertEqual(self.counts()['by_type'], {'bus': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Unit tests for live vehicle stream subscriptions
+"""
+
+import unittest
+import sys
+import os
+import json
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.vehicle_store import VehicleStateStore
+from app.utils.vehicle_stream import AreaSubscription, sse_event
+from tests.test_vehicle_store import make_state
+
+
+class TestAreaSubscription(unittest.TestCase):
+    """Only moved, entered and departed vehicles are reported"""
+
+    def setUp(self):
+        """Two vehicles at Nyabugogo, one in Kimironko"""
+        self.store = VehicleStateStore()
+        self.store.load([
+            make_state(1, -1.9441, 30.0619, 'bus'),
+            make_state(2, -1.9450, 30.0625, 'taxi'),
+            make_state(3, -1.9200, 30.0900, 'moto'),
+        ])
+        self.subscription = AreaSubscription(-1.9441, 30.0619, 1.0)
+
+    def test_snapshot_then_no_changes(self):
+        """An unchanged store produces an empty delta"""
+        snapshot = self.subscription.snapshot(self.store)
+        self.assertEqual([v.id for v, _ in snapshot], [1, 2])
+        self.assertFalse(self.subscription.poll(self.store))
+
+        # Re-writing identical rows bumps the generation but is not a change
+        self.store.upsert([make_state(1, -1.9441, 30.0619, 'bus')])
+        self.assertFalse(self.subscription.poll(self.store))
+
+    def test_moved_entered_and_left(self):
+        """Moves are upserts; leaving the area or deactivating is a removal"""
+        self.subscription.snapshot(self.store)
+        self.store.upsert([
+            make_state(1, -1.9445, 30.0622, 'bus'),                   # moved
+            make_state(2, -1.9450, 30.0625, 'taxi', is_active=False),  # deactivated
+            make_state(3, -1.9443, 30.0621, 'moto'),                   # entered
+        ])
+        changes = self.subscription.poll(self.store)
+        self.assertEqual(sorted(v.id for v, _ in changes.upserts), [1, 3])
+        self.assertEqual(changes.removed, [2])
+
+        self.store.upsert([make_state(3, -1.9200, 30.0900, 'moto')])  # left again
+        changes = self.subscription.poll(self.store)
+        self.assertEqual(changes.upserts, [])
+        self.assertEqual(changes.removed, [3])
+
+    def test_sse_event_format(self):
+        """Events are framed as event/data lines ending in a blank line"""
+        message = sse_event('update', {'removed': [2]})
+        self.assertTrue(message.startswith('event: update\ndata: '))
+        self.assertTrue(message.endswith('\n\n'))
+        self.assertEqual(json.loads(message.split('data: ', 1)[1]), {'removed': [2]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""
+Unit tests for web-mercator tile maths
+"""
+
+import unittest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.web_mercator import tile_bounds, tile_for, validate_tile
+
+
+class TestWebMercator(unittest.TestCase):
+    """Test cases for tile addressing"""
+
+    def test_world_tile(self):
+        """Zoom 0 is one tile spanning the mercator world"""
+        min_lat, max_lat, min_lng, max_lng = tile_bounds(0, 0, 0)
+        self.assertAlmostEqual(max_lat, 85.0511, places=4)
+        self.assertAlmostEqual(min_lat, -85.0511, places=4)
+        self.assertEqual((min_lng, max_lng), (-180.0, 180.0))
+
+    def test_point_lies_in_its_tile(self):
+        """tile_for and tile_bounds agree for Nyabugogo at every zoom"""
+        lat, lng = -1.9441, 30.0619
+        for z in range(0, 19):
+            x, y = tile_for(lat, lng, z)
+            min_lat, max_lat, min_lng, max_lng = tile_bounds(z, x, y)
+            self.assertTrue(min_lat < lat <= max_lat and min_lng <= lng < max_lng, z)
+
+    def test_validate_tile(self):
+        """Out-of-range zooms and coordinates are rejected"""
+        validate_tile(14, 9560, 8280)
+        for z, x, y in [(-1, 0, 0), (23, 0, 0), (2, 4, 0), (2, 0, -1)]:
+            with self.assertRaises(ValueError):
+                validate_tile(z, x, y)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Unit tests for the packed binary vehicle encoding
+"""
+
+import unittest
+import sys
+import os
+from datetime import datetime, timedelta
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.geo import estimate_eta
+from app.utils.wire_format import MEDIA_TYPE, RECORD_DTYPE, decode_vehicles, encode_vehicles, wants_packed
+from tests.test_vehicle_store import make_state
+
+
+class TestWireFormat(unittest.TestCase):
+    """Test cases for encoding, decoding and content negotiation"""
+
+    def setUp(self):
+        self.now = datetime(2024, 1, 1, 12, 0, 0)
+        self.vehicles = [
+            make_state(1, -1.944123, 30.061987, 'bus', change_version=1)._replace(
+                bearing=90.0, speed=31.6, registration='RAB123A', route_name='Nyabugogo - Kacyiru',
+                last_seen=self.now - timedelta(seconds=12)),
+            make_state(2, -1.95, 30.07, 'moto', change_version=2)._replace(
+                bearing=None, speed=None, registration='RC456M', route_name='Nyabugogo - Kacyiru',
+                last_seen=None),
+            make_state(3, -1.96, 30.08, 'tuk-tuk', change_version=3)._replace(registration=None, route_name=None),
+        ]
+
+    def test_round_trip(self):
+        """Decoded values match the source within the quantization step"""
+        matches = list(zip(self.vehicles, [0.5, 1.234, None]))
+        data = encode_vehicles(matches, (-1.95, 30.06), cursor='v1:abc', removed=[7, 8], now=self.now)
+        decoded = decode_vehicles(data)
+
+        self.assertEqual(decoded['cursor'], 'v1:abc')
+        self.assertEqual(decoded['removed'], [7, 8])
+        self.assertEqual(decoded['timestamp'], self.now)
+        self.assertEqual(decoded['center'], {'lat': -1.95, 'lng': 30.06})
+
+        bus, moto, other = decoded['vehicles']
+        self.assertEqual((bus['id'], bus['vehicle_type'], bus['speed']), (1, 'bus', 32))
+        self.assertAlmostEqual(bus['lat'], -1.944123, delta=1e-5)
+        self.assertAlmostEqual(bus['lng'], 30.061987, delta=1e-5)
+        self.assertEqual(bus['bearing'], 90.0)
+        self.assertEqual((bus['distance_km'], bus['age_seconds']), (0.5, 12))
+        self.assertEqual(bus['registration'], 'RAB123A')
+        self.assertEqual(moto['route_name'], bus['route_name'])
+        self.assertEqual((moto['bearing'], moto['speed'], moto['age_seconds']), (0.0, 0, None))
+        self.assertEqual((moto['distance_km'], moto['eta_minutes']), (1.23, estimate_eta(1.234, 'moto')))
+        self.assertEqual((other['vehicle_type'], other['distance_km'], other['eta_minutes']), (None, None, None))
+        self.assertIsNone(other['registration'])
+
+    def test_payload_size(self):
+        """Records are fixed size and repeated strings are stored once"""
+        data = encode_vehicles([(v, 1.0) for v in self.vehicles[:2]], (0.0, 0.0), now=self.now)
+        strings = len('RAB123A') + len('RC456M') + len('Nyabugogo - Kacyiru') + 3
+        self.assertEqual(RECORD_DTYPE.itemsize, 29)
+        self.assertEqual(len(data), 34 + 2 + 2 * 29 + strings)
+
+    def test_large_string_table(self):
+        """More than 65,535 distinct strings keep their own indexes"""
+        base = self.vehicles[0]
+        fleet = [base._replace(id=i, registration=f'SIM{i:05d}', route_name=None) for i in range(70000)]
+        decoded = decode_vehicles(encode_vehicles([(v, None) for v in fleet], (0.0, 0.0), now=self.now))
+        registrations = [v['registration'] for v in decoded['vehicles']]
+        self.assertEqual(registrations[65535], 'SIM65535')
+        self.assertEqual(registrations[-1], 'SIM69999')
+        self.assertIsNone(decoded['vehicles'][-1]['route_name'])
+
+    def test_long_strings_cut_on_character_boundary(self):
+        """Strings over 255 bytes are shortened without splitting a character"""
+        route = 'a' + 'é' * 200
+        vehicle = self.vehicles[0]._replace(route_name=route)
+        decoded = decode_vehicles(encode_vehicles([(vehicle, 1.0)], (0.0, 0.0), now=self.now))
+        self.assertEqual(decoded['vehicles'][0]['route_name'], route[:128])
+
+    def test_negotiation(self):
+        """JSON stays the default unless the client prefers the packed type"""
+        def accept(header):
+            return parse_accept_header(header, MIMEAccept)
+
+        self.assertFalse(wants_packed(accept('')))
+        self.assertFalse(wants_packed(accept('*/*')))
+        self.assertFalse(wants_packed(accept(f'application/json, {MEDIA_TYPE};q=0.5')))
+        self.assertTrue(wants_packed(accept(MEDIA_TYPE)))
+        self.assertTrue(wants_packed(accept(f'{MEDIA_TYPE}, application/json;q=0.5')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 /**
  * Custom hook for real-time vehicle tracking
- * Uses long-polling to fetch vehicle updates
+ * Streams vehicle updates over Server-Sent Events, falling back to polling
  */
 
 import { useState, useEffect, useRef, useCallback } from 'react';
@@ -18,11 +18,23 @@ const API_BASE_URL = process.env.REACT_APP_API_URL || '';
  * @param {string} options.vehicleType - Filter by vehicle type (optional)
  * @param {number} options.interval - Polling interval in milliseconds (default: 20000 = 20s)
  * @param {boolean} options.enabled - Enable/disable polling (default: true)
+ * @param {boolean} options.stream - Use the SSE stream when supported (default: true)
  * @returns {Object} - {vehicles, loading, error, lastUpdate, refresh}
  */
 const MAX_RETRIES = 3;
 const RETRY_DELAY = 2000; // 2 seconds
 
+const sortByDistance = (list) =>
+  list.sort((a, b) => (a.distance_km || 0) - (b.distance_km || 0));
+
+// Merge a {upserts, removed} delta into the current vehicle list
+const applyChanges = (prevVehicles, { upserts = [], removed = [] }) => {
+  const vehicleMap = new Map(prevVehicles.map((v) => [v.id, v]));
+  removed.forEach((id) => vehicleMap.delete(id));
+  upserts.forEach((v) => vehicleMap.set(v.id, v));
+  return sortByDistance(Array.from(vehicleMap.values()));
+};
+
 const useRealtimeVehicles = ({
   location,
   radius = 5.0,
@@ -32,6 +44,7 @@ const useRealtimeVehicles = ({
   retryCount = 0,
   onError = null,
   autoSeed = true, // seed vehicles automatically on initial empty state
+  stream = true,
 }) => {
   const [vehicles, setVehicles] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -44,8 +57,12 @@ const useRealtimeVehicles = ({
   const isMountedRef = useRef(true);
   const abortControllerRef = useRef(null);
   const lastTimestampRef = useRef(null);
+  const cursorRef = useRef(null); // opaque delta cursor from the last response
   const retryTimeoutRef = useRef(null);
   const seededRef = useRef(false); // ensure we only trigger auto_seed once per mount
+  const eventSourceRef = useRef(null);
+  const streamingRef = useRef(false);
+  const loadingRef = useRef(false); // read by the polling interval without re-running the effect
 
   // Cleanup function
   const cleanup = useCallback(() => {
@@ -60,7 +77,7 @@ const useRealtimeVehicles = ({
   }, []);
 
   // Fetch vehicles function with retry logic
-  const fetchVehicles = useCallback(async (since = null, retry = 0) => {
+  const fetchVehicles = useCallback(async (cursor = null, retry = 0) => {
     if (!enabled || !location || !location.lat || !location.lng) {
       return;
     }
@@ -72,6 +89,7 @@ const useRealtimeVehicles = ({
     // Create new abort controller
     abortControllerRef.current = new AbortController();
 
+    loadingRef.current = true;
     setLoading(true);
     setError(null);
 
@@ -81,7 +99,7 @@ const useRealtimeVehicles = ({
 
       // Build URL with query params
       let url = `${API_BASE_URL}/api/v1/realtime/vehicles/realtime?lat=${encodeURIComponent(location.lat)}&lng=${encodeURIComponent(location.lng)}&radius=${encodeURIComponent(radius)}&_=${timestamp}`;
-      if (autoSeed && !since && !seededRef.current) {
+      if (autoSeed && !cursor && !seededRef.current) {
         url += `&auto_seed=true`;
       }
 
@@ -89,8 +107,8 @@ const useRealtimeVehicles = ({
         url += `&type=${encodeURIComponent(vehicleType)}`;
       }
 
-      if (since) {
-        url += `&since=${encodeURIComponent(since)}`;
+      if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
       }
 
       const response = await fetch(url, {
@@ -113,7 +131,7 @@ const useRealtimeVehicles = ({
 
       const data = await response.json();
       // Mark that we've attempted seeding on the first successful response
-      if (autoSeed && !since) {
+      if (autoSeed && !cursor) {
         seededRef.current = true;
       }
 
@@ -132,39 +150,15 @@ const useRealtimeVehicles = ({
           });
         }
 
-        if (data.vehicles) {
-          // Update existing vehicles or add new ones
-          setVehicles((prevVehicles) => {
-            // If this is a fresh fetch (not an update), replace the entire list
-            if (!since) {
-              return data.vehicles || [];
-            }
-
-            // Otherwise, merge with existing vehicles
-            const vehicleMap = new Map();
-
-            // Add existing vehicles to map
-            prevVehicles.forEach((v) => {
-              vehicleMap.set(v.id, v);
-            });
-
-            // Update or add new vehicles
-            data.vehicles.forEach((v) => {
-              vehicleMap.set(v.id, v);
-            });
-
-            // Convert back to array and sort by distance
-            const sorted = Array.from(vehicleMap.values()).sort(
-              (a, b) => (a.distance_km || 0) - (b.distance_km || 0)
-            );
-            console.log('Updated vehicles:', sorted.length);
-            return sorted;
-          });
+        if (data.upserts) {
+          // Delta since our cursor: apply removals and changed vehicles
+          setVehicles((prevVehicles) => applyChanges(prevVehicles, data));
         } else {
           // Initial load or full refresh
-          const vehiclesList = data.vehicles || [];
-          console.log('Setting vehicles:', vehiclesList.length, vehiclesList);
-          setVehicles(vehiclesList);
+          setVehicles(data.vehicles || []);
+        }
+        if (data.cursor) {
+          cursorRef.current = data.cursor;
         }
 
         setLastUpdate(new Date());
@@ -186,7 +180,7 @@ const useRealtimeVehicles = ({
           // Schedule a retry
           retryTimeoutRef.current = setTimeout(() => {
             if (isMountedRef.current) {
-              fetchVehicles(since, retry + 1);
+              fetchVehicles(cursor, retry + 1);
             }
           }, retryAfter * 1000);
 
@@ -201,7 +195,7 @@ const useRealtimeVehicles = ({
 
           retryTimeoutRef.current = setTimeout(() => {
             if (isMountedRef.current) {
-              fetchVehicles(since, retry + 1);
+              fetchVehicles(cursor, retry + 1);
             }
           }, delay);
 
@@ -216,32 +210,119 @@ const useRealtimeVehicles = ({
         }
       }
     } finally {
+      loadingRef.current = false;
       if (isMountedRef.current) {
         setLoading(false);
       }
     }
   }, [location, radius, vehicleType]);
 
+  // Poll every `interval` ms (no-op if already polling)
+  const startPolling = useCallback(() => {
+    if (intervalRef.current || !enabled || interval <= 0) {
+      return;
+    }
+    intervalRef.current = setInterval(() => {
+      // Only fetch if not currently loading and no retry is scheduled
+      if (!loadingRef.current && !retryTimeoutRef.current) {
+        fetchVehicles(cursorRef.current);
+      }
+    }, interval);
+  }, [enabled, interval, fetchVehicles]);
+
+  // Open the SSE stream: a snapshot, then only vehicles that moved, entered or left.
+  // Returns false when the browser has no EventSource so the caller can poll instead.
+  const openStream = useCallback(() => {
+    if (!stream || typeof window === 'undefined' || !window.EventSource) {
+      return false;
+    }
+    if (!location || !location.lat || !location.lng) {
+      return true;
+    }
+
+    let url = `${API_BASE_URL}/api/v1/realtime/vehicles/stream?lat=${encodeURIComponent(location.lat)}&lng=${encodeURIComponent(location.lng)}&radius=${encodeURIComponent(radius)}`;
+    if (vehicleType) {
+      url += `&type=${encodeURIComponent(vehicleType)}`;
+    }
+
+    const source = new window.EventSource(url, { withCredentials: true });
+    eventSourceRef.current = source;
+
+    source.addEventListener('snapshot', (event) => {
+      if (!isMountedRef.current) return;
+      const data = JSON.parse(event.data);
+      setVehicles(data.vehicles || []);
+      setError(null);
+      setRetryAttempt(0);
+      setLastUpdate(new Date());
+      setLastTimestamp(data.timestamp);
+      lastTimestampRef.current = data.timestamp;
+    });
+
+    source.addEventListener('update', (event) => {
+      if (!isMountedRef.current) return;
+      const data = JSON.parse(event.data);
+      setVehicles((prevVehicles) => applyChanges(prevVehicles, data));
+      setLastUpdate(new Date());
+      setLastTimestamp(data.timestamp);
+      lastTimestampRef.current = data.timestamp;
+    });
+
+    // EventSource reconnects by itself; a CLOSED state means the server refused
+    // the stream (a 429 or 400, say), so fall back to polling
+    source.onerror = () => {
+      if (source.readyState === window.EventSource.CLOSED && isMountedRef.current) {
+        streamingRef.current = false;
+        eventSourceRef.current = null;
+        setError('Live updates unavailable. Polling instead...');
+        fetchVehicles(cursorRef.current);
+        startPolling();
+      }
+    };
+    return true;
+  }, [stream, location, radius, vehicleType, fetchVehicles, startPolling]);
+
+  const closeStream = useCallback(() => {
+    if (eventSourceRef.current) {
+      eventSourceRef.current.close();
+      eventSourceRef.current = null;
+    }
+  }, []);
+
   // Manual refresh function
   const refresh = useCallback(() => {
-    return fetchVehicles(lastTimestampRef.current);
+    return fetchVehicles(cursorRef.current);
   }, [fetchVehicles]);
 
+  // Live stream replaces interval polling when available
+  useEffect(() => {
+    if (!enabled) {
+      return undefined;
+    }
+    streamingRef.current = openStream();
+    return () => {
+      streamingRef.current = false;
+      closeStream();
+    };
+  }, [enabled, openStream, closeStream]);
+
+  // A cursor only covers the area and filter it was issued for: start over with a full fetch
+  useEffect(() => {
+    cursorRef.current = null;
+  }, [location?.lat, location?.lng, radius, vehicleType]);
+
   // Set up polling
   useEffect(() => {
     isMountedRef.current = true;
 
-    // Initial fetch
-    fetchVehicles(lastTimestampRef.current);
+    // The stream's snapshot replaces the initial fetch; only the one-time seeding request goes out
+    if (!streamingRef.current || (autoSeed && !seededRef.current)) {
+      fetchVehicles(cursorRef.current);
+    }
 
-    // Set up interval for polling
-    if (enabled && interval > 0) {
-      intervalRef.current = setInterval(() => {
-        // Only fetch if not currently loading and no retry is scheduled
-        if (!loading && !retryTimeoutRef.current) {
-          fetchVehicles(lastTimestampRef.current);
-        }
-      }, interval);
+    // Set up interval for polling (not needed while the stream is open)
+    if (!streamingRef.current) {
+      startPolling();
     }
 
     // Clean up
@@ -257,7 +338,7 @@ const useRealtimeVehicles = ({
         retryTimeoutRef.current = null;
       }
     };
-  }, [location, radius, vehicleType, interval, enabled, fetchVehicles, loading, cleanup]);
+  }, [location, radius, vehicleType, interval, enabled, fetchVehicles, startPolling, cleanup, autoSeed]);
 
   // Cleanup on unmount
   useEffect(() => {
@@ -269,6 +350,9 @@ const useRealtimeVehicles = ({
       if (abortControllerRef.current) {
         abortControllerRef.current.abort();
       }
+      if (eventSourceRef.current) {
+        eventSourceRef.current.close();
+      }
     };
   }, []);
 
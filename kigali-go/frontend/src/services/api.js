@@ -93,9 +93,11 @@ export const apiService = {
 
   // Vehicles
   vehicles: {
-    getNearby: (lat, lng, radius = 5.0, type = null) => {
+    // Pass the map zoom: below 14 the response holds clusters instead of vehicles
+    getNearby: (lat, lng, radius = 5.0, type = null, zoom = null) => {
       let url = `/api/v1/map/vehicles/nearby?lat=${encodeURIComponent(lat)}&lng=${encodeURIComponent(lng)}&radius=${encodeURIComponent(radius)}`;
       if (type) url += `&type=${encodeURIComponent(type)}`;
+      if (zoom != null) url += `&zoom=${encodeURIComponent(Math.floor(zoom))}`;
       return api.get(url);
     },
     getById: (id, lat = null, lng = null) => {